@@ -1,12 +1,29 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+import json
+import os
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from app.models import (
     RecipeRequest, RecipeResponse, 
     UserProfile, MealPlanResponse, 
-    DietLogRequest, DietRecommendationResponse
+    DietLogRequest, DietRecommendationResponse,
+    StrategyPrediction, LabelledProfile, ProfileInsertResponse
 )
+from typing import List, Optional
 from app.services.recipe_service import RecipeService
 from app.services.meal_service import MealPlanService
 from app.services.diet_service import DietService
+from app.services.inference_executor import InferenceExecutor, InferenceTimeout, Overloaded
+from app.services.model_registry import current_pss_bytes, current_rss_bytes, registry
+from app.services.profiler import profiler
+from app.services.warmup import Warmup
+from app.utils import config
+from app.utils.metrics import CONTENT_TYPE, REQUEST_SECONDS, metrics
 
 app = FastAPI(title="NutriChef AI - Machine Learning Microservice")
 
@@ -14,22 +31,223 @@ app = FastAPI(title="NutriChef AI - Machine Learning Microservice")
 def read_root():
     return {"message": "NutriChef AI Microservice is Running!", "docs": "/docs"}
 
-# Service Instances
+# Service Instances (models and data are shared through the registry and loaded lazily)
 recipe_service = RecipeService()
-meal_service = MealPlanService()
-diet_service = DietService()
+meal_service = MealPlanService(recipe_service=recipe_service)
+diet_service = DietService(recipe_service=recipe_service, mp_service=meal_service)
+
+# Model calls run on a dedicated, bounded pool so cheap endpoints never queue behind generate()
+executor = InferenceExecutor(config.INFERENCE_WORKERS, config.INFERENCE_MAX_QUEUE, config.ENDPOINT_TIMEOUTS,
+                             max_streams=config.INFERENCE_MAX_STREAMS)
+
+# Heavy loads happen in the background; /predict/recipe serves templates until GPT-2 is warm
+warmup = Warmup()
+warmup.record("import_app", time.perf_counter() - _IMPORT_STARTED)
+warmup.add_phase("nutrition_db", lambda: recipe_service.nutrition_service)
+warmup.add_phase("diet_strategy", meal_service.warm_up)
+warmup.add_phase("recipe_gpt2", recipe_service.warm_up)
+warmup.add_phase("registry_report", registry.print_report)
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
+
+# Scrape-time views of state other components already keep (see app/utils/metrics.py)
+metrics.callback("nutrichef_ready", "1 once every model is warm", lambda: int(warmup.ready.is_set()))
+metrics.callback("nutrichef_process_resident_bytes", "Resident set size of this worker", current_rss_bytes)
+metrics.callback("nutrichef_recipe_cache_hit_ratio", "Recipe cache hits / lookups since this worker started",
+                 lambda: recipe_service.cache.stats()["hit_rate"])
+metrics.callback("nutrichef_inference_queue_depth", "Model calls admitted but waiting for a worker or the GPT-2 batcher",
+                 lambda: executor.stats()["queue_depth"])
+metrics.callback("nutrichef_inference_in_flight", "Model calls admitted and not finished (incl. streams)",
+                 lambda: executor.stats()["in_flight"])
+metrics.callback("nutrichef_recipe_replica_load", "Prompts queued or decoding plus open streams per replica",
+                 lambda: {r["name"]: r["load"] for r in recipe_service.replica_stats() or []},
+                 labelnames=["replica"])
+metrics.callback("nutrichef_diet_strategy_patients", "Profiles the strategy KNN votes over",
+                 lambda: None if meal_service.strategy_predictor_if_loaded is None
+                 else len(meal_service.strategy_predictor_if_loaded))
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, so the series stay bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, status=str(status))
+        if profiler.active and route != "/admin/profile":
+            profiler.request_finished()
+
+@app.exception_handler(Overloaded)
+def overloaded(request: Request, exc: Overloaded):
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": str(exc.retry_after)})
+
+@app.exception_handler(InferenceTimeout)
+def inference_timeout(request: Request, exc: InferenceTimeout):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    # Readiness: all models are warm
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if warmup.ready.is_set() else 503)
+
+@app.get("/stats")
+def stats():
+    predictor = meal_service.strategy_predictor_if_loaded
+    return {
+        "process": {
+            "pid": os.getpid(),
+            "rss_mb": round(current_rss_bytes() / 2**20, 1),
+            "pss_mb": round(current_pss_bytes() / 2**20, 1),  # shared pages split between workers
+        },
+        "inference": executor.stats(),
+        "recipe_cache": recipe_service.cache.stats(),
+        "recipe_replicas": recipe_service.replica_stats(),
+        "diet_strategy": None if predictor is None else {
+            "patients": len(predictor), "pending": predictor.pending, "compactions": predictor.compactions
+        },
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+def check_admin_token(x_admin_token: Optional[str]) -> Optional[JSONResponse]:
+    """Error response unless the X-Admin-Token header matches NUTRICHEF_ADMIN_TOKEN"""
+    if not config.ADMIN_TOKEN:
+        return JSONResponse({"detail": "Admin endpoints are disabled (set NUTRICHEF_ADMIN_TOKEN)"}, status_code=404)
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        return JSONResponse({"detail": "Invalid admin token"}, status_code=403)
+    return None
+
+@app.post("/admin/profile")
+async def profile(seconds: float = 10.0, requests: int = 0, interval_ms: float = 5.0,
+                  idle: bool = False, torch_trace: bool = False,
+                  x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Sample every thread's stack for the next `requests` requests (0 = no limit)
+    or `seconds`, whichever ends first; returns collapsed stacks for flamegraph.pl.
+    With torch_trace=true the first model.generate() is also traced (see X-Torch-Trace).
+    Only this worker is profiled.
+    """
+    denied = check_admin_token(x_admin_token)
+    if denied:
+        return denied
+
+    try:
+        profiler.start(min(seconds, config.PROFILE_MAX_SECONDS), requests, interval_ms, idle,
+                       config.PROFILE_TRACE_DIR if torch_trace else None)
+    except RuntimeError as e:
+        return JSONResponse({"detail": str(e)}, status_code=409)
+    result = await asyncio.to_thread(profiler.wait)
+
+    headers = {
+        "X-Profile-Samples": str(result.samples),
+        "X-Profile-Seconds": str(result.seconds),
+        "X-Profile-Requests": str(result.requests),
+    }
+    if result.torch_trace:
+        headers["X-Torch-Trace"] = result.torch_trace
+    return Response(result.collapsed, media_type="text/plain", headers=headers)
+
+@app.on_event("shutdown")
+def release_models():
+    diet_service.close()
+    meal_service.close()
+    recipe_service.close()
+    executor.shutdown()
+
+def _cancel_submitted(submitted: "asyncio.Future"):
+    if not submitted.cancelled() and submitted.exception() is None:
+        for future in submitted.result()[1].values():
+            future.cancel()
 
 @app.post("/predict/recipe", response_model=RecipeResponse)
-def generate_recipe(request: RecipeRequest):
-    return recipe_service.generate(request)
+async def generate_recipe(request: RecipeRequest):
+    async def job(started):
+        # No worker thread is held while the batcher decodes, so concurrent
+        # requests can fill a whole micro-batch (RECIPE_BATCH_MAX_SIZE)
+        submitting = asyncio.ensure_future(executor.offload(recipe_service.submit_many, [request]))
+        try:
+            responses, pending = await asyncio.shield(submitting)
+        except asyncio.CancelledError:
+            # Timed out mid-submit: drop whatever gets queued, nobody will read it
+            submitting.add_done_callback(_cancel_submitted)
+            raise
+        if not pending:
+            started()  # Answered from the cache, the store or a template
+        else:
+            # Counted as queued (in /stats and metrics) until the batcher picks a prompt up
+            for future in pending.values():
+                future.add_start_callback(lambda _: started())
+            # On timeout gather is cancelled, which cancels the batcher futures
+            # still queued, so abandoned prompts never reach GPT-2
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in pending.values()), return_exceptions=True)
+        return (await executor.offload(recipe_service.finish_many, [request], responses, pending))[0]
+    return await executor.run_async("recipe", job)
+
+@app.post("/predict/recipe/stream")
+def stream_recipe(request: RecipeRequest):
+    # Newline-delimited JSON: token events as they decode, then title/ingredients/instructions/recipe.
+    # The stream holds an admission slot until it finishes (or the client goes away)
+    release = executor.reserve("recipe")
+
+    def events():
+        try:
+            for event in recipe_service.generate_stream(request):
+                yield json.dumps(event) + "\n"
+        finally:
+            release()
+    # release() is idempotent; the background task covers a stream that never started
+    return StreamingResponse(events(), media_type="application/x-ndjson", background=BackgroundTask(release))
 
 @app.post("/predict/meal-plan", response_model=MealPlanResponse)
-def generate_meal_plan(profile: UserProfile):
-    return meal_service.create_plan(profile)
+async def generate_meal_plan(profile: UserProfile):
+    return await executor.run("meal_plan", meal_service.create_plan, profile)
+
+@app.post("/predict/strategy", response_model=List[StrategyPrediction])
+async def predict_strategy(profiles: List[UserProfile]):
+    # Batch endpoint: every profile is scored in one vectorized KNN pass
+    predictions = await executor.run("strategy", meal_service.predict_strategies, profiles)
+    return [
+        StrategyPrediction(strategy=strategy, confidence=confidence)
+        for strategy, confidence in predictions
+    ]
+
+@app.post("/strategy/profiles", response_model=ProfileInsertResponse)
+async def add_strategy_profiles(items: List[LabelledProfile], allowNewLabels: bool = False,
+                                x_admin_token: Optional[str] = Header(default=None)):
+    # Appended to the durable profile log and used by the very next prediction.
+    # Labels must be strategies the model already knows unless ?allowNewLabels=true.
+    # Inserts change every later prediction, so they need the admin token
+    denied = check_admin_token(x_admin_token)
+    if denied:
+        return denied
+    try:
+        result = await executor.run(
+            "strategy_profiles", meal_service.add_profiles,
+            [i.profile for i in items], [i.dietRecommendation for i in items], allowNewLabels
+        )
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=422)
+    except RuntimeError as e:
+        return JSONResponse({"detail": str(e)}, status_code=503)
+    return ProfileInsertResponse(**result)
 
 @app.post("/predict/adaptive-diet", response_model=DietRecommendationResponse)
-def adaptive_diet(request: DietLogRequest):
-    return diet_service.recommend(request)
+async def adaptive_diet(request: DietLogRequest):
+    return await executor.run("adaptive_diet", diet_service.recommend, request)
 
 if __name__ == "__main__":
     import uvicorn
@@ -7,6 +7,7 @@ class RecipeRequest(BaseModel):
     ingredients: str
     cuisine: str = "Any"
     dietaryRestrictions: str = ""
+    seed: Optional[int] = None  # Same seed + same inputs -> same recipe
 
 class UserProfile(BaseModel):
     weightKg: float
@@ -17,6 +18,10 @@ class UserProfile(BaseModel):
     healthGoals: str  # e.g., "Lose Weight", "Gain Muscle"
     dietaryRestrictions: str = "None"
 
+class LabelledProfile(BaseModel):
+    profile: UserProfile
+    dietRecommendation: str  # e.g., "Low_Carb"
+
 class DietLogRequest(BaseModel):
     foodItem: str       # e.g., "Cheese Pizza"
     mealType: str       # e.g., "Lunch"
@@ -49,6 +54,15 @@ class RecommendedMeal(BaseModel):
     recipe: RecipeResponse
     suggestionReason: str
 
+class StrategyPrediction(BaseModel):
+    strategy: str       # e.g., "Low_Carb"
+    confidence: float   # Share of nearest patients that voted for it (0 = model unavailable)
+
+class ProfileInsertResponse(BaseModel):
+    added: int      # Profiles accepted (ones with unusable measurements are skipped)
+    patients: int   # Patients the strategy model now votes over
+    pending: int    # Live-added profiles not yet compacted
+
 class DietRecommendationResponse(BaseModel):
     caloriesConsumedEstimate: int
     caloriesRemaining: int
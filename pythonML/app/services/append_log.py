@@ -0,0 +1,173 @@
+"""
+AppendLog - Durable, shareable JSONL log of records
+
+Each append is one fsync'd write of complete lines to a file opened with
+O_APPEND, so concurrent writers (threads or worker processes) never interleave
+within a record. Readers tail the file from their own offset and only consume
+whole lines, so every process can apply the same records in the same order.
+
+Once its records are folded into a model artifact the log is rotated: a fresh
+file, headed by a new log id, replaces it with only the records appended after
+that point. Appenders hold a shared lock on `<path>.lock` and rotation an
+exclusive one, so no record is lost to the swap; readers notice the new file
+and start over from it.
+"""
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are coordinated
+    fcntl = None
+
+# First line of a rotated log; readers skip it
+HEADER_KEY = 'log_id'
+
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = True, blocking: bool = True):
+    """flock() on `path` (created if needed); yields False if non-blocking and already held"""
+    if fcntl is None:
+        yield True
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def _file_id(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class AppendLog:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._offset = 0
+        self._file = _file_id(path)
+        self._lock = threading.Lock()
+
+    @property
+    def offset(self) -> int:
+        """Bytes of the current file consumed by read_new()"""
+        return self._offset
+
+    def _makedirs(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, records: Iterable[Dict]) -> int:
+        """Durably append records; returns how many were written"""
+        lines = [json.dumps(r, separators=(',', ':')) + "\n" for r in records]
+        if not lines:
+            return 0
+        self._makedirs()
+        with file_lock(self.lock_path, exclusive=False):
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, "".join(lines).encode('utf-8'))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return len(lines)
+
+    def log_id(self) -> Optional[str]:
+        """Id in the current file's header, or None for a log that was never rotated"""
+        try:
+            with open(self.path, 'rb') as f:
+                first = f.readline()
+        except FileNotFoundError:
+            return None
+        try:
+            header = json.loads(first)
+        except json.JSONDecodeError:
+            return None
+        return header.get(HEADER_KEY) if isinstance(header, dict) else None
+
+    def rotated(self) -> bool:
+        """True if the file being tailed was replaced by a rotation since the last read"""
+        current = _file_id(self.path)
+        return self._file is not None and current is not None and current != self._file
+
+    def restart(self, offset: int = 0):
+        """Tail the current file from `offset` (after a rotation, or to skip records already applied)"""
+        with self._lock:
+            self._file = _file_id(self.path)
+            self._offset = offset
+
+    def read_new(self) -> List[Dict]:
+        """Records appended (by anyone) since the last call"""
+        with self._lock:
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return []
+            with f:
+                st = os.fstat(f.fileno())
+                current = (st.st_dev, st.st_ino)
+                if self._file is None:
+                    self._file, self._offset = current, 0
+                # Rotated: the caller reloads and restart()s on the new file
+                if current != self._file or st.st_size <= self._offset:
+                    return []
+                f.seek(self._offset)
+                data = f.read()
+            # A writer may be mid-record; leave the partial line for next time
+            end = data.rfind(b"\n") + 1
+            self._offset += end
+
+            records = []
+            for line in data[:end].splitlines():
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        print(f"⚠️  Skipping corrupt record in {self.path}: {e}")
+                        continue
+                    if HEADER_KEY not in record:
+                        records.append(record)
+            return records
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def rotate(self, start: int, log_id: str):
+        """
+        Replace the log with a fresh one, headed by `log_id`, holding the
+        records from byte `start` on (those appended after the caller's snapshot)
+
+        Appends wait for the swap, so every record ends up in exactly one file.
+        """
+        tmp = self.path + '.tmp'
+        self._makedirs()
+        with file_lock(self.lock_path):
+            with open(tmp, 'wb') as out:
+                out.write((json.dumps({HEADER_KEY: log_id}) + "\n").encode('utf-8'))
+                try:
+                    with open(self.path, 'rb') as f:
+                        f.seek(start)
+                        for block in iter(lambda: f.read(1 << 20), b''):
+                            out.write(block)
+                except FileNotFoundError:
+                    pass
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self.path)
@@ -0,0 +1,153 @@
+"""
+DietBundle - Self-contained, versioned artifact for the diet strategy model
+
+Replaces diet_model.pkl + the dataset CSV at runtime. A bundle directory holds:
+
+    manifest.json     format version, features, labels, n_neighbors, scaler
+                      parameters, per-file sha256 and an overall version hash
+    features.npy      (N, d) float64 training matrix, in manifest feature order
+    label_codes.npy   (N,) int16 codes into the sorted manifest labels
+
+Arrays are opened with mmap, so loading takes milliseconds, needs no pandas,
+and every worker process shares the same page-cache pages.
+Written by train_diet_model_demo.py.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BUNDLE_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+FEATURES_FILE = 'features.npy'
+LABELS_FILE = 'label_codes.npy'
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DietBundle:
+    def __init__(self, path: str, manifest: Dict, x: np.ndarray, label_codes: np.ndarray):
+        self.path = path
+        self.manifest = manifest
+        self.x = x
+        self.label_codes = label_codes
+
+    def __len__(self) -> int:
+        return len(self.label_codes)
+
+    @property
+    def features(self) -> List[str]:
+        return self.manifest['features']
+
+    @property
+    def labels(self) -> List[str]:
+        return self.manifest['labels']
+
+    @property
+    def n_neighbors(self) -> int:
+        return int(self.manifest.get('n_neighbors', 5))
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    @property
+    def mean(self) -> np.ndarray:
+        return np.array(self.manifest['scaler']['mean'])
+
+    @property
+    def scale(self) -> np.ndarray:
+        return np.array(self.manifest['scaler']['scale'])
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, verify: bool = True) -> "DietBundle":
+        """
+        Open a bundle, checking each file against its sha256 unless verify=False
+
+        Verifying reads every array once; the service does it when the model is
+        first loaded (in the parent process under serve.py), not on re-maps.
+        """
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != BUNDLE_VERSION:
+            raise ValueError(f"Diet bundle format {manifest.get('format_version')} != {BUNDLE_VERSION}, "
+                             f"re-run train_diet_model_demo.py")
+        if verify:
+            for name, meta in manifest['files'].items():
+                if _file_sha256(os.path.join(path, name)) != meta['sha256']:
+                    raise ValueError(f"Checksum mismatch for {os.path.join(path, name)}")
+
+        mode = 'r' if mmap else None
+        x = np.load(os.path.join(path, FEATURES_FILE), mmap_mode=mode)
+        codes = np.load(os.path.join(path, LABELS_FILE), mmap_mode=mode)
+        if x.shape != (manifest['count'], len(manifest['features'])) or codes.shape != (manifest['count'],):
+            raise ValueError(f"Diet bundle arrays in {path} don't match its manifest")
+        return cls(path, manifest, x, codes)
+
+
+def write_bundle(path: str, features: List[str], x: np.ndarray, labels: np.ndarray,
+                 n_neighbors: int = 5, source: Optional[Dict] = None, log: Optional[Dict] = None) -> Dict:
+    """
+    Write a bundle directory (replacing any existing one)
+
+    Args:
+        features: Feature names, in column order of x
+        x: (N, d) training matrix
+        labels: (N,) label strings; stored as codes into their sorted unique values
+        n_neighbors: Neighbours that vote on each prediction
+        source: Free-form provenance recorded in the manifest
+        log: Which profile-log records the rows already include (set by compaction)
+
+    Returns:
+        The written manifest
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    label_names, codes = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1.0
+
+    tmp_dir = path.rstrip('/') + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, FEATURES_FILE), x)
+    np.save(os.path.join(tmp_dir, LABELS_FILE), codes.astype(np.int16))
+
+    files = {name: {'sha256': _file_sha256(os.path.join(tmp_dir, name))} for name in (FEATURES_FILE, LABELS_FILE)}
+    manifest = {
+        'format_version': BUNDLE_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'count': len(x),
+        'features': list(features),
+        'labels': label_names.tolist(),
+        'n_neighbors': int(n_neighbors),
+        'scaler': {'mean': x.mean(axis=0).tolist(), 'scale': scale.tolist()},
+        'source': source or {},
+        'log': log or {},
+        'files': files,
+    }
+    # Content hash: changes whenever the data, labels or voting setup change
+    content = json.dumps({k: manifest[k] for k in ('features', 'labels', 'n_neighbors', 'files')}, sort_keys=True)
+    manifest['version'] = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = path.rstrip('/') + '.old'
+    if os.path.exists(path):
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.replace(path, old_dir)
+    os.replace(tmp_dir, path)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    return manifest
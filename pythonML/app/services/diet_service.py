@@ -1,33 +1,33 @@
 from app.models import DietLogRequest, DietRecommendationResponse, RecipeRequest, RecommendedMeal
-from app.services.recipe_service import RecipeService
+from app.services.recipe_service import RecipeService, NUTRITION_DB
 from app.services.meal_service import MealPlanService
 from app.services.nutrition_service import NutritionService
-from app.utils.data_consts import FOOD_CALORIES
-import pandas as pd
-import pickle
-import os
+from app.services.model_registry import LazyHandle
+from app.utils.data_consts import FOOD_CALORIES, DIET_INGREDIENTS
 import random
 
 class DietService:
-    def __init__(self):
-        self.model_path = "app/models/diet_model.pkl"
-        self.data_path = "data/diet_recommendations/diet_recommendations_dataset.csv"
-        self.model = None
-        self.data = None
-        self._load_model()
-        self.recipe_service = RecipeService() # Reuse this instance
-        self.mp_service = MealPlanService()
-        self.nutrition_service = NutritionService()  # For real calorie calculations
+    def __init__(self, recipe_service: RecipeService = None, mp_service: MealPlanService = None):
+        self._owns_recipe_service = recipe_service is None
+        self.recipe_service = recipe_service or RecipeService()
+        self._owns_mp_service = mp_service is None
+        self.mp_service = mp_service or MealPlanService(recipe_service=self.recipe_service)
+        self._nutrition = LazyHandle(NUTRITION_DB, NutritionService)  # For real calorie calculations
 
-    def _load_model(self):
-        try:
-            if os.path.exists(self.model_path) and os.path.exists(self.data_path):
-                with open(self.model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                self.data = pd.read_csv(self.data_path)
-                print("ML Model Loaded (KNN).")
-        except:
-            pass 
+    @property
+    def nutrition_service(self) -> NutritionService:
+        return self._nutrition.get()
+
+    def warm_up(self):
+        self.mp_service.warm_up()
+        self._nutrition.get()
+
+    def close(self):
+        self._nutrition.release()
+        if self._owns_mp_service:
+            self.mp_service.close()
+        if self._owns_recipe_service:
+            self.recipe_service.close()
 
     def recommend(self, request: DietLogRequest) -> DietRecommendationResponse:
         # 1. Analyze Context (Current Food) - Use real nutrition service
@@ -39,32 +39,10 @@ class DietService:
         rem = limit - est_cals
         
         # 3. ML Prediction (User Type / Strategy)
-        diet_strategy = "Balanced" # Default
-        
-        if self.model:
-            try:
-                # Unpack Model
-                clf = self.model['model'] if isinstance(self.model, dict) else self.model
-                feats = self.model['features'] if isinstance(self.model, dict) else ['Age', 'Weight_kg', 'Height_cm', 'BMI']
-                
-                # Prepare Vector
-                vals = {
-                    'Age': request.userProfile.age,
-                    'Weight_kg': request.userProfile.weightKg,
-                    'Height_cm': request.userProfile.heightCm,
-                    'BMI': request.userProfile.weightKg / ((request.userProfile.heightCm/100)**2)
-                }
-                
-                if all(f in vals for f in feats):
-                    vec = [vals[f] for f in feats]
-                    input_df = pd.DataFrame([vec], columns=feats)
-                    _, idxs = clf.kneighbors(input_df)
-                    votes = self.data.iloc[idxs[0]]['Diet_Recommendation'].mode()
-                    diet_strategy = votes[0] if not votes.empty else "Balanced"
-                    print(f"DEBUG: User Profile -> Age: {request.userProfile.age}, W: {request.userProfile.weightKg}")
-                    print(f"DEBUG: ML Predicted Strategy (KNN): {diet_strategy}")
-            except Exception as e:
-                print(f"ML Error: {e}")
+        # Shares the meal service's predictor (one registry-held copy)
+        diet_strategy = self.mp_service._predict_strategy(request.userProfile)
+        print(f"DEBUG: User Profile -> Age: {request.userProfile.age}, W: {request.userProfile.weightKg}")
+        print(f"DEBUG: ML Predicted Strategy (KNN): {diet_strategy}")
 
         # 4. Determine Remaining Schedule
         current_meal_type = request.mealType.lower() if request.mealType else "lunch"
@@ -88,35 +66,27 @@ class DietService:
         plan_text.append(f"**Goal**: {int(limit)} kcal | **Remaining**: {int(rem)} kcal")
         plan_text.append("---")
         
-        diet_ingredients = {
-            "Keto": ["Chicken", "Avocado", "Spinach", "Cheese", "Salmon", "Eggs"],
-            "Vegan": ["Tofu", "Lentils", "Chickpeas", "Quinoa", "Kale"],
-            "Low-Carb": ["Turkey", "Zucchini", "Broccoli", "Cauliflower"],
-            "Paleo": ["Steak", "Carrots", "Asparagus", "Walnuts"],
-            "Balanced": ["Rice", "Chicken", "Veggies", "Beans", "Yogurt"],
-            "Mediterranean": ["Fish", "Olive Oil", "Tomatoes", "Feta"],
-            "DASH": ["Oats", "Banana", "Almonds", "Milk"]
-        }
+        diet_ingredients = DIET_INGREDIENTS
         base_pool = diet_ingredients.get(diet_strategy, diet_ingredients["Balanced"])
 
-        for meal_name, ratio in schedule:
-            meal_cals = int(rem * ratio)
-            if meal_cals < 200: meal_cals = 200 # Enforce minimum per meal to ensure generation
-            
+        recipe_reqs = []
+        for _ in schedule:
             # Select unique ingredients for this meal
             selected_ingredients = random.sample(base_pool, min(3, len(base_pool)))
             ingredients_str = ", ".join(selected_ingredients)
             
-            # Generate Recipe
-            gen_recipe = self.recipe_service.generate(RecipeRequest(
+            recipe_reqs.append(RecipeRequest(
                 ingredients=ingredients_str,
                 cuisine=diet_strategy,
                 dietaryRestrictions=diet_strategy
             ))
-            
+        
+        # Generate every remaining meal in one batched pass
+        gen_recipes = self.recipe_service.generate_many(recipe_reqs)
+        
+        for (meal_name, _), gen_recipe in zip(schedule, gen_recipes):
             # DON'T override - use the real calorie calculation from recipe service!
             # The recipe_service now uses NutritionService for accurate calories
-            # gen_recipe.calories = meal_cals  # REMOVED: Was overriding real data
             
             # Add to Text Summary (Backward Compat)
             plan_text.append(f"**{meal_name}** (~{gen_recipe.calories} kcal)")
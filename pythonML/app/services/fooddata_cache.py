@@ -0,0 +1,266 @@
+"""
+FoodData Cache - Compiled, memory-mappable form of the FoodData Central export
+
+The FDC JSON (tens of MB for foundation foods, several GB for branded foods) is
+streamed once into a small artifact directory:
+
+    manifest.json   format version, source fingerprint, per-file sha256
+    values.f32      (N, 4) float32 nutrient matrix, see NUTRIENT_COLUMNS
+    names.bin       UTF-8 food names, concatenated
+    offsets.u64     N + 1 byte offsets into names.bin
+    index/*.u32|u64 the IngredientIndex arrays (name and token-set hashes,
+                    token ids per food, token postings), see INDEX_ARRAYS
+
+Later startups check the manifest against the source file and map the arrays
+instead of parsing JSON, so memory stays flat however large the source is.
+Names are only decoded when one is read, and the ingredient index is mapped
+as compiled, so no worker tokenizes the database at startup.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from array import array
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.ingredient_index import INDEX_ARRAYS, build_index_arrays
+from app.services.nutrient_table import NUTRIENT_COLUMNS, NutrientTable
+from app.utils.json_stream import iter_array_items
+
+FORMAT_VERSION = 2
+
+# Top-level array of whichever FDC release is being read
+FOOD_ARRAY_KEYS = ('FoundationFoods', 'BrandedFoods', 'SRLegacyFoods', 'SurveyFoods')
+
+# FDC nutrient id -> column in NUTRIENT_COLUMNS
+NUTRIENT_IDS = {
+    1008: 0,  # Energy (kcal)
+    1003: 1,  # Protein
+    1004: 2,  # Total lipid (fat)
+    1005: 3,  # Carbohydrate
+}
+
+MANIFEST_FILE = 'manifest.json'
+VALUES_FILE = 'values.f32'
+NAMES_FILE = 'names.bin'
+OFFSETS_FILE = 'offsets.u64'
+INDEX_DIR = 'index'
+
+
+def index_file(array_name: str) -> str:
+    """Path of an ingredient index array inside the cache, e.g. index/postings.u32"""
+    suffix = 'u64' if INDEX_ARRAYS[array_name] == np.uint64 else 'u32'
+    return f"{INDEX_DIR}/{array_name}.{suffix}"
+
+
+class NameList(Sequence):
+    """Food names of a compiled cache, decoded from the mapped names.bin only when read"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].tobytes().decode('utf-8')
+
+
+def _map(path: str, dtype, count: int) -> np.ndarray:
+    # np.memmap refuses empty files
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def extract_nutrients(food_nutrients: List[Dict]) -> Dict[str, float]:
+    """Extract calories, protein, fat, carbs from an FDC foodNutrients array"""
+    nutrients = {col: 0 for col in NUTRIENT_COLUMNS}
+    for nutrient in food_nutrients:
+        col = NUTRIENT_IDS.get(nutrient.get('nutrient', {}).get('id'))
+        if col is not None:
+            nutrients[NUTRIENT_COLUMNS[col]] = nutrient.get('amount', 0)
+    return nutrients
+
+
+def source_fingerprint(path: str) -> Dict:
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def defaults_digest(defaults: Dict[str, Dict[str, float]]) -> str:
+    return hashlib.sha256(json.dumps(defaults, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def build_cache(source_path: str, cache_dir: str, defaults: Dict[str, Dict[str, float]]) -> Dict:
+    """
+    Stream `source_path` into a fresh artifact at `cache_dir`
+
+    Defaults come first; an FDC food with the same (lower-cased) description
+    overwrites the default in place, exactly like the old dict merge did.
+    Only one food's JSON is held in memory at a time.
+
+    Returns:
+        The written manifest
+    """
+    start = time.perf_counter()
+    fingerprint = source_fingerprint(source_path)
+
+    rows: Dict[str, int] = {}
+    names: List[str] = []
+    values = array('f')
+
+    def put(name: str, nutrients: Dict[str, float]):
+        row = [float(nutrients.get(col, 0)) for col in NUTRIENT_COLUMNS]
+        idx = rows.get(name)
+        if idx is None:
+            rows[name] = len(names)
+            names.append(name)
+            values.extend(row)
+        else:
+            values[idx * 4:(idx + 1) * 4] = array('f', row)
+
+    for name, nutrients in defaults.items():
+        put(name, nutrients)
+
+    source_hash = hashlib.sha256()
+    array_key = None
+    foods = 0
+    with open(source_path, 'rb') as f:
+        for array_key, food in iter_array_items(f, FOOD_ARRAY_KEYS, hasher=source_hash):
+            put(food.get('description', '').lower(), extract_nutrients(food.get('foodNutrients', [])))
+            foods += 1
+            if foods % 100000 == 0:
+                print(f"  Compiled {foods} foods...")
+
+    tmp_dir = cache_dir.rstrip('/') + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+    with open(os.path.join(tmp_dir, VALUES_FILE), 'wb') as f:
+        values.tofile(f)
+    with open(os.path.join(tmp_dir, NAMES_FILE), 'wb') as f:
+        f.write(b''.join(encoded))
+    offsets.tofile(os.path.join(tmp_dir, OFFSETS_FILE))
+
+    # Every worker maps the compiled index instead of tokenizing every name at startup
+    os.makedirs(os.path.join(tmp_dir, INDEX_DIR))
+    for array_name, arr in build_index_arrays(names).items():
+        arr.astype(INDEX_ARRAYS[array_name], copy=False).tofile(os.path.join(tmp_dir, index_file(array_name)))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'count': len(names),
+        'columns': list(NUTRIENT_COLUMNS),
+        'source': dict(fingerprint, sha256=source_hash.hexdigest(), array_key=array_key, foods=foods),
+        'defaults_sha256': defaults_digest(defaults),
+        'files': {
+            name: {
+                'bytes': os.path.getsize(os.path.join(tmp_dir, name)),
+                'sha256': _file_sha256(os.path.join(tmp_dir, name)),
+            }
+            for name in (VALUES_FILE, NAMES_FILE, OFFSETS_FILE, *map(index_file, INDEX_ARRAYS))
+        },
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the finished directory into place so readers never see a half-written cache
+    old_dir = cache_dir.rstrip('/') + '.old'
+    if os.path.exists(cache_dir):
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.replace(cache_dir, old_dir)
+    os.replace(tmp_dir, cache_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+    print(f"✅ Compiled {foods} {array_key or 'FDC'} foods into {cache_dir} "
+          f"({len(names)} unique, {time.perf_counter() - start:.1f}s)")
+    return manifest
+
+
+def read_manifest(cache_dir: str) -> Optional[Dict]:
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def stale_reason(manifest: Optional[Dict], source_path: Optional[str] = None,
+                 defaults: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[str]:
+    """Why the cache can't be used for this source/defaults, or None if it is current"""
+    if manifest is None:
+        return "no compiled cache"
+    if manifest.get('format_version') != FORMAT_VERSION:
+        return f"format version {manifest.get('format_version')} != {FORMAT_VERSION}"
+    if manifest.get('columns') != list(NUTRIENT_COLUMNS):
+        return "nutrient columns changed"
+    if defaults is not None and manifest.get('defaults_sha256') != defaults_digest(defaults):
+        return "default ingredients changed"
+    if source_path is not None and os.path.exists(source_path):
+        # Size + mtime is enough to notice a new release without re-hashing gigabytes
+        current = source_fingerprint(source_path)
+        recorded = manifest.get('source', {})
+        if (current['size'], current['mtime_ns']) != (recorded.get('size'), recorded.get('mtime_ns')):
+            return "source JSON changed"
+    return None
+
+
+def load_cache(cache_dir: str, verify: bool = False) -> NutrientTable:
+    """
+    Map a compiled cache as a NutrientTable
+
+    Values, names and the ingredient index stay on disk behind read-only
+    memmaps (shared between processes); a name is decoded when it is read.
+    With verify=True every file is checked against its manifest sha256.
+    """
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No compiled FoodData cache in {cache_dir}")
+
+    count = manifest['count']
+    for name, meta in manifest['files'].items():
+        path = os.path.join(cache_dir, name)
+        if os.path.getsize(path) != meta['bytes']:
+            raise ValueError(f"{path} is {os.path.getsize(path)} bytes, manifest says {meta['bytes']}")
+        if verify and _file_sha256(path) != meta['sha256']:
+            raise ValueError(f"Checksum mismatch for {path}")
+
+    width = len(NUTRIENT_COLUMNS)
+    values = _map(os.path.join(cache_dir, VALUES_FILE), np.float32, count * width).reshape(count, width)
+
+    offsets = _map(os.path.join(cache_dir, OFFSETS_FILE), np.uint64, count + 1)
+    blob = _map(os.path.join(cache_dir, NAMES_FILE), np.uint8, manifest['files'][NAMES_FILE]['bytes'])
+    index_arrays = {}
+    for array_name, dtype in INDEX_ARRAYS.items():
+        path = os.path.join(cache_dir, index_file(array_name))
+        index_arrays[array_name] = _map(path, dtype, os.path.getsize(path) // np.dtype(dtype).itemsize)
+
+    return NutrientTable(NameList(blob, offsets), values, index_arrays)
@@ -0,0 +1,386 @@
+"""
+GenerationBatcher - Dynamic micro-batching for GPT-2 recipe generation
+
+Callers submit prompts from any thread. A single worker thread collects prompts
+for a few milliseconds, left-pads them into one batched model.generate() call
+and hands each caller back its own decoded text.
+
+A batcher can be bound to a CPU set and its own torch thread count (see
+ReplicaPool): its worker thread, and every stream thread it starts, pin
+themselves before running the model.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.profiler import profiler
+from app.utils import config
+from app.utils.metrics import BATCH_SIZE, GENERATED_TOKENS, STAGE_SECONDS, TOKENS_PER_SECOND
+
+
+class RngGate:
+    """
+    Shared/exclusive gate around torch's global sampling RNG
+
+    Unseeded decodes (batches, streams, other replicas) may sample concurrently;
+    a seeded decode waits for them and runs alone, so its output stays
+    reproducible and its seed never leaks into anyone else's sampling.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            # Waiting seeded decodes go first, so they can't be starved
+            while self._exclusive or self._waiting:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            while self._exclusive or self._shared:
+                self._cond.wait()
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+class JobFuture(Future):
+    """Future of a queued prompt that can also report when its batch starts decoding"""
+
+    def __init__(self):
+        super().__init__()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._start_callbacks = []
+
+    def add_start_callback(self, fn):
+        """Call fn(future) once the batcher picks the prompt up (now, if it already has)"""
+        with self._start_lock:
+            if not self._started:
+                self._start_callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_running_or_notify_cancel(self) -> bool:
+        running = super().set_running_or_notify_cancel()
+        if running:
+            with self._start_lock:
+                self._started = True
+                callbacks, self._start_callbacks = self._start_callbacks, []
+            for fn in callbacks:
+                fn(self)
+        return running
+
+
+class _Job:
+    def __init__(self, prompt: str, seed: Optional[int] = None):
+        self.prompt = prompt
+        self.seed = seed
+        self.future = JobFuture()
+
+
+class GenerationBatcher:
+    def __init__(self, tokenizer, model, max_batch_size: int = None, max_wait_ms: float = None,
+                 cpus: Optional[Sequence[int]] = None, num_threads: int = 0, rng_gate=None, name: str = "recipe-batcher"):
+        """
+        Args:
+            cpus: Logical CPUs the model threads are pinned to (None = leave affinity alone)
+            num_threads: torch intra-op threads for this batcher's calls (0 = torch default)
+            rng_gate: RngGate shared by every batcher sampling from torch's global RNG
+                (default: a gate of its own, still needed for its stream threads)
+        """
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size or config.RECIPE_BATCH_MAX_SIZE)
+        self.max_wait = (config.RECIPE_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.cpus = sorted(cpus) if cpus else None
+        self.num_threads = num_threads
+        self.name = name
+        self._rng_gate = rng_gate or RngGate()
+
+        # Batched decoding needs left padding so every row continues from its last real token
+        self.tokenizer.padding_side = 'left'
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        vocab = self.tokenizer.get_vocab()
+        self.end_token_id = self.tokenizer.encode('<END>')[0] if '<END>' in vocab else self.tokenizer.eos_token_id
+
+        self._queue = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+        # Prompts queued or decoding plus open streams; ReplicaPool dispatches on it
+        self._load_lock = threading.Lock()
+        self._load = 0
+        self._counts = {'jobs': 0, 'batches': 0, 'streams': 0, 'cancelled': 0}
+
+    @property
+    def load(self) -> int:
+        return self._load
+
+    def _add_load(self, n: int):
+        with self._load_lock:
+            self._load += n
+
+    def _bind_thread(self):
+        """Pin the calling thread to this batcher's CPUs and thread count"""
+        # Linux applies affinity per thread; the OpenMP team this thread starts inherits it
+        if self.cpus is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cpus)
+        if self.num_threads:
+            import torch
+            # OpenMP's thread count is per calling thread, so replicas don't override each other
+            torch.set_num_threads(self.num_threads)
+
+    @contextmanager
+    def _sampling(self, seed: Optional[int]):
+        """
+        Hold the RNG gate for one decode, seeding torch's global RNG if asked
+
+        A seeded decode owns the RNG and re-seeds it from entropy when done:
+        transformers samples from the global RNG (generate() takes no
+        Generator), so otherwise every later unseeded decode would replay the
+        seeded stream. Unseeded decodes may share it.
+        """
+        if seed is None:
+            with self._rng_gate.shared():
+                yield
+            return
+        import torch
+        with self._rng_gate.exclusive():
+            torch.manual_seed(seed)
+            try:
+                yield
+            finally:
+                torch.seed()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'name': self.name, 'cpus': self.cpus, 'threads': self.num_threads, 'load': self._load, **self._counts}
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so (re)start the worker in whichever process submits
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            thread = threading.Thread(target=self._worker, args=(self._queue,),
+                                      name=self.name, daemon=True)
+            thread.start()
+            self._worker_pid = os.getpid()
+
+    def submit(self, prompt: str, seed: Optional[int] = None) -> JobFuture:
+        """
+        Queue a prompt; the Future resolves to the decoded generated text
+
+        Cancelling the Future while the prompt is still queued drops it; once
+        its batch has started it can no longer be cancelled.
+        """
+        self._ensure_worker()
+        job = _Job(prompt, seed)
+        self._add_load(1)
+        job.future.add_done_callback(lambda _: self._add_load(-1))
+        self._queue.put(job)
+        return job.future
+
+    def submit_many(self, prompts: List[str], seeds: List[Optional[int]] = None) -> List[JobFuture]:
+        """Queue several prompts back to back so they land in the same batch"""
+        seeds = seeds or [None] * len(prompts)
+        return [self.submit(p, seed) for p, seed in zip(prompts, seeds)]
+
+    def generate(self, prompt: str, seed: Optional[int] = None) -> str:
+        return self.submit(prompt, seed).result()
+
+    def _claim(self, job: _Job) -> bool:
+        """Mark a dequeued job running; False if its caller cancelled it while it was queued"""
+        if job.future.set_running_or_notify_cancel():
+            return True
+        self._counts['cancelled'] += 1
+        return False
+
+    def _collect(self, jobs: "queue.Queue", held: Optional[_Job]) -> Tuple[List[_Job], Optional[_Job]]:
+        first = held
+        while first is None:
+            first = jobs.get()
+            if not self._claim(first):
+                first = None
+        batch = [first]
+        # Seeded prompts decode alone so their sampling RNG stream is reproducible
+        if first.seed is not None:
+            return batch, None
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if not self._claim(job):
+                continue
+            if job.seed is not None:
+                return batch, job  # Starts the next batch on its own
+            batch.append(job)
+        return batch, None
+
+    def _worker(self, jobs: "queue.Queue"):
+        try:
+            self._bind_thread()
+        except Exception as e:
+            print(f"⚠️  {self.name}: could not pin to CPUs {self.cpus}: {e}")
+        held = None
+        while True:
+            batch, held = self._collect(jobs, held)
+            self._counts['batches'] += 1
+            self._counts['jobs'] += len(batch)
+            try:
+                with self._sampling(batch[0].seed):
+                    texts = self._run_batch([job.prompt for job in batch])
+            except Exception as e:
+                for job in batch:
+                    self._resolve(job.future.set_exception, e)
+                continue
+            for job, text in zip(batch, texts):
+                self._resolve(job.future.set_result, text)
+
+    @staticmethod
+    def _resolve(setter, value):
+        # Claimed futures can't be cancelled, but a worker must never die on one that was
+        try:
+            setter(value)
+        except InvalidStateError:
+            pass
+
+    def _generate_kwargs(self) -> dict:
+        return dict(
+            max_length=config.RECIPE_MAX_LENGTH,
+            num_return_sequences=1,
+            temperature=0.8,
+            top_p=0.9,
+            do_sample=True,
+            pad_token_id=self.tokenizer.pad_token_id,
+            eos_token_id=self.end_token_id
+        )
+
+    def _run_batch(self, prompts: List[str]) -> List[str]:
+        with STAGE_SECONDS.time(stage="tokenize"):
+            inputs = self.tokenizer(prompts, return_tensors='pt', padding=True)
+
+        # max_length would count the left padding, cutting short prompts short in a
+        # mixed batch; decode for the longest budget and trim every row to its own
+        width = inputs['input_ids'].shape[1]
+        budgets = (config.RECIPE_MAX_LENGTH - inputs['attention_mask'].sum(dim=1)).clamp(min=0)
+        kwargs = self._generate_kwargs()
+        del kwargs['max_length']
+
+        start = time.perf_counter()
+        with profiler.generate_span():
+            outputs = self.model.generate(
+                inputs['input_ids'],
+                attention_mask=inputs['attention_mask'],
+                max_new_tokens=max(1, int(budgets.max())),
+                **kwargs
+            )
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage="generate")
+        BATCH_SIZE.observe(len(prompts))
+
+        for row, budget in enumerate(budgets.tolist()):
+            outputs[row, width + budget:] = self.tokenizer.pad_token_id
+
+        # New tokens only: everything after the (left-padded) prompt that isn't padding
+        new_tokens = int((outputs[:, width:] != self.tokenizer.pad_token_id).sum())
+        GENERATED_TOKENS.inc(new_tokens)
+        if elapsed > 0:
+            TOKENS_PER_SECOND.observe(new_tokens / elapsed)
+
+        with STAGE_SECONDS.time(stage="decode"):
+            return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def stream(self, prompt: str, seed: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield decoded text chunks for one prompt as tokens are produced
+
+        Streams bypass the batch queue: each one runs its own generate() on a
+        helper thread so the caller sees tokens as soon as they are decoded.
+        Closing the iterator early (the client went away) stops that
+        generate() at its next token instead of decoding to max_length.
+        """
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        cancelled = threading.Event()
+
+        class _Cancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                import torch
+                return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool)
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        inputs = self.tokenizer(prompt, return_tensors='pt')
+        errors = []
+
+        def run():
+            try:
+                self._bind_thread()
+                start = time.perf_counter()
+                with self._sampling(seed), profiler.generate_span():
+                    outputs = self.model.generate(
+                        inputs['input_ids'],
+                        attention_mask=inputs['attention_mask'],
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([_Cancelled()]),
+                        **self._generate_kwargs()
+                    )
+                elapsed = time.perf_counter() - start
+                STAGE_SECONDS.observe(elapsed, stage="generate")
+                # Counted like a batch of one, so tokens/second covers streams too
+                new_tokens = int((outputs[:, inputs['input_ids'].shape[1]:] != self.tokenizer.pad_token_id).sum())
+                GENERATED_TOKENS.inc(new_tokens)
+                if elapsed > 0:
+                    TOKENS_PER_SECOND.observe(new_tokens / elapsed)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        with self._load_lock:
+            self._load += 1
+            self._counts['streams'] += 1
+        try:
+            thread = threading.Thread(target=run, name=f"{self.name}-stream", daemon=True)
+            thread.start()
+            for chunk in streamer:
+                yield chunk
+            thread.join()
+        finally:
+            cancelled.set()
+            self._add_load(-1)
+        if errors:
+            raise errors[0]
@@ -0,0 +1,82 @@
+"""
+Inference backends for the GPT-2 recipe model
+
+Each backend returns a (tokenizer, model) pair whose model supports the usual
+Hugging Face generate() API, so batching and streaming work with any of them:
+
+    eager - fp32 PyTorch, as trained
+    int8  - PyTorch with Linear layers dynamically quantized to int8
+    onnx  - ONNX Runtime export with KV-cache (see export_recipe_model.py)
+"""
+import os
+from typing import Callable, Dict, Tuple
+
+from app.utils import config
+
+
+def load_eager(model_path: str) -> Tuple:
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+    tokenizer = GPT2Tokenizer.from_pretrained(model_path)
+    model = GPT2LMHeadModel.from_pretrained(model_path)
+    model.eval()  # Set to evaluation mode
+    return tokenizer, model
+
+
+def _conv1d_to_linear(model):
+    """
+    GPT-2 stores its projections in transformers' Conv1D (a transposed Linear),
+    which quantize_dynamic does not recognise; swap them for nn.Linear first
+    """
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+
+def load_int8(model_path: str) -> Tuple:
+    import torch
+
+    tokenizer, model = load_eager(model_path)
+    model = _conv1d_to_linear(model)
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return tokenizer, model
+
+
+def load_onnx(model_path: str) -> Tuple:
+    # model_path is the PyTorch checkpoint; the export lives next to it
+    from optimum.onnxruntime import ORTModelForCausalLM
+    from transformers import GPT2Tokenizer
+
+    onnx_path = config.RECIPE_ONNX_PATH
+    if not os.path.exists(onnx_path):
+        raise FileNotFoundError(
+            f"ONNX export not found at {onnx_path}; run 'python export_recipe_model.py export'"
+        )
+
+    tokenizer = GPT2Tokenizer.from_pretrained(onnx_path)
+    model = ORTModelForCausalLM.from_pretrained(onnx_path, use_cache=True, provider="CPUExecutionProvider")
+    return tokenizer, model
+
+
+BACKENDS: Dict[str, Callable[[str], Tuple]] = {
+    'eager': load_eager,
+    'int8': load_int8,
+    'onnx': load_onnx,
+}
+
+
+def load_backend(name: str, model_path: str) -> Tuple:
+    """Load the recipe model with the named backend"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown recipe backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](model_path)
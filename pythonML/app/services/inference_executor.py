@@ -0,0 +1,303 @@
+"""
+InferenceExecutor - Dedicated, bounded worker pool for model calls
+
+Model work (GPT-2 generation, KNN scoring, plan building) runs here instead of
+in Starlette's shared threadpool, so cheap endpoints are never stuck behind it.
+Admission is bounded: once `workers + max_queue` calls are in flight, new ones
+are rejected straight away with a Retry-After hint, and every endpoint waits at
+most its own timeout. Recipe requests only hold a slot, not a thread, while
+they wait for the GPT-2 batcher (run_async), so the batcher can fill its
+micro-batches however few workers there are. Streams decode outside the
+batcher, one generate() each, so they have their own, smaller limit
+(max_streams). Under load latency stays bounded and the excess is shed.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class Overloaded(Exception):
+    """Admission queue is full; retry after `retry_after` seconds"""
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"{endpoint}: inference queue is full")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class InferenceTimeout(Exception):
+    """The call did not finish within the endpoint's timeout"""
+
+    def __init__(self, endpoint: str, timeout: float, retry_after: int):
+        super().__init__(f"{endpoint}: no result within {timeout:g}s")
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+
+def _allowed_cpus() -> set:
+    try:
+        return os.sched_getaffinity(0)
+    except AttributeError:
+        return set(range(os.cpu_count() or 1))
+
+
+def _cpuinfo_cores(allowed: set) -> List[List[int]]:
+    """Allowed logical CPUs grouped by (package, core); empty if /proc/cpuinfo has no topology"""
+    cores: Dict[tuple, List[int]] = {}
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = package = None
+            for line in f:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'processor':
+                    cpu, package = int(value), None
+                elif key == 'physical id':
+                    package = value.strip()
+                elif key == 'core id' and cpu in allowed:
+                    cores.setdefault((package, value.strip()), []).append(cpu)
+    except OSError:
+        pass
+    return sorted(sorted(cpus) for cpus in cores.values())
+
+
+def core_siblings() -> List[List[int]]:
+    """
+    Logical CPUs this process may run on, one list per physical core (lowest
+    CPU first). Without topology information every CPU is its own core.
+    """
+    allowed = _allowed_cpus()
+    return _cpuinfo_cores(allowed) or [[cpu] for cpu in sorted(allowed)]
+
+
+def physical_cores() -> int:
+    """Physical cores this process may run on (hyper-threads don't help matmuls)"""
+    allowed = _allowed_cpus()
+    cores = _cpuinfo_cores(allowed)
+    if cores:
+        return len(cores)
+
+    try:
+        import psutil
+        return min(len(allowed), psutil.cpu_count(logical=False) or len(allowed))
+    except ImportError:
+        return len(allowed)
+
+
+class InferenceExecutor:
+    def __init__(self, workers: int = 0, max_queue: int = 64, timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 60.0, max_streams: int = 0):
+        """
+        Args:
+            workers: Threads running model calls (0 = physical cores)
+            max_queue: Calls allowed to wait for a worker before new ones are rejected
+            max_streams: Streaming responses decoding at once (0 = physical cores)
+            timeouts: Per-endpoint timeout in seconds
+            default_timeout: Timeout for endpoints not in `timeouts`
+        """
+        self.workers = workers or physical_cores()
+        self.max_queue = max_queue
+        self.max_streams = max_streams or physical_cores()
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._streaming = 0
+        self._counts = {'admitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timeouts': 0}
+        self._waits = deque(maxlen=1024)
+        self._service_times = deque(maxlen=1024)
+        self._per_endpoint: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def timeout_for(self, endpoint: str) -> float:
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queued work divided over the workers"""
+        with self._lock:
+            avg = sum(self._service_times) / len(self._service_times) if self._service_times else 1.0
+            queued = max(0, self._in_flight - self._running - self._streaming)
+        return max(1, math.ceil(avg * (queued + 1) / self.workers))
+
+    def _count(self, endpoint: str, key: str):
+        # Imported here: serve.py imports this module before setting the environment app.utils.config reads
+        from app.utils.metrics import INFERENCE_CALLS
+        INFERENCE_CALLS.inc(endpoint=endpoint, outcome=key)
+        self._counts[key] += 1
+        stats = self._per_endpoint.setdefault(endpoint, {k: 0 for k in self._counts})
+        stats[key] += 1
+
+    def _admit(self, endpoint: str):
+        with self._lock:
+            if self._in_flight < self.capacity:
+                self._in_flight += 1
+                self._count(endpoint, 'admitted')
+                return
+            self._count(endpoint, 'rejected')
+        raise Overloaded(endpoint, self.retry_after())
+
+    def reserve(self, endpoint: str) -> Callable[[], None]:
+        """
+        Take an admission slot without running anything (for streaming responses
+        that do their work while being sent); returns the release function.
+
+        Every stream runs its own generate() alongside the batcher, so at most
+        max_streams are admitted at once however much queue room is left.
+
+        Raises:
+            Overloaded: no admission slot or stream slot is free
+        """
+        with self._lock:
+            admitted = self._in_flight < self.capacity and self._streaming < self.max_streams
+            if admitted:
+                self._in_flight += 1
+                self._streaming += 1
+            self._count(endpoint, 'admitted' if admitted else 'rejected')
+        if not admitted:
+            raise Overloaded(endpoint, self.retry_after())
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                with self._lock:
+                    self._in_flight -= 1
+                    self._streaming -= 1
+                    self._count(endpoint, 'completed')
+        return release
+
+    async def run_async(self, endpoint: str, job: Callable[[Callable[[], None]], Awaitable[Any]]) -> Any:
+        """
+        Await job(started) under an admission slot without holding a worker thread
+
+        For work that mostly waits on something else (the recipe batcher): the
+        slot bounds how many are in flight, while any number of them can be
+        waiting for the same micro-batch. Short blocking steps inside job()
+        go through offload(). The call counts as queued, and its wait is
+        measured, until job calls started() (from any thread), e.g. once the
+        batcher picks its prompt up.
+
+        Raises:
+            Overloaded: no admission slot is free
+            InferenceTimeout: no result within the endpoint's timeout
+        """
+        self._admit(endpoint)
+        admitted = time.perf_counter()
+        state = {'started': None, 'finished': False}
+
+        def started():
+            with self._lock:
+                if state['started'] is None and not state['finished']:
+                    state['started'] = time.perf_counter()
+                    self._running += 1
+                    self._waits.append(state['started'] - admitted)
+
+        outcome = 'failed'
+        timeout = self.timeout_for(endpoint)
+        try:
+            result = await asyncio.wait_for(job(started), timeout)
+            outcome = 'completed'
+            return result
+        except asyncio.TimeoutError:
+            outcome = 'timeouts'
+            raise InferenceTimeout(endpoint, timeout, self.retry_after())
+        finally:
+            with self._lock:
+                state['finished'] = True
+                if state['started'] is not None:
+                    self._running -= 1
+                    self._service_times.append(time.perf_counter() - state['started'])
+                self._in_flight -= 1
+                self._count(endpoint, outcome)
+
+    async def offload(self, fn: Callable[..., Any], *args) -> Any:
+        """Run a short blocking step on the pool, inside a slot already held by run_async()"""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def run(self, endpoint: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on the pool and await its result
+
+        Raises:
+            Overloaded: no admission slot is free
+            InferenceTimeout: no result within the endpoint's timeout
+        """
+        self._admit(endpoint)
+        enqueued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._waits.append(started - enqueued)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._service_times.append(time.perf_counter() - started)
+
+        # Each call gets exactly one outcome: whichever of done() and the timeout comes first
+        counted = []
+
+        def done(fut):
+            with self._lock:
+                self._in_flight -= 1
+                if not counted and not fut.cancelled():
+                    counted.append(True)
+                    self._count(endpoint, 'failed' if fut.exception() is not None else 'completed')
+
+        future = self._pool.submit(job)
+        future.add_done_callback(done)
+        timeout = self.timeout_for(endpoint)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # A call still waiting in the queue is dropped; one already running
+            # can't be interrupted and finishes in the background
+            future.cancel()
+            with self._lock:
+                if not counted:
+                    counted.append(True)
+                    self._count(endpoint, 'timeouts')
+            raise InferenceTimeout(endpoint, timeout, self.retry_after())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            service = sorted(self._service_times)
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'max_streams': self.max_streams,
+                'in_flight': self._in_flight,
+                'running': self._running,
+                'streaming': self._streaming,
+                'queue_depth': max(0, self._in_flight - self._running - self._streaming),
+                'wait_ms_p50': round(_percentile(waits, 50) * 1000, 2),
+                'wait_ms_p95': round(_percentile(waits, 95) * 1000, 2),
+                'wait_ms_max': round((waits[-1] if waits else 0.0) * 1000, 2),
+                'service_ms_p50': round(_percentile(service, 50) * 1000, 2),
+                **self._counts,
+                'endpoints': {name: dict(counts) for name, counts in self._per_endpoint.items()},
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
@@ -0,0 +1,269 @@
+"""
+IngredientIndex - Token inverted index for matching free-text ingredients to foods
+
+The index is a handful of flat integer arrays (see build_index_arrays): name
+and token-set hashes, every food's token ids, and per-token posting lists.
+The FoodData cache compiles them once next to the nutrient matrix and maps
+them at startup, so no worker re-tokenizes the database; small in-memory
+tables build them on the spot. Lookups never scan the whole database: a query
+is cleaned, then matched by
+  1. exact food name
+  2. the food whose words all appear in the query, covering the most of
+     them ("grilled chicken breast strips" -> "chicken breast"); among foods
+     covering as many, the one holding the query word nearest the end, which
+     in English is the head noun ("banana bread" -> "bread", not "banana";
+     "tuna sandwich" -> "sandwich"), then the longer name
+  3. the most general food that contains every word of the query
+     ("cheddar" -> "cheese, cheddar")
+Remaining ties are broken by name, so the answer never depends on load order.
+A bounded memo cache sits in front of the whole thing.
+"""
+import hashlib
+import re
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Preparation words and units that say nothing about which food it is
+DESCRIPTOR_RE = re.compile(
+    r'\b(chopped|diced|sliced|fresh|raw|cooked|boiled|grilled|fried|cup|cups|tablespoon|teaspoon|grams?|g|kg|oz|pound|lb)\b'
+)
+TOKEN_RE = re.compile(r'[a-z]+')
+STOPWORDS = frozenset({'a', 'an', 'and', 'the', 'of', 'with', 'in', 'or', 'on', 'to', 'for'})
+
+# Free text can be long; cap the words considered when looking for contained foods (the last ones, nearest the head noun)
+MAX_QUERY_TOKENS = 12
+
+# Arrays making up an index, with their dtypes:
+#   name_keys / name_ids        sorted text_key() of every name, and the food it belongs to
+#   token_keys                  sorted text_key() of every token; a token's id is its position
+#   name_tokens(_offsets)       sorted token ids of food i at name_tokens[offsets[i]:offsets[i + 1]]
+#   postings(_offsets)          foods containing token t, most general first
+#   set_keys / set_ids          sorted set_key() of every distinct token set, and its most specific food
+INDEX_ARRAYS = {
+    'name_keys': np.uint64,
+    'name_ids': np.uint32,
+    'token_keys': np.uint64,
+    'name_tokens': np.uint32,
+    'name_token_offsets': np.uint64,
+    'postings': np.uint32,
+    'posting_offsets': np.uint64,
+    'set_keys': np.uint64,
+    'set_ids': np.uint32,
+}
+
+
+def _stem(token: str) -> str:
+    # Just enough plural folding that "tomatoes" finds "tomato" and "eggs" finds "egg"
+    if len(token) > 3:
+        if token.endswith('ies'):
+            return token[:-3] + 'y'
+        if token.endswith('oes'):
+            return token[:-2]
+        if token.endswith('s') and not token.endswith('ss'):
+            return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> FrozenSet[str]:
+    return frozenset(query_tokens(text))
+
+
+def query_tokens(text: str) -> List[str]:
+    """Distinct tokens of text in order of appearance (the last one is usually the head noun)"""
+    return list(dict.fromkeys(_stem(t) for t in TOKEN_RE.findall(text) if t not in STOPWORDS))
+
+
+def clean_ingredient(ingredient: str) -> str:
+    """Lower-case, drop preparation words/units and collapse whitespace"""
+    return " ".join(DESCRIPTOR_RE.sub('', ingredient.lower()).split())
+
+
+def text_key(text: str) -> int:
+    """Stable 64-bit hash of a string (the same in every process, unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def set_key(tokens: Iterable[str]) -> int:
+    return text_key(' '.join(sorted(tokens)))
+
+
+def _flatten(lists: List[List[int]], dtype) -> Tuple[np.ndarray, np.ndarray]:
+    """(values, offsets) of a ragged list: list i is values[offsets[i]:offsets[i + 1]]"""
+    offsets = np.zeros(len(lists) + 1, dtype=np.uint64)
+    np.cumsum([len(l) for l in lists], out=offsets[1:])
+    flat = np.fromiter((x for l in lists for x in l), dtype=dtype, count=int(offsets[-1]))
+    return flat, offsets
+
+
+def build_index_arrays(names: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Tokenize every name once into the arrays IngredientIndex searches (see INDEX_ARRAYS)"""
+    n = len(names)
+    token_sets = [tokenize(name) for name in names]
+
+    name_keys = np.fromiter((text_key(name) for name in names), dtype=np.uint64, count=n)
+    # Stable, so a duplicated name resolves to its first occurrence
+    name_order = np.argsort(name_keys, kind='stable')
+
+    vocab = sorted({t for tokens in token_sets for t in tokens}, key=text_key)
+    token_ids = {t: i for i, t in enumerate(vocab)}
+    name_tokens, name_token_offsets = _flatten(
+        [sorted(token_ids[t] for t in tokens) for tokens in token_sets], np.uint32)
+
+    # Most general foods first, so a scan can stop at the first hit
+    general = sorted(range(n), key=lambda i: (len(token_sets[i]), len(names[i]), names[i]))
+    postings = [[] for _ in vocab]
+    for idx in general:
+        for t in token_sets[idx]:
+            postings[token_ids[t]].append(idx)
+    postings, posting_offsets = _flatten(postings, np.uint32)
+
+    # The most specific (longest name, then alphabetical) food for every distinct token set
+    by_set: Dict[FrozenSet[str], int] = {}
+    for idx, tokens in enumerate(token_sets):
+        best = by_set.get(tokens)
+        if tokens and (best is None or (-len(names[idx]), names[idx]) < (-len(names[best]), names[best])):
+            by_set[tokens] = idx
+    set_keys = np.fromiter((set_key(tokens) for tokens in by_set), dtype=np.uint64, count=len(by_set))
+    set_ids = np.fromiter(by_set.values(), dtype=np.uint32, count=len(by_set))
+    set_order = np.argsort(set_keys, kind='stable')
+
+    return {
+        'name_keys': name_keys[name_order],
+        'name_ids': name_order.astype(np.uint32),
+        'token_keys': np.fromiter((text_key(t) for t in vocab), dtype=np.uint64, count=len(vocab)),
+        'name_tokens': name_tokens,
+        'name_token_offsets': name_token_offsets,
+        'postings': postings,
+        'posting_offsets': posting_offsets,
+        'set_keys': set_keys[set_order],
+        'set_ids': set_ids[set_order],
+    }
+
+
+def _find(keys: np.ndarray, wanted: List[int]) -> np.ndarray:
+    """First position of each wanted key in the sorted array `keys`, -1 where it is absent"""
+    wanted = np.asarray(wanted, dtype=np.uint64)
+    pos = np.searchsorted(keys, wanted)
+    found = pos < len(keys)
+    found[found] = keys[pos[found]] == wanted[found]
+    return np.where(found, pos, -1)
+
+
+def _find_one(keys: np.ndarray, key: int) -> int:
+    pos = int(keys.searchsorted(np.uint64(key)))
+    return pos if pos < len(keys) and int(keys[pos]) == key else -1
+
+
+class IngredientIndex:
+    def __init__(self, names: Sequence[str], arrays: Optional[Dict[str, np.ndarray]] = None, memo_size: int = 8192):
+        """
+        Args:
+            names: Food names, by row id (a list, or the lazily decoded names of a compiled cache)
+            arrays: Prebuilt index arrays (see build_index_arrays); built from `names` if None
+        """
+        self.names = names
+        arrays = build_index_arrays(names) if arrays is None else arrays
+        self._name_keys = arrays['name_keys']
+        self._name_ids = arrays['name_ids']
+        self._token_keys = arrays['token_keys']
+        self._name_tokens = arrays['name_tokens']
+        self._name_token_offsets = arrays['name_token_offsets']
+        self._postings = arrays['postings']
+        self._posting_offsets = arrays['posting_offsets']
+        self._set_keys = arrays['set_keys']
+        self._set_ids = arrays['set_ids']
+        self._max_name_tokens = int(np.diff(self._name_token_offsets).max()) if len(names) else 0
+        self._memo = lru_cache(maxsize=memo_size)(self._match_clean)
+        # Queries share a small vocabulary, so token lookups repeat far more than whole queries
+        self._token_id = lru_cache(maxsize=memo_size)(self._lookup_token)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _specific_key(self, idx: int):
+        # Prefer the longer (more specific) name, then alphabetical
+        name = self.names[idx]
+        return (-len(name), name)
+
+    def _food_tokens(self, idx: int) -> np.ndarray:
+        return self._name_tokens[self._name_token_offsets[idx]:self._name_token_offsets[idx + 1]]
+
+    def _equal_keys(self, keys: np.ndarray, pos: int):
+        # Distinct strings sharing a 64-bit key are possible in principle, so callers verify each hit
+        key = keys[pos]
+        while pos < len(keys) and keys[pos] == key:
+            yield pos
+            pos += 1
+
+    def match(self, ingredient: str) -> Optional[int]:
+        """Index of the best matching food name, or None"""
+        return self._memo(clean_ingredient(ingredient))
+
+    def _match_clean(self, query: str) -> Optional[int]:
+        if not query:
+            return None
+
+        pos = _find_one(self._name_keys, text_key(query))
+        if pos >= 0:
+            for p in self._equal_keys(self._name_keys, pos):
+                idx = int(self._name_ids[p])
+                if self.names[idx] == query:
+                    return idx
+
+        ordered = query_tokens(query)
+        if not ordered:
+            return None
+
+        contained = self._contained_food(ordered)
+        if contained is not None:
+            return contained
+        return self._containing_food(frozenset(ordered))
+
+    def _lookup_token(self, word: str) -> int:
+        return _find_one(self._token_keys, text_key(word))
+
+    def _token_ids(self, words: Iterable[str]) -> Dict[str, int]:
+        """Token id of every word the index knows"""
+        ids = {w: self._token_id(w) for w in words}
+        return {w: t for w, t in ids.items() if t >= 0}
+
+    def _contained_food(self, ordered: List[str]) -> Optional[int]:
+        """Food whose words are a subset of the query, preferring the most words, then the latest one"""
+        ids = self._token_ids(ordered[-MAX_QUERY_TOKENS:])
+        position = {w: i for i, w in enumerate(ordered)}
+        words = sorted(ids)
+        for size in range(min(len(words), self._max_name_tokens), 0, -1):
+            subsets = list(combinations(words, size))
+            hits = []
+            for subset, pos in zip(subsets, _find(self._set_keys, [set_key(s) for s in subsets])):
+                if pos < 0:
+                    continue
+                subset_ids = sorted(ids[w] for w in subset)
+                for p in self._equal_keys(self._set_keys, int(pos)):
+                    idx = int(self._set_ids[p])
+                    if self._food_tokens(idx).tolist() == subset_ids:
+                        hits.append((-max(position[w] for w in subset), self._specific_key(idx), idx))
+            if hits:
+                return min(hits)[-1]
+        return None
+
+    def _containing_food(self, tokens: FrozenSet[str]) -> Optional[int]:
+        """Most general food that contains every word of the query"""
+        ids = self._token_ids(tokens)
+        if len(ids) < len(tokens):
+            return None
+        lists = sorted((self._postings[self._posting_offsets[t]:self._posting_offsets[t + 1]] for t in ids.values()),
+                       key=len)
+        # The shortest list is in general-first order; keep the foods found in every other list
+        candidates = lists[0]
+        keep = np.ones(len(candidates), dtype=bool)
+        for other in lists[1:]:
+            keep &= np.isin(candidates, other, assume_unique=True)
+        hits = np.flatnonzero(keep)
+        return int(candidates[hits[0]]) if len(hits) else None
+
+    def cache_info(self):
+        return self._memo.cache_info()
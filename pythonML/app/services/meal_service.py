@@ -1,55 +1,59 @@
 from app.models import UserProfile, MealPlanResponse, RecipeRequest, Meal
 from app.services.recipe_service import RecipeService
-import pandas as pd
-import pickle
-import os
+from app.services.model_registry import LazyHandle, ModelRegistry
+from app.services.strategy_predictor import DIET_STRATEGY, DEFAULT_STRATEGY, StrategyPredictor, load_strategy_predictor
+from app.utils.data_consts import MEAL_STRUCTURE
+from typing import Dict, List, Optional, Tuple
 import random
 
 class MealPlanService:
-    def __init__(self):
-        self.recipe_service = RecipeService()
-        self.model_path = "app/models/diet_model.pkl"
-        self.data_path = "data/diet_recommendations/diet_recommendations_dataset.csv"
-        self.model = None
-        self.data = None
-        self._load_model()
+    def __init__(self, recipe_service: RecipeService = None, strategy_predictor: StrategyPredictor = None):
+        self._owns_recipe_service = recipe_service is None
+        self.recipe_service = recipe_service or RecipeService()
+        if strategy_predictor is not None:
+            # A caller-supplied model (e.g. synthetic benchmark data) stays out of the shared registry
+            self._strategy = LazyHandle(DIET_STRATEGY, lambda: strategy_predictor, owner=ModelRegistry())
+        else:
+            self._strategy = LazyHandle(DIET_STRATEGY, load_strategy_predictor)
 
-    def _load_model(self):
-        try:
-            if os.path.exists(self.model_path) and os.path.exists(self.data_path):
-                with open(self.model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                self.data = pd.read_csv(self.data_path)
-                print("✅ MealPlanService: ML Model Loaded.")
-        except Exception as e:
-            print(f"⚠️ MealPlanService ML Load Error: {e}")
+    @property
+    def strategy_predictor(self) -> Optional[StrategyPredictor]:
+        return self._strategy.get()
 
-    def _predict_strategy(self, profile: UserProfile) -> str:
-        if not self.model: return "Balanced"
-        
+    @property
+    def strategy_predictor_if_loaded(self) -> Optional[StrategyPredictor]:
+        return self._strategy.peek()
+
+    def warm_up(self):
+        self._strategy.get()
+
+    def close(self):
+        self._strategy.release()
+        if self._owns_recipe_service:
+            self.recipe_service.close()
+
+    def predict_strategies(self, profiles: List[UserProfile]) -> List[Tuple[str, float]]:
+        """(strategy, neighbour vote share) for each profile, scored in one batch"""
+        predictor = self.strategy_predictor
+        if predictor is None:
+            return [(DEFAULT_STRATEGY, 0.0)] * len(profiles)
         try:
-            # Unpack Model
-            clf = self.model['model'] if isinstance(self.model, dict) else self.model
-            feats = self.model['features'] if isinstance(self.model, dict) else ['Age', 'Weight_kg', 'Height_cm', 'BMI']
-            
-            # Prepare Vector
-            vals = {
-                'Age': profile.age,
-                'Weight_kg': profile.weightKg,
-                'Height_cm': profile.heightCm,
-                'BMI': profile.weightKg / ((profile.heightCm/100)**2)
-            }
-            
-            if all(f in vals for f in feats):
-                vec = [vals[f] for f in feats]
-                input_df = pd.DataFrame([vec], columns=feats)
-                _, idxs = clf.kneighbors(input_df)
-                votes = self.data.iloc[idxs[0]]['Diet_Recommendation'].mode()
-                return votes[0] if not votes.empty else "Balanced"
+            return predictor.predict_many(profiles)
         except Exception as e:
             print(f"Prediction Error: {e}")
-        
-        return "Balanced"
+            return [(DEFAULT_STRATEGY, 0.0)] * len(profiles)
+
+    def add_profiles(self, profiles: List[UserProfile], labels: List[str],
+                     allow_new_labels: bool = False) -> Dict[str, int]:
+        """Add labelled profiles to the live strategy model (durable, no retrain)"""
+        predictor = self.strategy_predictor
+        if predictor is None:
+            raise RuntimeError("Diet strategy model is not available")
+        added = predictor.add_profiles(profiles, labels, allow_new_labels)
+        return {"added": added, "patients": len(predictor), "pending": predictor.pending}
+
+    def _predict_strategy(self, profile: UserProfile) -> str:
+        return self.predict_strategies([profile])[0][0]
 
     def _calculate_bmr(self, profile: UserProfile) -> float:
         # Standard Mifflin-St Jeor
@@ -72,30 +76,26 @@ class MealPlanService:
         print(f"DEBUG: Predicted Strategy: {strategy}")
         
         meals = []
-        current_cal = 0
         
         # Define ratios for meals
-        structure = [
-            ("Breakfast", 0.25, ["Oats", "Eggs", "Yogurt", "Berries"]),
-            ("Lunch", 0.35, ["Chicken", "Rice", "Quinoa", "Salad"]),
-            ("Snack", 0.10, ["Nuts", "Fruit", "Smoothie"]),
-            ("Dinner", 0.30, ["Fish", "Steak", "Tofu", "Vegetables"])
-        ]
+        structure = MEAL_STRUCTURE
         
-        for m_type, ratio, base_ings in structure:
-            meal_target = int(target_calories * ratio)
-            
+        recipe_reqs = []
+        for _, _, base_ings in structure:
             # Generate a recipe using the ML strategy
             ings = ", ".join(random.sample(base_ings, 2))
             
-            # Use RecipeService to generate content (uses GPT-2 if avail)
-            recipe_req = RecipeRequest(
+            recipe_reqs.append(RecipeRequest(
                 ingredients=ings, 
                 cuisine=strategy, 
                 dietaryRestrictions=strategy
-            )
-            gen_recipe = self.recipe_service.generate(recipe_req)
-            
+            ))
+        
+        # Use RecipeService to generate content (uses GPT-2 if avail);
+        # all meals go through one batched generation pass
+        gen_recipes = self.recipe_service.generate_many(recipe_reqs)
+        
+        for (m_type, _, _), gen_recipe in zip(structure, gen_recipes):
             # Use the REAL calorie calculation from the generated recipe
             # (RecipeService now uses NutritionService for accurate calories)
             meals.append(Meal(
@@ -104,7 +104,6 @@ class MealPlanService:
                 calories=gen_recipe.calories,  # ← Real calories from NutritionService!
                 macros=f"{strategy} Optimized ({gen_recipe.calories} kcal)" 
             ))
-            current_cal += gen_recipe.calories
 
         return MealPlanResponse(
             goal=profile.healthGoals,
@@ -0,0 +1,180 @@
+"""
+ModelRegistry - Process-wide, thread-safe home for heavy models and datasets
+
+Every service asks the registry for its artifacts (GPT-2, nutrition DB, diet KNN)
+instead of loading its own copy, so each artifact lives in memory exactly once
+per process no matter how many services use it.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def current_pss_bytes() -> int:
+    """
+    Proportional set size in bytes: pages shared with other processes (e.g.
+    pre-forked workers) count fractionally. 0 if it cannot be measured.
+    """
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process in bytes (0 if it cannot be measured)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+class _Entry:
+    def __init__(self, name: str):
+        self.name = name
+        self.value: Any = None
+        self.loaded = False
+        self.refcount = 0
+        self.load_seconds = 0.0
+        self.rss_bytes = 0
+        self.lock = threading.Lock()  # Serializes the load of this one artifact
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()  # Guards the entries dict and refcounts
+
+    def _entry(self, name: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = _Entry(name)
+                self._entries[name] = entry
+            return entry
+
+    def acquire(self, name: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return the shared handle for `name`, loading it with `loader` on first use
+
+        Each call takes a reference that should be given back with release().
+        Concurrent callers for the same artifact wait for a single load.
+        """
+        entry = self._entry(name)
+
+        with entry.lock:
+            if not entry.loaded:
+                rss_before = current_rss_bytes()
+                start = time.perf_counter()
+                entry.value = loader()
+                entry.load_seconds = time.perf_counter() - start
+                entry.rss_bytes = max(0, current_rss_bytes() - rss_before)
+                entry.loaded = True
+
+        with self._lock:
+            entry.refcount += 1
+        return entry.value
+
+    def get(self, name: str) -> Optional[Any]:
+        """Peek at a loaded artifact without taking a reference"""
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None or not entry.loaded:
+            return None
+        return entry.value
+
+    def release(self, name: str):
+        """Drop one reference; the artifact is unloaded when nobody holds it"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.refcount == 0:
+                return
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            del self._entries[name]
+
+        with entry.lock:
+            entry.value = None
+            entry.loaded = False
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(name)
+        return entry is not None and entry.loaded
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per-artifact load time, resident memory delta and reference count"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return [
+            {
+                'name': e.name,
+                'loaded': e.loaded,
+                'refcount': e.refcount,
+                'load_seconds': round(e.load_seconds, 3),
+                'rss_mb': round(e.rss_bytes / (1024 * 1024), 1),
+            }
+            for e in entries
+        ]
+
+    def print_report(self):
+        rows = self.report()
+        print("📦 Model registry (resident memory per artifact):")
+        if not rows:
+            print("   (nothing loaded)")
+        for row in rows:
+            print(f"   {row['name']:<16} {row['rss_mb']:>8.1f} MB  "
+                  f"{row['load_seconds']:>7.3f}s  refs={row['refcount']}")
+        print(f"   {'process total':<16} {current_rss_bytes() / (1024 * 1024):>8.1f} MB")
+
+
+# Shared by every service in the process
+registry = ModelRegistry()
+
+
+class LazyHandle:
+    """A service's single reference to a registry artifact, taken on first use"""
+
+    def __init__(self, name: str, loader: Callable[[], Any], owner: ModelRegistry = None):
+        self.name = name
+        self.loader = loader
+        self.registry = owner or registry
+        self._value: Any = None
+        self._acquired = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """Return the artifact, loading it (and blocking) if nobody has yet"""
+        if self._acquired:
+            return self._value
+        with self._lock:
+            if not self._acquired:
+                self._value = self.registry.acquire(self.name, self.loader)
+                self._acquired = True
+        return self._value
+
+    def peek(self) -> Optional[Any]:
+        """Return the artifact only if it is already loaded; never blocks on a load"""
+        if self._acquired or self.registry.is_loaded(self.name):
+            return self.get()
+        return None
+
+    def release(self):
+        with self._lock:
+            if self._acquired:
+                self.registry.release(self.name)
+                self._value = None
+                self._acquired = False
@@ -0,0 +1,83 @@
+"""
+NutrientTable - Compact columnar storage for per-100g nutrient values
+
+Food names map to row ids; nutrients live in one float32 matrix with columns
+(calories, protein, fat, carbs). That is 16 bytes per food instead of a dict
+per food, and lets whole meal plans be scored with a few NumPy operations.
+"""
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+NUTRIENT_COLUMNS = ('calories', 'protein', 'fat', 'carbs')
+
+# float32 keeps ~7 significant digits; source values have at most 3 decimals,
+# so rounding on the way out recovers them exactly
+VALUE_DECIMALS = 3
+
+
+class NutrientTable:
+    def __init__(self, names: Sequence[str], values: np.ndarray,
+                 index_arrays: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Args:
+            names: Food names by row id
+            values: (len(names), 4) nutrient matrix
+            index_arrays: Precompiled IngredientIndex arrays for these names, if any
+        """
+        if values.shape != (len(names), len(NUTRIENT_COLUMNS)):
+            raise ValueError(f"Expected values of shape ({len(names)}, {len(NUTRIENT_COLUMNS)}), got {values.shape}")
+        self.names = names
+        self.values = values
+        self.index_arrays = index_arrays
+        self._index: Optional[Dict[str, int]] = None
+
+    @property
+    def index(self) -> Dict[str, int]:
+        """name -> row id, built on first use (only the dict view needs it)"""
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.names)}
+        return self._index
+
+    @classmethod
+    def from_dict(cls, db: Dict[str, Dict[str, float]]) -> "NutrientTable":
+        names = list(db.keys())
+        values = np.array(
+            [[food.get(col, 0) for col in NUTRIENT_COLUMNS] for food in db.values()],
+            dtype=np.float32
+        ).reshape(len(names), len(NUTRIENT_COLUMNS))
+        return cls(names, values)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """Nutrient rows for the given ids as float64"""
+        return np.round(self.values[ids].astype(np.float64), VALUE_DECIMALS)
+
+    def row_dict(self, idx: int) -> Dict[str, float]:
+        return dict(zip(NUTRIENT_COLUMNS, self.rows(np.array([idx]))[0].tolist()))
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+
+class NutritionDbView(Mapping):
+    """Read-only name -> nutrient-dict view of a table, for code that expects the old dict"""
+
+    def __init__(self, table: NutrientTable):
+        self._table = table
+
+    def __getitem__(self, name: str) -> Dict[str, float]:
+        return self._table.row_dict(self._table.index[name])
+
+    def __contains__(self, name) -> bool:
+        return name in self._table.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.names)
+
+    def __len__(self) -> int:
+        return len(self._table)
@@ -1,73 +1,71 @@
 """
 NutritionService - Real calorie and macro calculations from FoodData Central
 """
-import json
 import os
 from typing import List, Dict, Optional
-import re
+from app.services.fooddata_cache import build_cache, extract_nutrients, load_cache, read_manifest, stale_reason
+from app.services.ingredient_index import IngredientIndex
+from app.services.nutrient_table import NutrientTable, NutritionDbView
+from app.utils import config
+from app.utils.metrics import STAGE_SECONDS
+import numpy as np
+
+# Per-serving totals assumed for an ingredient we cannot match (calories, protein, fat, carbs)
+FALLBACK_NUTRIENTS = np.array([150, 5, 3, 20], dtype=np.float64)
 
 class NutritionService:
     def __init__(self):
         """Initialize nutrition database from FoodData Central"""
         self.nutrition_db = {}
-        self._load_fooddata()
+        
+        # Nutrients live in one float32 matrix (memory-mapped from the compiled
+        # FoodData cache when available); nutrition_db is a read-only view of it
+        self.table = self._load_fooddata()
+        self.nutrition_db = NutritionDbView(self.table)
+        self._build_index()
+    
+    @classmethod
+    def from_table(cls, table: NutrientTable) -> "NutritionService":
+        """Service over an already-built table, skipping FoodData loading (benchmarks, synthetic data)"""
+        service = cls.__new__(cls)
+        service.table = table
+        service.nutrition_db = NutritionDbView(table)
+        service._build_index()
+        return service
     
-    def _load_fooddata(self):
-        """Load and parse FoodData Central JSON"""
+    def _build_index(self):
+        """Index food names once so ingredient lookups never scan the database"""
+        # A compiled FoodData cache ships the index arrays; only in-memory tables build them here
+        self._index = IngredientIndex(self.table.names, self.table.index_arrays)
+    
+    def _load_fooddata(self) -> NutrientTable:
+        """Load FoodData Central through its compiled cache, compiling it first if needed"""
         # ALWAYS load defaults first (common prepared foods not in FoodData Central)
         self._load_defaults()
         
-        json_path = "FoodData_Central_foundation_food_json_2025-04-24/FoodData_Central_foundation_food_json_2025-04-24.json"
-        
-        if not os.path.exists(json_path):
-            print(f"⚠️  FoodData Central not found at {json_path}, using defaults only")
-            return
+        json_path = config.FOODDATA_JSON_PATH
+        cache_dir = config.FOODDATA_CACHE_DIR
         
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            foods = data.get('FoundationFoods', [])
-            print(f"Merging nutrition data from {len(foods)} foundation foods...")
+            reason = stale_reason(read_manifest(cache_dir), json_path, self.nutrition_db)
+            if reason is not None:
+                if not os.path.exists(json_path):
+                    print(f"⚠️  FoodData Central not found at {json_path}, using defaults only")
+                    return NutrientTable.from_dict(self.nutrition_db)
+                print(f"Compiling FoodData Central from {json_path} ({reason})...")
+                build_cache(json_path, cache_dir, self.nutrition_db)
             
-            for food in foods:
-                description = food.get('description', '').lower()
-                nutrients = self._extract_nutrients(food.get('foodNutrients', []))
-                
-                if nutrients:
-                    # Add to database (or update if exists)
-                    self.nutrition_db[description] = nutrients
-            
-            print(f"✅ Total foods in database: {len(self.nutrition_db)} (defaults + FoodData Central)")
+            table = load_cache(cache_dir)
+            print(f"✅ Total foods in database: {len(table)} (defaults + FoodData Central, mapped from {cache_dir})")
+            return table
         
         except Exception as e:
             print(f"⚠️  Error loading FoodData Central: {e}, using defaults only")
+            return NutrientTable.from_dict(self.nutrition_db)
     
     def _extract_nutrients(self, food_nutrients: List[Dict]) -> Dict[str, float]:
         """Extract calories, protein, fat, carbs from nutrient array"""
-        nutrients = {
-            'calories': 0,
-            'protein': 0,
-            'fat': 0,
-            'carbs': 0
-        }
-        
-        for nutrient in food_nutrients:
-            nutrient_info = nutrient.get('nutrient', {})
-            nutrient_id = nutrient_info.get('id')
-            amount = nutrient.get('amount', 0)
-            
-            # Map nutrient IDs to our keys
-            if nutrient_id == 1008:  # Energy (kcal)
-                nutrients['calories'] = amount
-            elif nutrient_id == 1003:  # Protein
-                nutrients['protein'] = amount
-            elif nutrient_id == 1004:  # Total lipid (fat)
-                nutrients['fat'] = amount
-            elif nutrient_id == 1005:  # Carbohydrate
-                nutrients['carbs'] = amount
-        
-        return nutrients
+        return extract_nutrients(food_nutrients)
     
     def _load_defaults(self):
         """Load common ingredient defaults if FoodData Central is unavailable"""
@@ -128,24 +126,12 @@ class NutritionService:
         print(f"✅ Loaded {len(self.nutrition_db)} default ingredients")
     
     def _fuzzy_match_ingredient(self, ingredient: str) -> Optional[Dict[str, float]]:
-        """Find best match for ingredient in database using fuzzy matching"""
-        ingredient_clean = ingredient.lower().strip()
-        
-        # Remove common words and measurements
-        ingredient_clean = re.sub(r'\b(chopped|diced|sliced|fresh|raw|cooked|boiled|grilled|fried|cup|cups|tablespoon|teaspoon|grams?|g|kg|oz|pound|lb)\b', '', ingredient_clean)
-        ingredient_clean = ingredient_clean.strip()
-        
-        # Direct match
-        if ingredient_clean in self.nutrition_db:
-            return self.nutrition_db[ingredient_clean]
-        
-        # Partial match (find if any db key contains the ingredient or vice versa)
-        for db_food, nutrients in self.nutrition_db.items():
-            if ingredient_clean in db_food or db_food in ingredient_clean:
-                return nutrients
-        
-        # No match found
-        return None
+        """Find best match for ingredient in database (indexed, memoized, deterministic)"""
+        idx = self._index.match(ingredient)
+        if idx is None:
+            # No match found
+            return None
+        return self.table.row_dict(idx)
     
     def estimate_calories(self, ingredients: List[str], serving_size_g: int = 200) -> Dict[str, float]:
         """
@@ -158,37 +144,59 @@ class NutritionService:
         Returns:
             Dictionary with total calories, protein, fat, carbs
         """
-        total = {'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0}
-        matched_count = 0
+        return self.estimate_calories_batch([ingredients], serving_size_g)[0]
+    
+    def estimate_calories_batch(self, ingredient_lists: List[List[str]], serving_size_g: int = 200) -> List[Dict[str, float]]:
+        """
+        Estimate nutrition for many ingredient lists at once
         
-        for ingredient in ingredients:
-            nutrients = self._fuzzy_match_ingredient(ingredient)
-            
-            if nutrients:
-                # FoodData Central values are per 100g, scale to serving size
-                scaling_factor = serving_size_g / 100.0
-                
-                total['calories'] += nutrients['calories'] * scaling_factor
-                total['protein'] += nutrients['protein'] * scaling_factor
-                total['fat'] += nutrients['fat'] * scaling_factor
-                total['carbs'] += nutrients['carbs'] * scaling_factor
-                matched_count += 1
-            else:
-                # Use average fallback for unmatched ingredients
-                total['calories'] += 150  # Average calories per 200g serving
-                total['protein'] += 5
-                total['fat'] += 3
-                total['carbs'] += 20
+        Every ingredient is matched to a row id, then all lists are summed with
+        a single gather + bincount per nutrient column.
+        
+        Returns:
+            One estimate_calories()-style dictionary per input list
+        """
+        with STAGE_SECONDS.time(stage="nutrition"):
+            return self._estimate_batch(ingredient_lists, serving_size_g)
+    
+    def _estimate_batch(self, ingredient_lists: List[List[str]], serving_size_g: int) -> List[Dict[str, float]]:
+        sizes = np.array([len(lst) for lst in ingredient_lists], dtype=np.int64)
+        owners = np.repeat(np.arange(len(ingredient_lists)), sizes)
+        ids = np.array(
+            [self._match_id(ingredient) for lst in ingredient_lists for ingredient in lst],
+            dtype=np.int64
+        )
+        matched = ids >= 0
+        
+        # FoodData Central values are per 100g, scale to serving size;
+        # unmatched ingredients get the average fallback per serving
+        per_item = np.empty((len(ids), len(FALLBACK_NUTRIENTS)), dtype=np.float64)
+        per_item[matched] = self.table.rows(ids[matched]) * (serving_size_g / 100.0)
+        per_item[~matched] = FALLBACK_NUTRIENTS
+        
+        n = len(ingredient_lists)
+        totals = np.stack(
+            [np.bincount(owners, weights=per_item[:, col], minlength=n) for col in range(per_item.shape[1])],
+            axis=1
+        ) if len(ids) else np.zeros((n, len(FALLBACK_NUTRIENTS)))
+        matched_counts = np.bincount(owners, weights=matched, minlength=n) if len(ids) else np.zeros(n)
         
         # Round to integers
-        return {
-            'calories': int(total['calories']),
-            'protein': round(total['protein'], 1),
-            'fat': round(total['fat'], 1),
-            'carbs': round(total['carbs'], 1),
-            'matched_ingredients': matched_count,
-            'total_ingredients': len(ingredients)
-        }
+        return [
+            {
+                'calories': int(cal),
+                'protein': round(protein, 1),
+                'fat': round(fat, 1),
+                'carbs': round(carbs, 1),
+                'matched_ingredients': int(count),
+                'total_ingredients': int(size)
+            }
+            for (cal, protein, fat, carbs), count, size in zip(totals.tolist(), matched_counts.tolist(), sizes.tolist())
+        ]
+    
+    def _match_id(self, ingredient: str) -> int:
+        idx = self._index.match(ingredient)
+        return -1 if idx is None else idx
     
     def estimate_meal_calories(self, ingredients_str: str) -> int:
         """
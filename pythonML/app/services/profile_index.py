@@ -0,0 +1,263 @@
+"""
+ProfileIndex - IVF approximate nearest-neighbour index over patient profiles
+
+Exact KNN compares a query against every stored profile. For millions of rows
+the profiles are split into `nlist` k-means cells and stored cell by cell; a
+query only scans the `nprobe` cells whose centroids are closest. Distances are
+taken in the same raw feature space the exact StrategyPredictor votes in, so
+switching DIET_NEIGHBOR_SEARCH to ivf only trades recall, never the metric
+(standardize=True builds a different model on purpose). Everything lives in
+plain .npy files opened with mmap, so the OS pages in only the cells that are
+actually probed and workers share those pages.
+
+Built offline with build_diet_ann_index.py.
+"""
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_VERSION = 1
+META_FILE = 'meta.json'
+ARRAY_FILES = ('mean', 'scale', 'centroids', 'list_offsets', 'vectors', 'ids', 'label_codes')
+
+# Upper bound on the (rows x centroids) distance block held while assigning
+MAX_BLOCK_CELLS = 1 << 22
+
+
+def _sq_dists(q: np.ndarray, x: np.ndarray, x_sq: Optional[np.ndarray] = None) -> np.ndarray:
+    """Squared euclidean distances between every row of q and every row of x"""
+    if x_sq is None:
+        x_sq = np.einsum('ij,ij->i', x, x)
+    d2 = np.einsum('ij,ij->i', q, q)[:, None] - 2.0 * (q @ x.T) + x_sq[None, :]
+    return np.maximum(d2, 0, out=d2)
+
+
+def assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid for every row of x"""
+    # argmin |x - c|^2 = argmin (|c|^2 - 2 x.c); |x|^2 is the same for every centroid
+    neg2c = (-2.0 * centroids).T.astype(x.dtype)
+    c_sq = np.einsum('ij,ij->i', centroids, centroids).astype(x.dtype)
+    out = np.empty(len(x), dtype=np.int64)
+    block = max(1, MAX_BLOCK_CELLS // len(centroids))
+    for start in range(0, len(x), block):
+        d = x[start:start + block] @ neg2c
+        d += c_sq
+        out[start:start + block] = d.argmin(axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, nlist: int, iters: int = 10, seed: int = 0, max_train: int = 64) -> np.ndarray:
+    """
+    Lloyd's k-means on a sample of at most max_train rows per centroid
+
+    Empty cells are re-seeded from random training rows so every centroid is used.
+    """
+    rng = np.random.default_rng(seed)
+    if len(x) > nlist * max_train:
+        x = x[np.sort(rng.choice(len(x), nlist * max_train, replace=False))]
+    x = np.asarray(x, dtype=np.float32)
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        sums = np.stack([np.bincount(labels, weights=x[:, j], minlength=nlist) for j in range(x.shape[1])], axis=1)
+        empty = counts == 0
+        centroids[~empty] = (sums[~empty] / counts[~empty, None]).astype(np.float32)
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, centroids: np.ndarray,
+                 list_offsets: np.ndarray, vectors: np.ndarray, ids: np.ndarray,
+                 label_codes: Optional[np.ndarray] = None, meta: Optional[Dict] = None):
+        """
+        Args:
+            mean, scale: Transform applied to queries, (d,) (0 and 1 unless built standardized)
+            centroids: (nlist, d) cell centroids, in the transformed space
+            list_offsets: (nlist + 1,) start of each cell in vectors/ids
+            vectors: (N, d) transformed profiles, grouped by cell
+            ids: (N,) original row id of each entry in vectors
+            label_codes: (N,) label code per original row id, if the index carries labels
+            meta: Features, labels, nprobe default and build info
+        """
+        self.mean = mean
+        self.scale = scale
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.vectors = vectors
+        self.ids = ids
+        self.label_codes = label_codes
+        self.meta = meta or {}
+        self.path = None
+        self.nprobe = int(self.meta.get('nprobe', 8))
+        self._centroid_sq = np.einsum('ij,ij->i', centroids, centroids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def features(self) -> List[str]:
+        return self.meta.get('features', [])
+
+    @property
+    def labels(self) -> List[str]:
+        return self.meta.get('labels', [])
+
+    @classmethod
+    def build(cls, x: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8, iters: int = 10,
+              seed: int = 0, label_codes: Optional[np.ndarray] = None, meta: Optional[Dict] = None,
+              standardize: bool = False) -> "IVFIndex":
+        """
+        Train the coarse quantizer and bucket every row into its cell
+
+        With standardize=True rows and queries are z-scored first; neighbours
+        then differ from the exact raw-feature model's, which changes predictions.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        n = len(x)
+        # ~sqrt(N) cells of ~sqrt(N) rows: with only a handful of features,
+        # scanning a cell is cheap, so fewer, larger cells keep recall high
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        if standardize:
+            mean = x.mean(axis=0)
+            scale = x.std(axis=0)
+            scale[scale == 0] = 1.0
+        else:
+            mean = np.zeros(x.shape[1])
+            scale = np.ones(x.shape[1])
+        z = ((x - mean) / scale).astype(np.float32)
+
+        start = time.perf_counter()
+        centroids = kmeans(z, nlist, iters=iters, seed=seed)
+        cells = assign(z, centroids)
+        order = np.argsort(cells, kind='stable')
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=nlist), out=list_offsets[1:])
+
+        meta = dict(meta or {}, nprobe=nprobe, iters=iters, seed=seed, standardized=standardize,
+                    build_seconds=round(time.perf_counter() - start, 3))
+        codes = None if label_codes is None else np.asarray(label_codes, dtype=np.int64)
+        return cls(mean, scale, centroids, list_offsets, z[order], order.astype(np.int64), codes, meta)
+
+    def with_rows(self, x: np.ndarray, label_codes: Optional[np.ndarray] = None) -> "IVFIndex":
+        """
+        New in-memory index with rows appended (ids continue after the current ones)
+
+        The quantizer and standardization are kept; new rows just join their
+        nearest cell. Retrain with build_diet_ann_index.py once the data drifts.
+        """
+        z = self.transform(x)
+        cells = np.concatenate([
+            np.repeat(np.arange(self.nlist), np.diff(self.list_offsets)),
+            assign(z, self.centroids),
+        ])
+        vectors = np.concatenate([np.asarray(self.vectors), z])
+        ids = np.concatenate([np.asarray(self.ids), np.arange(len(self), len(self) + len(z), dtype=np.int64)])
+        order = np.argsort(cells, kind='stable')
+        list_offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.nlist), out=list_offsets[1:])
+
+        codes = self.label_codes
+        if codes is not None and label_codes is not None:
+            codes = np.concatenate([np.asarray(codes), np.asarray(label_codes, dtype=np.int64)])
+        index = IVFIndex(self.mean, self.scale, self.centroids, list_offsets, vectors[order], ids[order],
+                         codes, dict(self.meta))
+        index.nprobe = self.nprobe
+        return index
+
+    def transform(self, x: np.ndarray) -> np.ndarray:
+        return ((np.asarray(x, dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+
+    def search(self, x: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distances, ids) of the approximate k nearest rows for each query, nearest first
+
+        Distances are in the index's space (raw feature units unless built
+        standardized). Cells are probed nearest first; more than nprobe are
+        visited only if they hold fewer than k rows.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        k = min(k, len(self))
+        z = self.transform(x)
+        cell_d = _sq_dists(z, self.centroids, self._centroid_sq)
+        offsets = self.list_offsets
+
+        dist = np.empty((len(z), k), dtype=np.float64)
+        ids = np.empty((len(z), k), dtype=np.int64)
+        for i, q in enumerate(z):
+            cells = np.argsort(cell_d[i], kind='stable')
+            sizes = offsets[cells + 1] - offsets[cells]
+            take = max(nprobe, int(np.searchsorted(np.cumsum(sizes), k)) + 1)
+            rows = np.concatenate([np.arange(offsets[c], offsets[c + 1]) for c in cells[:take]])
+
+            cand = np.asarray(self.vectors[rows], dtype=np.float32)
+            d2 = ((cand - q) ** 2).sum(axis=1)
+            top = np.argpartition(d2, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            cand_ids = np.asarray(self.ids[rows[top]])
+            order = np.lexsort((cand_ids, d2[top]))
+            ids[i] = cand_ids[order]
+            dist[i] = np.sqrt(d2[top][order])
+        return dist, ids
+
+    def save(self, path: str):
+        """Write each array as .npy plus meta.json (replacing an existing index)"""
+        # Written next to the live index and swapped in, so workers that have it
+        # mmapped keep reading intact (old) files instead of torn ones
+        tmp_dir = path.rstrip('/') + '.tmp'
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        arrays = {
+            'mean': self.mean, 'scale': self.scale, 'centroids': self.centroids,
+            'list_offsets': self.list_offsets, 'vectors': self.vectors, 'ids': self.ids,
+        }
+        if self.label_codes is not None:
+            arrays['label_codes'] = self.label_codes
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(arr))
+
+        meta = dict(self.meta, version=INDEX_VERSION, count=len(self), dim=int(self.centroids.shape[1]),
+                    nlist=self.nlist, nprobe=self.nprobe, created=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        old_dir = path.rstrip('/') + '.old'
+        if os.path.exists(path):
+            if os.path.exists(old_dir):
+                shutil.rmtree(old_dir)
+            os.replace(path, old_dir)
+        os.replace(tmp_dir, path)
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Index version {meta.get('version')} != {INDEX_VERSION}, rebuild with build_diet_ann_index.py")
+
+        mode = 'r' if mmap else None
+        arrays = {}
+        for name in ARRAY_FILES:
+            file = os.path.join(path, f"{name}.npy")
+            arrays[name] = np.load(file, mmap_mode=mode) if os.path.exists(file) else None
+        # The small arrays are touched by every query; keep them in RAM
+        for name in ('mean', 'scale', 'centroids', 'list_offsets'):
+            arrays[name] = np.array(arrays[name])
+        index = cls(meta=meta, **arrays)
+        index.path = path
+        return index
@@ -0,0 +1,180 @@
+"""
+SamplingProfiler - On-demand statistical profiler for the running service
+
+POST /admin/profile starts it for the next N requests or T seconds. A sampler
+thread reads every thread's Python stack (sys._current_frames) at a fixed
+interval and counts identical stacks; the result is returned in the collapsed
+format flamegraph.pl / speedscope read ("thread;outer;...;inner count").
+Optionally the first model.generate() in the window is also recorded with the
+torch profiler and saved as a Chrome trace.
+
+When no profile is running nothing is sampled and nothing is hooked: the
+request middleware and the batcher only check a flag.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+# Leaf frames of threads that are parked, not working (dropped unless idle=True)
+IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),  # concurrent.futures worker blocked on its work queue
+}
+
+_NULL = nullcontext()
+
+
+class ProfileResult:
+    def __init__(self, collapsed: str, samples: int, seconds: float, requests: int, torch_trace: Optional[str]):
+        self.collapsed = collapsed
+        self.samples = samples
+        self.seconds = seconds
+        self.requests = requests
+        self.torch_trace = torch_trace
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._names: Dict[str, str] = {}
+
+    def start(self, seconds: float, requests: int = 0, interval_ms: float = 5.0, idle: bool = False,
+              torch_trace_dir: Optional[str] = None):
+        """
+        Begin sampling until `requests` requests have finished (0 = no limit) or
+        `seconds` have passed, whichever comes first
+
+        Raises:
+            RuntimeError: a profile is already running
+        """
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A profile is already running")
+            self._done.clear()
+            self._stacks = Counter()
+            self._samples = 0
+            self._requests = 0
+            self._request_limit = requests
+            self._deadline = time.monotonic() + seconds
+            self._interval = max(0.001, interval_ms / 1000.0)
+            self._idle = idle
+            self._torch_dir = torch_trace_dir
+            self._torch_trace = None
+            self._torch_running = False
+            self._torch_finished = threading.Event()
+            self._started = time.perf_counter()
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self.active = True
+        self._thread.start()
+
+    def request_finished(self):
+        """Called by the request middleware while a profile is running"""
+        with self._lock:
+            self._requests += 1
+            if self._request_limit and self._requests >= self._request_limit:
+                self._done.set()
+
+    def wait(self) -> ProfileResult:
+        """Block until the profile ends, then return it (and free the profiler)"""
+        self._thread.join()
+        if self._torch_running:
+            # A traced generate() that started inside the window is allowed to finish
+            self._torch_finished.wait(timeout=120)
+        with self._lock:
+            self.active = False
+            lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+            return ProfileResult("\n".join(lines) + ("\n" if lines else ""), self._samples,
+                                 round(time.perf_counter() - self._started, 3), self._requests, self._torch_trace)
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._done.is_set():
+            if time.monotonic() >= self._deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._collapse(names.get(ident, f"thread-{ident}"), frame)
+                if stack is not None:
+                    self._stacks[stack] += 1
+            self._samples += 1
+            self._done.wait(self._interval)
+        self._done.set()
+
+    def _collapse(self, thread_name: str, frame) -> Optional[str]:
+        code = frame.f_code
+        if not self._idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+            return None
+        frames = []
+        while frame is not None:
+            frames.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def _frame_name(self, code) -> str:
+        # Keyed by (file, function, first line) so each function is one node in the flamegraph
+        key = (code.co_filename, code.co_name, code.co_firstlineno)
+        name = self._names.get(key)
+        if name is None:
+            name = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+            self._names[key] = name
+        return name
+
+    def generate_span(self):
+        """
+        Context for one model.generate() call: records it with the torch profiler
+        if a trace was requested and none has been taken yet, otherwise a no-op
+        """
+        if not self.active or self._torch_dir is None:
+            return _NULL
+        with self._lock:
+            if not self.active or self._torch_dir is None:
+                return _NULL
+            out_dir, self._torch_dir = self._torch_dir, None  # One trace per profile
+            self._torch_running = True
+        return self._torch_span(out_dir)
+
+    @contextmanager
+    def _torch_span(self, out_dir: str):
+        try:
+            try:
+                from torch.profiler import ProfilerActivity, profile
+            except ImportError:
+                print("⚠️  torch is not installed; skipping the generate() trace")
+                yield
+                return
+
+            with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+                yield
+            os.makedirs(out_dir, exist_ok=True)
+            path = os.path.join(out_dir, f"generate-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+            prof.export_chrome_trace(path)
+            with self._lock:
+                self._torch_trace = path
+            print(f"🔥 Torch profiler trace of model.generate saved to {path}")
+        finally:
+            self._torch_finished.set()
+
+
+def _short_path(path: str) -> str:
+    """Path relative to the longest sys.path entry containing it"""
+    best = None
+    for entry in [os.getcwd()] + sys.path:
+        if entry and path.startswith(entry.rstrip(os.sep) + os.sep) and (best is None or len(entry) > len(best)):
+            best = entry
+    return os.path.relpath(path, best) if best else path
+
+
+# One per process; /admin/profile drives it
+profiler = SamplingProfiler()
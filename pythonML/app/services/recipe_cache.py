@@ -0,0 +1,120 @@
+"""
+RecipeCache - LRU + TTL cache of generated recipes with per-key variant pools
+
+Requests are keyed on the canonical ingredient set, cuisine and restrictions, so
+"chicken, rice" and "Rice,Chicken" share an entry. Each key holds up to N sampled
+variants; once the pool is full, hits rotate through it to keep outputs varied.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models import RecipeRequest, RecipeResponse
+from app.utils.metrics import RECIPE_CACHE_HITS, RECIPE_CACHE_MISSES
+
+
+def normalize_list(text: str) -> Tuple[str, ...]:
+    """Comma-separated text -> sorted, de-duplicated, lower-cased items"""
+    items = {" ".join(part.lower().split()) for part in text.split(",")}
+    items.discard("")
+    return tuple(sorted(items))
+
+
+def cache_key(request: RecipeRequest) -> Tuple:
+    """Order-, case- and whitespace-insensitive key for a recipe request"""
+    return (
+        normalize_list(request.ingredients),
+        " ".join(request.cuisine.lower().split()),
+        normalize_list(request.dietaryRestrictions),
+        request.seed,
+    )
+
+
+class _Entry:
+    def __init__(self, created: float):
+        self.created = created
+        self.variants: List[RecipeResponse] = []
+        self.next_variant = 0
+
+
+class RecipeCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, variants_per_key: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.variants_per_key = max(1, variants_per_key)
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _pool_size(self, key: Tuple) -> int:
+        # Seeded requests must be reproducible, so they keep exactly one variant
+        return 1 if key[-1] is not None else self.variants_per_key
+
+    def get(self, key: Tuple) -> Optional[RecipeResponse]:
+        """Return a cached variant, or None if the key needs a (new) generation"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            # Until the variant pool is full, a lookup counts as a miss so another sample is drawn
+            if entry is None or len(entry.variants) < self._pool_size(key):
+                self.misses += 1
+                RECIPE_CACHE_MISSES.inc()
+                return None
+
+            self._entries.move_to_end(key)
+            variant = entry.variants[entry.next_variant % len(entry.variants)]
+            entry.next_variant += 1
+            self.hits += 1
+            RECIPE_CACHE_HITS.inc()
+            return variant
+
+    def put(self, key: Tuple, response: RecipeResponse):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(time.monotonic())
+                self._entries[key] = entry
+            if len(entry.variants) < self._pool_size(key):
+                entry.variants.append(response)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'variants_per_key': self.variants_per_key,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,108 @@
+"""
+RecipeStreamParser - Incremental parser for generated recipe text
+
+The model writes recipes as
+    TITLE: ... | INGREDIENTS: a ; b ; c | INSTRUCTIONS: ...
+The parser is fed text as it is decoded and reports each section the moment
+the next header (or <END>) shows that the section is complete.
+"""
+import re
+from typing import Any, Dict, List
+
+HEADER_RE = re.compile(r'(TITLE|INGREDIENTS|INSTRUCTIONS):')
+END_MARKER = '<END>'
+
+DEFAULT_TITLE = "AI Generated Recipe"
+
+
+class RecipeStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.finished = False
+        self.sections: Dict[str, str] = {}
+        self._open_name = None   # Section currently being written
+        self._open_start = 0     # Buffer offset where its value begins
+        self._scan_pos = 0       # Buffer offset to search for the next header
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add decoded text; returns events for sections completed by it"""
+        if self.finished or not text:
+            return []
+
+        self.buffer += text
+        end = self.buffer.find(END_MARKER)
+        if end != -1:
+            self.buffer = self.buffer[:end]
+            events = self._scan()
+            return events + self._finish()
+        return self._scan()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush whatever section is still open (call when generation stops)"""
+        if self.finished:
+            return []
+        events = self._scan()
+        return events + self._finish()
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        events = []
+        # INSTRUCTIONS runs to the end of the recipe, so stop looking for headers once it opens
+        while self._open_name != 'INSTRUCTIONS':
+            match = HEADER_RE.search(self.buffer, self._scan_pos)
+            if match is None:
+                # Keep a partial header at the end of the buffer for the next chunk
+                self._scan_pos = max(self._scan_pos, len(self.buffer) - len('INSTRUCTIONS:'))
+                break
+
+            if self._open_name is not None:
+                events.extend(self._complete(self._open_name, self.buffer[self._open_start:match.start()]))
+            self._open_name = match.group(1)
+            self._open_start = match.end()
+            self._scan_pos = match.end()
+        return events
+
+    def _finish(self) -> List[Dict[str, Any]]:
+        self.finished = True
+        if self._open_name is None:
+            return []
+        return self._complete(self._open_name, self.buffer[self._open_start:])
+
+    def _complete(self, name: str, raw: str) -> List[Dict[str, Any]]:
+        if name in self.sections:
+            return []  # The model repeated a header; first occurrence wins
+        self.sections[name] = raw
+
+        if name == 'TITLE':
+            return [{'event': 'title', 'value': self.title}]
+        if name == 'INGREDIENTS':
+            return [{'event': 'ingredients', 'value': self.ingredients}]
+        return [{'event': 'instructions', 'value': self.instructions}]
+
+    @property
+    def title(self) -> str:
+        raw = self.sections.get('TITLE', '').split('|')[0].strip()
+        return raw or DEFAULT_TITLE
+
+    @property
+    def ingredients(self) -> List[str]:
+        raw = self.sections.get('INGREDIENTS', '').strip().rstrip('|')
+        return [i.strip() for i in raw.split(';') if i.strip()]
+
+    @property
+    def instructions(self) -> str:
+        return self.sections.get('INSTRUCTIONS', '').strip()
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'title': self.title,
+            'ingredients': self.ingredients,
+            'instructions': self.instructions
+        }
+
+
+def parse_recipe_text(recipe_text: str) -> Dict[str, Any]:
+    """Parse a complete recipe body in one go"""
+    parser = RecipeStreamParser()
+    parser.feed(recipe_text)
+    parser.close()
+    return parser.result()
@@ -1,126 +1,287 @@
 from app.models import RecipeRequest, RecipeResponse
 from app.utils.data_consts import RECIPE_TEMPLATES
 from app.services.nutrition_service import NutritionService
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+from app.services.model_registry import LazyHandle
+from app.services.replica_pool import ReplicaPool
+from app.services.recipe_parser import RecipeStreamParser, parse_recipe_text
+from app.services.inference_backends import load_backend
+from app.services.recipe_cache import RecipeCache, cache_key
+from app.services.recipe_store import RecipeStore, StoredRecipe
+from app.utils import config
+from app.utils.metrics import RECIPE_SOURCE, STAGE_SECONDS
+from fastapi.encoders import jsonable_encoder
 import os
 import random
-import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MODEL_PATH = config.RECIPE_MODEL_PATH
+
+# Registry names of the artifacts this service shares with others
+RECIPE_MODEL = "recipe_gpt2"
+NUTRITION_DB = "nutrition_db"
+RECIPE_STORE = "recipe_store"
+
+def load_recipe_store():
+    return RecipeStore.load(config.RECIPE_STORE_PATH)
+
+def load_recipe_model():
+    """Load the trained GPT-2 tokenizer and model, or None if unavailable"""
+    if not os.path.exists(MODEL_PATH):
+        print(f"⚠️  Model not found at {MODEL_PATH}, using templates")
+        return None
+    
+    try:
+        # Backends import transformers/torch lazily, so importing the app stays cheap
+        print(f"Loading trained recipe model from {MODEL_PATH} (backend: {config.RECIPE_BACKEND})...")
+        tokenizer, model = load_backend(config.RECIPE_BACKEND, MODEL_PATH)
+        print("✅ Recipe GPT-2 Model Loaded Successfully (ML Powered)")
+        return tokenizer, model
+    except Exception as e:
+        print(f"⚠️  Failed to load model: {e}")
+        print("Falling back to template-based generation")
+        return None
 
 class RecipeService:
-    def __init__(self):
-        """Initialize and load the trained GPT-2 recipe model"""
-        # Initialize nutrition service for real calorie calculations
-        self.nutrition_service = NutritionService()
+    def __init__(self, use_store: bool = True):
+        """Set up lazy handles to the shared GPT-2 recipe model and nutrition database"""
+        # Nothing is loaded here; warm_up() (or first use) pulls the artifacts in
+        self._nutrition = LazyHandle(NUTRITION_DB, NutritionService)
+        self._model = LazyHandle(RECIPE_MODEL, load_recipe_model)
+        self._store = LazyHandle(RECIPE_STORE, load_recipe_store) if use_store else None
+        self._pool = None
+        self._pool_lock = threading.Lock()
         
-        model_path = "app/models/recipe_gpt2"
-        if os.path.exists(model_path):
-            try:
-                print(f"Loading trained recipe model from {model_path}...")
-                self.tokenizer = GPT2Tokenizer.from_pretrained(model_path)
-                self.model = GPT2LMHeadModel.from_pretrained(model_path)
-                self.model.eval()  # Set to evaluation mode
-                print("✅ Recipe GPT-2 Model Loaded Successfully (ML Powered)")
-                self.use_ml = True
-            except Exception as e:
-                print(f"⚠️  Failed to load model: {e}")
-                print("Falling back to template-based generation")
-                self.use_ml = False
-        else:
-            print(f"⚠️  Model not found at {model_path}, using templates")
-            self.use_ml = False
+        # Generated (ML) recipes keyed on the canonical ingredient set
+        self.cache = RecipeCache(
+            config.RECIPE_CACHE_SIZE,
+            config.RECIPE_CACHE_TTL_SECONDS,
+            config.RECIPE_CACHE_VARIANTS
+        )
     
-    def _generate_with_ml(self, ingredients: str) -> dict:
-        """Generate recipe using trained GPT-2 model"""
+    @property
+    def nutrition_service(self) -> NutritionService:
+        # Nutrition data for real calorie calculations (loads on first use)
+        return self._nutrition.get()
+    
+    @property
+    def use_ml(self) -> bool:
+        # Only True once the model has finished loading; until then we serve templates
+        return self._model.peek() is not None
+    
+    def warm_up(self):
+        """Load the nutrition database, recipe store and GPT-2 model (blocking)"""
+        self._nutrition.get()
+        if self._store is not None:
+            self._store.get()
+        self._model.get()
+    
+    def close(self):
+        """Give the shared artifacts back to the registry"""
+        self._model.release()
+        self._nutrition.release()
+        if self._store is not None:
+            self._store.release()
+    
+    def _get_pool(self) -> ReplicaPool:
+        # One pool per service so concurrent requests share generate() calls
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    tokenizer, model = self._model.get()
+                    self._pool = ReplicaPool(
+                        tokenizer, model,
+                        replicas=config.RECIPE_REPLICAS,
+                        threads=config.RECIPE_REPLICA_THREADS,
+                        pin=config.RECIPE_PIN_REPLICAS,
+                        reserved_cores=config.RECIPE_RESERVED_CORES
+                    )
+        return self._pool
+    
+    def replica_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """Per-replica CPUs, threads and load, or None before the first ML generation"""
+        return None if self._pool is None else self._pool.stats()
+    
+    def _prompt(self, ingredients: str) -> str:
         # Format input for the model
-        input_text = f"INPUT: {ingredients}\nOUTPUT:"
-        
-        # Tokenize (using cpu/gpu automatically handled by pytorch usually, but here default cpu is fine for inference)
-        inputs = self.tokenizer(input_text, return_tensors='pt')
-        
-        # Generate
-        outputs = self.model.generate(
-            inputs['input_ids'],
-            max_length=400,
-            num_return_sequences=1,
-            temperature=0.8,
-            top_p=0.9,
-            do_sample=True,
-            pad_token_id=self.tokenizer.eos_token_id,
-            eos_token_id=self.tokenizer.encode('<END>')[0] if '<END>' in self.tokenizer.get_vocab() else self.tokenizer.eos_token_id
-        )
-        
-        # Decode
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Extract OUTPUT section
-        if 'OUTPUT:' in generated_text:
-            recipe_text = generated_text.split('OUTPUT:')[1].strip()
-            if '<END>' in recipe_text:
-                recipe_text = recipe_text.split('<END>')[0].strip()
-        else:
-            recipe_text = generated_text
-        
-        # Parse the generated recipe
-        title = "AI Generated Recipe"
-        ingredients_list = []
-        instructions = ""
+        return f"INPUT: {ingredients}\nOUTPUT:"
+    
+    def _generate_with_ml(self, ingredients: str) -> dict:
+        """Generate recipe using trained GPT-2 model (micro-batched with concurrent requests)"""
+        generated_text = self._get_pool().generate(self._prompt(ingredients))
+        return self._parse_recipe(generated_text)
+    
+    def _parse_recipe(self, generated_text: str) -> dict:
+        """Split decoded model output into title, ingredient list and instructions"""
+        # Extract OUTPUT section (the parser itself stops at <END>)
+        with STAGE_SECONDS.time(stage="parse"):
+            if 'OUTPUT:' in generated_text:
+                recipe_text = generated_text.split('OUTPUT:')[1].strip()
+            else:
+                recipe_text = generated_text
+            
+            return parse_recipe_text(recipe_text)
+    
+    def generate(self, request: RecipeRequest) -> RecipeResponse:
+        return self.generate_many([request])[0]
+    
+    def generate_many(self, requests: List[RecipeRequest]) -> List[RecipeResponse]:
+        """
+        Generate several recipes in one pass (e.g. every meal of a plan)
         
-        # Extract title
-        title_match = re.search(r'TITLE:\s*(.+?)(?:\||$)', recipe_text)
-        if title_match:
-            title = title_match.group(1).strip()
+        All prompts are queued on the batcher together, so a whole plan costs
+        one batched generate() call instead of one decode per meal.
+        """
+        responses, pending = self.submit_many(requests)
+        return self.finish_many(requests, responses, pending)
+    
+    def submit_many(self, requests: List[RecipeRequest]) -> Tuple[List[Optional[RecipeResponse]], Dict[int, Future]]:
+        """
+        First half of generate_many: answers from the cache and store, and the
+        rest queued on the batcher without waiting for it
         
-        # Extract ingredients
-        ingredients_match = re.search(r'INGREDIENTS:\s*(.+?)(?:\|INSTRUCTIONS:|$)', recipe_text, re.DOTALL)
-        if ingredients_match:
-            ing_text = ingredients_match.group(1).strip()
-            ingredients_list = [i.strip() for i in ing_text.split(';') if i.strip()]
+        Returns (responses, pending): pending maps the index of every request
+        sent to GPT-2 to its Future; finish_many() completes the rest.
+        """
+        print(f"DEBUG: Recipe Generation - Use ML? {self.use_ml} (x{len(requests)})")
+        responses = [None] * len(requests)
+        keys = [cache_key(r) for r in requests]
         
-        # Extract instructions
-        instructions_match = re.search(r'INSTRUCTIONS:\s*(.+?)$', recipe_text, re.DOTALL)
-        if instructions_match:
-            instructions = instructions_match.group(1).strip()
+        # Serve what we can from the cache, then the pre-generated store; only the rest is generated.
+        # The store is skipped (not waited for) while it is still loading
+        store = self._store.peek() if self._store is not None else None
+        todo = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is not None:
+                responses[i] = cached
+                RECIPE_SOURCE.inc(source="cache")
+                continue
+            if store is not None and self._store_applies(key):
+                stored, score = store.lookup(key[0], config.RECIPE_STORE_MIN_JACCARD)
+                if stored is not None:
+                    responses[i] = self._stored_response(requests[i], stored, exact=score >= 1.0)
+                    RECIPE_SOURCE.inc(source="store")
+                    continue
+            todo.append(i)
         
-        return {
-            'title': title,
-            'ingredients': ingredients_list,
-            'instructions': instructions
-        }
-    
-    def generate(self, request: RecipeRequest) -> RecipeResponse:
-        print(f"DEBUG: Recipe Generation - Use ML? {self.use_ml}")
-        if self.use_ml:
-            # Use trained ML model
+        pending = {}
+        if todo and self.use_ml:
             try:
-                ml_recipe = self._generate_with_ml(request.ingredients)
-                
-                # QUICK FIX: Calculate calories from USER'S original ingredients ONLY
-                # (GPT-2 adds extra ingredients which inflates the calorie count)
-                user_ingredients = [i.strip() for i in request.ingredients.split(',')]
-                nutrition = self.nutrition_service.estimate_calories(user_ingredients)
-                
-                # But show GPT-2's full ingredient list in the recipe
-                ingredients_list = ml_recipe['ingredients'] if ml_recipe['ingredients'] else user_ingredients
-                
-                return RecipeResponse(
-                    title=ml_recipe['title'] + " (ML Powered)",
-                    ingredients=ingredients_list,
-                    instructions=ml_recipe['instructions'] if ml_recipe['instructions'] else "Generated recipe instructions",
-                    cuisineType=request.cuisine,
-                    calories=nutrition['calories'],  # ← Based on USER input, not GPT-2 extras
-                    imageUrl="https://via.placeholder.com/300?text=" + ml_recipe['title'].replace(" ", "+")
+                futures = self._get_pool().submit_many(
+                    [self._prompt(requests[i].ingredients) for i in todo],
+                    [requests[i].seed for i in todo]
                 )
+                pending = dict(zip(todo, futures))
             except Exception as e:
                 print(f"ML generation failed: {e}, falling back to templates")
-                # Fall through to template generation
+        return responses, pending
+    
+    def finish_many(self, requests: List[RecipeRequest], responses: List[Optional[RecipeResponse]],
+                    pending: Dict[int, Future]) -> List[RecipeResponse]:
+        """Second half of generate_many: parse what GPT-2 returned (waiting if needed), templates for the rest"""
+        for i, request in enumerate(requests):
+            if responses[i] is not None:
+                continue
+            if i in pending:
+                try:
+                    ml_recipe = self._parse_recipe(pending[i].result())
+                    responses[i] = self._ml_response(request, ml_recipe)
+                    self.cache.put(cache_key(request), responses[i])
+                    RECIPE_SOURCE.inc(source="ml")
+                    continue
+                except Exception as e:
+                    print(f"ML generation failed: {e}, falling back to templates")
+                    # Fall through to template generation
+            responses[i] = self._template_response(request)
+            RECIPE_SOURCE.inc(source="template")
+        return responses
+    
+    def generate_stream(self, request: RecipeRequest) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a recipe as events: decoded tokens first, then each section as
+        soon as the parser sees it complete, then the final recipe with calories
+        """
+        if self.use_ml:
+            yield {'event': 'start', 'source': 'ml'}
+            parser = RecipeStreamParser()
+            try:
+                for chunk in self._get_pool().stream(self._prompt(request.ingredients), request.seed):
+                    if not chunk:
+                        continue
+                    yield {'event': 'token', 'text': chunk}
+                    yield from parser.feed(chunk)
+                yield from parser.close()
+                yield {'event': 'recipe', 'value': jsonable_encoder(self._ml_response(request, parser.result()))}
+                RECIPE_SOURCE.inc(source="ml")
+                return
+            except Exception as e:
+                print(f"ML streaming failed: {e}, falling back to templates")
+                yield {'event': 'error', 'message': str(e)}
+        
+        # Templates are instant, so there is nothing to stream but the result
+        yield {'event': 'start', 'source': 'template'}
+        recipe = self._template_response(request)
+        yield {'event': 'title', 'value': recipe.title}
+        yield {'event': 'ingredients', 'value': recipe.ingredients}
+        yield {'event': 'instructions', 'value': recipe.instructions}
+        yield {'event': 'recipe', 'value': jsonable_encoder(recipe)}
+        RECIPE_SOURCE.inc(source="template")
+    
+    @staticmethod
+    def _store_applies(key) -> bool:
+        """
+        Stored recipes were generated for the ingredients alone (default cuisine,
+        no restrictions, unseeded), so only requests asking for nothing more may use them
+        """
+        _, cuisine, restrictions, seed = key
+        return cuisine in ("", "any") and not restrictions and seed is None
+    
+    def _stored_response(self, request: RecipeRequest, stored: StoredRecipe, exact: bool) -> RecipeResponse:
+        if exact:
+            calories = stored.calories
+        else:
+            # Near match: the stored recipe covers most of the request, but calories follow the user's ingredients
+            user_ingredients = [i.strip() for i in request.ingredients.split(',')]
+            calories = self.nutrition_service.estimate_calories(user_ingredients)['calories']
         
+        return RecipeResponse(
+            title=stored.title,
+            ingredients=list(stored.ingredients),
+            instructions=stored.instructions,
+            cuisineType=request.cuisine,
+            calories=calories,
+            imageUrl="https://via.placeholder.com/300?text=" + stored.title.replace(" ", "+")
+        )
+    
+    def _ml_response(self, request: RecipeRequest, ml_recipe: dict) -> RecipeResponse:
+        # QUICK FIX: Calculate calories from USER'S original ingredients ONLY
+        # (GPT-2 adds extra ingredients which inflates the calorie count)
+        user_ingredients = [i.strip() for i in request.ingredients.split(',')]
+        nutrition = self.nutrition_service.estimate_calories(user_ingredients)
+        
+        # But show GPT-2's full ingredient list in the recipe
+        ingredients_list = ml_recipe['ingredients'] if ml_recipe['ingredients'] else user_ingredients
+        
+        return RecipeResponse(
+            title=ml_recipe['title'] + " (ML Powered)",
+            ingredients=ingredients_list,
+            instructions=ml_recipe['instructions'] if ml_recipe['instructions'] else "Generated recipe instructions",
+            cuisineType=request.cuisine,
+            calories=nutrition['calories'],  # ← Based on USER input, not GPT-2 extras
+            imageUrl="https://via.placeholder.com/300?text=" + ml_recipe['title'].replace(" ", "+")
+        )
+    
+    def _template_response(self, request: RecipeRequest) -> RecipeResponse:
         # Template-based fallback
         ings = [i.strip() for i in request.ingredients.split(",")]
         main_item = ings[0] if ings else "Dish"
         sides = ", ".join(ings[1:]) if len(ings) > 1 else "Spices"
         
-        template_title = random.choice(RECIPE_TEMPLATES["Titles"])
-        template_instr = random.choice(RECIPE_TEMPLATES["Instructions"])
+        rng = random.Random(request.seed) if request.seed is not None else random
+        template_title = rng.choice(RECIPE_TEMPLATES["Titles"])
+        template_instr = rng.choice(RECIPE_TEMPLATES["Instructions"])
         
         title = template_title.format(Cuisine=request.cuisine, Main=main_item, Sides=sides)
         instructions = template_instr.format(ingredients=request.ingredients, main_item=main_item)
@@ -0,0 +1,143 @@
+"""
+RecipeStore - Indexed on-disk store of pre-generated recipes
+
+Recipes for common ingredient sets are generated offline (build_recipe_store.py)
+and saved with their NutritionService estimates in SQLite. At startup the store
+is read into an exact-set index plus an ingredient -> recipe inverted index, so
+a lookup (exact, or best Jaccard overlap) is a couple of dict probes.
+"""
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    ingredient_key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    ingredients TEXT NOT NULL,
+    instructions TEXT NOT NULL,
+    calories INTEGER NOT NULL,
+    protein REAL NOT NULL,
+    fat REAL NOT NULL,
+    carbs REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    ingredient TEXT NOT NULL,
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id)
+);
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients ON recipe_ingredients(ingredient);
+"""
+
+
+class StoredRecipe:
+    __slots__ = ('ingredient_set', 'title', 'ingredients', 'instructions', 'calories', 'protein', 'fat', 'carbs')
+
+    def __init__(self, ingredient_set, title, ingredients, instructions, calories, protein, fat, carbs):
+        self.ingredient_set = ingredient_set
+        self.title = title
+        self.ingredients = ingredients
+        self.instructions = instructions
+        self.calories = calories
+        self.protein = protein
+        self.fat = fat
+        self.carbs = carbs
+
+
+class RecipeStore:
+    def __init__(self, recipes: List[StoredRecipe]):
+        self.recipes = recipes
+        self._exact: Dict[Tuple[str, ...], int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for idx, recipe in enumerate(recipes):
+            self._exact[recipe.ingredient_set] = idx
+            for ingredient in recipe.ingredient_set:
+                self._postings.setdefault(ingredient, []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["RecipeStore"]:
+        """Read the whole store into memory, or None if it has not been built"""
+        if not os.path.exists(path):
+            print(f"⚠️  Recipe store not found at {path}, generating every recipe")
+            return None
+
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                "SELECT ingredient_key, title, ingredients, instructions, calories, protein, fat, carbs "
+                "FROM recipes ORDER BY id"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        recipes = [
+            StoredRecipe(tuple(json.loads(key)), title, json.loads(ings), instr, cal, p, f, c)
+            for key, title, ings, instr, cal, p, f, c in rows
+        ]
+        print(f"✅ Recipe store loaded: {len(recipes)} pre-generated recipes")
+        return cls(recipes)
+
+    def lookup(self, ingredient_set: Tuple[str, ...], min_jaccard: float = 1.0) -> Tuple[Optional[StoredRecipe], float]:
+        """
+        Best stored recipe for a normalized ingredient set
+
+        Returns (recipe, jaccard); an exact set match scores 1.0. Ties on overlap
+        go to the recipe stored first, so answers are deterministic.
+        """
+        idx = self._exact.get(ingredient_set)
+        if idx is not None:
+            return self.recipes[idx], 1.0
+        if min_jaccard >= 1.0 or not ingredient_set:
+            return None, 0.0
+
+        shared: Dict[int, int] = {}
+        for ingredient in ingredient_set:
+            for candidate in self._postings.get(ingredient, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best, best_score = None, 0.0
+        for candidate, overlap in shared.items():
+            union = len(ingredient_set) + len(self.recipes[candidate].ingredient_set) - overlap
+            score = overlap / union
+            if score > best_score or (score == best_score and best is not None and candidate < best):
+                best, best_score = candidate, score
+
+        if best is None or best_score < min_jaccard:
+            return None, best_score
+        return self.recipes[best], best_score
+
+
+def write_store(path: str, recipes: Iterable[StoredRecipe]) -> int:
+    """Write recipes to a fresh SQLite store (replacing any existing file)"""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    count = 0
+    try:
+        conn.executescript(SCHEMA)
+        for recipe in recipes:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO recipes "
+                "(ingredient_key, title, ingredients, instructions, calories, protein, fat, carbs) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (json.dumps(list(recipe.ingredient_set)), recipe.title, json.dumps(recipe.ingredients),
+                 recipe.instructions, recipe.calories, recipe.protein, recipe.fat, recipe.carbs)
+            )
+            if cur.rowcount:
+                conn.executemany(
+                    "INSERT INTO recipe_ingredients (ingredient, recipe_id) VALUES (?, ?)",
+                    [(ingredient, cur.lastrowid) for ingredient in recipe.ingredient_set]
+                )
+                count += 1
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return count
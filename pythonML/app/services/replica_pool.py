@@ -0,0 +1,95 @@
+"""
+ReplicaPool - Several GPT-2 generation batchers, each pinned to its own cores
+
+A single generate() spread over every intra-op thread scales poorly on large
+CPUs: GPT-2's matmuls are small, so the threads mostly synchronize, and they
+compete with the server's own threads for the same cores. The pool runs K
+GenerationBatchers instead, each pinned to a disjoint slice of physical cores
+with its own torch thread count, and hands every request to the replica with
+the least outstanding work.
+
+All replicas run the same loaded model object, so the weights are held once;
+only activations and KV caches are per replica. Thread counts apply to the
+torch backends (eager, int8); ONNX Runtime keeps its own session thread pool.
+
+Find the best K and thread split for a machine with tune_replicas.py.
+"""
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.services.generation_batcher import GenerationBatcher, RngGate
+from app.services.inference_executor import core_siblings
+
+
+def split_cores(replicas: int, reserved: int = 0) -> List[List[int]]:
+    """
+    Disjoint CPU sets for `replicas` replicas: whole physical cores (one logical
+    CPU each, hyper-threads don't help matmuls), after leaving the first
+    `reserved` cores to the server. Leftover cores go to the first replicas.
+    """
+    cores = core_siblings()
+    usable = cores[reserved:] if reserved < len(cores) else cores[-1:]
+    replicas = max(1, min(replicas, len(usable)))
+    per, extra = divmod(len(usable), replicas)
+
+    sets, start = [], 0
+    for i in range(replicas):
+        size = per + (1 if i < extra else 0)
+        sets.append([cpus[0] for cpus in usable[start:start + size]])
+        start += size
+    return sets
+
+
+class ReplicaPool:
+    def __init__(self, tokenizer, model, replicas: int = 1, threads: int = 0, pin: bool = True,
+                 reserved_cores: int = 0, max_batch_size: int = None, max_wait_ms: float = None):
+        """
+        Args:
+            replicas: Batchers to run (capped at the usable physical cores)
+            threads: torch threads per replica (0 = the cores in its slice)
+            pin: Pin each replica's threads to its core slice
+            reserved_cores: Physical cores kept free for the event loop and request threads
+        """
+        cpu_sets = split_cores(replicas, reserved_cores)
+        if len(cpu_sets) < replicas:
+            print(f"⚠️  Only {len(cpu_sets)} usable cores; running {len(cpu_sets)} recipe replicas instead of {replicas}")
+
+        gate = RngGate()
+        self.replicas = [
+            GenerationBatcher(
+                tokenizer, model, max_batch_size, max_wait_ms,
+                cpus=cpus if pin else None,
+                num_threads=threads or len(cpus),
+                rng_gate=gate,
+                name=f"recipe-replica-{i}"
+            )
+            for i, cpus in enumerate(cpu_sets)
+        ]
+        self._turn = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def _pick(self) -> GenerationBatcher:
+        # Least outstanding work; ties rotate so idle replicas share the traffic
+        start = next(self._turn) % len(self.replicas)
+        order = self.replicas[start:] + self.replicas[:start]
+        return min(order, key=lambda r: r.load)
+
+    def submit(self, prompt: str, seed: Optional[int] = None) -> Future:
+        return self._pick().submit(prompt, seed)
+
+    def submit_many(self, prompts: List[str], seeds: List[Optional[int]] = None) -> List[Future]:
+        """Queue several prompts on one replica so they land in the same batch"""
+        return self._pick().submit_many(prompts, seeds)
+
+    def generate(self, prompt: str, seed: Optional[int] = None) -> str:
+        return self.submit(prompt, seed).result()
+
+    def stream(self, prompt: str, seed: Optional[int] = None) -> Iterator[str]:
+        return self._pick().stream(prompt, seed)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [replica.stats() for replica in self.replicas]
@@ -0,0 +1,415 @@
+"""
+StrategyPredictor - Vectorized diet-strategy prediction from the patient KNN
+
+The diet model is a k-nearest-neighbours lookup over the diet recommendations
+dataset: a profile gets the most common Diet_Recommendation among its k most
+similar patients. Here the training rows are a float64 matrix and the labels
+precomputed integer codes, so a whole batch of profiles is scored with one
+distance matrix, one argpartition and one vote count, with no pandas on the
+request path.
+
+New labelled profiles can be added live: they are written to a durable append
+log, which every process tails into a small delta buffer that is searched
+alongside the base rows. Once the delta grows past DIET_DELTA_MAX_ROWS, one
+process compacts it into a new bundle (or index) on disk and rotates the log;
+every worker then re-maps the artifact instead of folding the rows itself.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.append_log import AppendLog, file_lock
+from app.utils import config
+from app.utils.metrics import STAGE_SECONDS
+
+DIET_MODEL_PATH = "app/models/diet_model.pkl"
+DIET_DATA_PATH = "data/diet_recommendations/diet_recommendations_dataset.csv"
+LABEL_COLUMN = "Diet_Recommendation"
+
+# Registry name of the predictor shared by the meal and diet services
+DIET_STRATEGY = "diet_strategy"
+
+DEFAULT_STRATEGY = "Balanced"
+DEFAULT_FEATURES = ['Age', 'Weight_kg', 'Height_cm', 'BMI']
+
+# Upper bound on the (profiles x patients) distance block held at once
+MAX_BLOCK_CELLS = 1 << 22
+
+# Everything a query reads, swapped as one object so readers never see half an update
+_State = namedtuple('_State', 'train_x train_sq index label_codes delta_x delta_codes')
+
+
+def profile_features(profile) -> Dict[str, float]:
+    """Model inputs a UserProfile can provide"""
+    height_m = profile.heightCm / 100
+    return {
+        'Age': profile.age,
+        'Weight_kg': profile.weightKg,
+        'Height_cm': profile.heightCm,
+        'BMI': profile.weightKg / (height_m ** 2) if height_m else float('nan'),
+    }
+
+
+def _sq_norms(x: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', x, x)
+
+
+def exact_kneighbors(x: np.ndarray, train_x: np.ndarray, k: int,
+                     train_sq: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force (distances, indices) of the k nearest rows of train_x, nearest first"""
+    k = min(k, len(train_x))
+    if train_sq is None:
+        train_sq = _sq_norms(train_x)
+    dist = np.empty((len(x), k), dtype=np.float64)
+    idx = np.empty((len(x), k), dtype=np.int64)
+    block = max(1, MAX_BLOCK_CELLS // max(1, len(train_x)))
+
+    for start in range(0, len(x), block):
+        q = x[start:start + block]
+        # |q - t|^2 = |q|^2 - 2 q.t + |t|^2, one matmul per block
+        d2 = _sq_norms(q)[:, None] - 2.0 * (q @ train_x.T) + train_sq[None, :]
+        np.maximum(d2, 0, out=d2)
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < d2.shape[1] else np.tile(np.arange(d2.shape[1]), (len(q), 1))
+        part_d = np.take_along_axis(d2, part, axis=1)
+        # Order the k candidates by distance, then by row, so results are deterministic
+        order = np.lexsort((part, part_d), axis=1)
+        idx[start:start + block] = np.take_along_axis(part, order, axis=1)
+        dist[start:start + block] = np.sqrt(np.take_along_axis(part_d, order, axis=1))
+    return dist, idx
+
+
+class StrategyPredictor:
+    def __init__(self, features: List[str], train_x: Optional[np.ndarray], label_codes: np.ndarray,
+                 labels: List[str], n_neighbors: int = 5, index=None, log: Optional[AppendLog] = None,
+                 path: Optional[str] = None, log_meta: Optional[Dict] = None):
+        """
+        Args:
+            features: Column names of train_x, in order
+            train_x: (N, d) training matrix (may be None when an index does the search)
+            label_codes: (N,) index into labels for each training row
+            labels: Sorted label names, so the lowest code is the alphabetical first
+            n_neighbors: Neighbours that vote on each prediction
+            index: Optional approximate index (IVFIndex) used instead of exact search
+            log: Optional append log of live-added profiles, replayed and tailed
+            path: Bundle (or index) directory that compaction writes; without it
+                live-added profiles stay in the delta buffer
+            log_meta: The artifact's record of which log records it already holds
+        """
+        self.features = list(features)
+        self.labels = list(labels)
+        self.n_neighbors = n_neighbors
+        self.log = log
+        self.path = path
+        self.version = None
+        self._state = self._base_state(train_x, index, label_codes)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self.compactions = 0
+        self.reloads = 0
+        if log is not None:
+            self._start_log(log_meta)
+            self.sync()
+
+    def _base_state(self, train_x: Optional[np.ndarray], index, label_codes: np.ndarray) -> _State:
+        # A C-contiguous float64 memmap passes through without a copy
+        train_x = None if train_x is None else np.ascontiguousarray(train_x, dtype=np.float64)
+        return _State(
+            train_x, None if train_x is None else _sq_norms(train_x), index,
+            np.asarray(label_codes),
+            np.zeros((0, len(self.features))), np.zeros(0, dtype=np.int64)
+        )
+
+    @classmethod
+    def from_index(cls, index, n_neighbors: int = 5, log: Optional[AppendLog] = None) -> "StrategyPredictor":
+        """Predictor over a labelled IVFIndex (see build_diet_ann_index.py)"""
+        return cls(index.features, None, index.label_codes, index.labels,
+                   int(index.meta.get('n_neighbors', n_neighbors)), index=index, log=log,
+                   path=index.path, log_meta=index.meta.get('log'))
+
+    @classmethod
+    def from_bundle(cls, bundle, log: Optional[AppendLog] = None) -> "StrategyPredictor":
+        """Predictor over a DietBundle's memory-mapped arrays"""
+        predictor = cls(bundle.features, bundle.x, bundle.label_codes, bundle.labels, bundle.n_neighbors,
+                        log=log, path=bundle.path, log_meta=bundle.manifest.get('log'))
+        predictor.version = bundle.version
+        return predictor
+
+    @classmethod
+    def from_knn(cls, model_data, data, log: Optional[AppendLog] = None,
+                 path: Optional[str] = None) -> "StrategyPredictor":
+        """Build from the pickled NearestNeighbors bundle and the dataset it was fit on (compacting into a bundle at path)"""
+        clf = model_data['model'] if isinstance(model_data, dict) else model_data
+        features = model_data['features'] if isinstance(model_data, dict) else DEFAULT_FEATURES
+        # Same matrix the model was fit on (see train_diet_model_demo.py)
+        train_x = data[features].fillna(0).to_numpy(dtype=np.float64)
+        labels, codes = np.unique(data[LABEL_COLUMN].astype(str).to_numpy(), return_inverse=True)
+        return cls(features, train_x, codes, labels.tolist(), getattr(clf, 'n_neighbors', 5), log=log, path=path)
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state.label_codes) + len(state.delta_codes)
+
+    @property
+    def train_x(self) -> Optional[np.ndarray]:
+        return self._state.train_x
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def label_codes(self) -> np.ndarray:
+        return self._state.label_codes
+
+    @property
+    def pending(self) -> int:
+        """Live-added profiles not yet compacted into the artifact on disk"""
+        return len(self._state.delta_codes)
+
+    @property
+    def supports_profiles(self) -> bool:
+        return all(f in DEFAULT_FEATURES for f in self.features)
+
+    def profile_matrix(self, profiles: Sequence) -> np.ndarray:
+        rows = [profile_features(p) for p in profiles]
+        return np.array([[row[f] for f in self.features] for row in rows], dtype=np.float64).reshape(len(rows), len(self.features))
+
+    def kneighbors(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances, indices) of the k nearest rows (base, then delta), nearest first"""
+        state = self._state
+        k = min(self.n_neighbors, len(state.label_codes) + len(state.delta_codes))
+        if state.index is not None:
+            dist, idx = state.index.search(x, k, config.DIET_ANN_NPROBE or None)
+        else:
+            dist, idx = exact_kneighbors(x, state.train_x, k, state.train_sq)
+        if not len(state.delta_codes):
+            return dist, idx
+
+        # Delta rows live after the base rows and are compared in the same space
+        if state.index is not None:
+            d_dist, d_idx = exact_kneighbors(state.index.transform(x).astype(np.float64),
+                                             state.index.transform(state.delta_x).astype(np.float64), k)
+        else:
+            d_dist, d_idx = exact_kneighbors(x, state.delta_x, k)
+        dist = np.concatenate([dist, d_dist], axis=1)
+        idx = np.concatenate([idx, d_idx + len(state.label_codes)], axis=1)
+        order = np.lexsort((idx, dist), axis=1)[:, :k]
+        return np.take_along_axis(dist, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+    def predict_codes(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Majority label code and its vote share for each row of x
+
+        Ties go to the smallest code, i.e. the alphabetically first label,
+        the same answer pandas' Series.mode()[0] gave. (Labels first seen in
+        live-added profiles get the next free code.)
+        """
+        state = self._state
+        _, idx = self.kneighbors(x)
+        all_codes = np.concatenate([state.label_codes, state.delta_codes]) if len(state.delta_codes) else state.label_codes
+        votes = np.asarray(all_codes)[idx]
+        counts = np.zeros((len(x), len(self.labels)), dtype=np.int64)
+        np.add.at(counts, (np.repeat(np.arange(len(x)), idx.shape[1]), votes.ravel()), 1)
+        codes = counts.argmax(axis=1)
+        share = counts[np.arange(len(x)), codes] / max(1, idx.shape[1])
+        return codes, share
+
+    def predict_many(self, profiles: Sequence) -> List[Tuple[str, float]]:
+        """(strategy, vote share) per profile; DEFAULT_STRATEGY with 0.0 where it can't predict"""
+        self.sync()
+        results = [(DEFAULT_STRATEGY, 0.0)] * len(profiles)
+        if not profiles or not self.supports_profiles or not len(self):
+            return results
+
+        x = self.profile_matrix(profiles)
+        valid = np.isfinite(x).all(axis=1)
+        if valid.any():
+            with STAGE_SECONDS.time(stage="knn_predict"):
+                codes, share = self.predict_codes(x[valid])
+            for i, code, s in zip(np.flatnonzero(valid).tolist(), codes.tolist(), share.tolist()):
+                results[i] = (self.labels[code], s)
+        return results
+
+    def predict(self, profile) -> str:
+        return self.predict_many([profile])[0][0]
+
+    # --- Live updates ---
+
+    def add_profiles(self, profiles: Sequence, labels: Sequence[str], allow_new_labels: bool = False) -> int:
+        """
+        Add labelled profiles; they are durable and visible to the next prediction
+
+        With a log, records go to disk first and are applied by tailing it, so
+        every worker process sharing the log picks them up the same way.
+        A label the model has never predicted is rejected with ValueError
+        (nothing is written) unless allow_new_labels is set, since a typo
+        would otherwise become a permanent new strategy.
+        """
+        unknown = sorted(set(labels) - set(self.labels))
+        if unknown and not allow_new_labels:
+            raise ValueError(f"Unknown diet strategy label(s) {unknown}; known labels: {sorted(self.labels)}")
+        x = self.profile_matrix(profiles)
+        valid = np.isfinite(x).all(axis=1)
+        records = [
+            {'features': dict(zip(self.features, row)), 'label': label, 'ts': time.time()}
+            for row, label, ok in zip(x.tolist(), labels, valid.tolist()) if ok
+        ]
+        if self.log is not None:
+            self.log.append(records)
+            self.sync()
+        else:
+            self._apply(records)
+        return len(records)
+
+    def sync(self) -> int:
+        """Apply records other processes (or we) appended to the log since the last sync"""
+        if self.log is None:
+            return 0
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self) -> int:
+        if self.log.rotated():
+            self._reload()
+        records = self.log.read_new()
+        if records:
+            self._apply(records)
+        return len(records)
+
+    def _start_log(self, log_meta: Optional[Dict]):
+        """Position the log reader after the records the artifact already holds"""
+        log_meta = log_meta or {}
+        folded = log_meta.get('compacted_from')
+        log_id = self.log.log_id()
+        if folded and log_id != log_meta.get('id') and log_id == folded.get('id'):
+            # The compaction that wrote the artifact died before rotating the log
+            self.log.restart(int(folded['end']))
+        else:
+            self.log.restart(0)
+
+    def _load_artifact(self) -> Tuple[_State, List[str], Optional[str], Optional[Dict]]:
+        """(state, labels, version, log meta) of the artifact at self.path, memory-mapped"""
+        if self._state.index is not None:
+            from app.services.profile_index import IVFIndex
+
+            index = IVFIndex.load(self.path)
+            return self._base_state(None, index, index.label_codes), index.labels, None, index.meta.get('log')
+
+        from app.services.diet_bundle import DietBundle
+
+        # Just written by a compaction, which hashed the files itself
+        bundle = DietBundle.load(self.path, verify=False)
+        state = self._base_state(bundle.x, None, bundle.label_codes)
+        return state, bundle.labels, bundle.version, bundle.manifest.get('log')
+
+    def _reload(self):
+        """Switch to the artifact a compaction (ours or another worker's) wrote, and tail its new log"""
+        state, labels, version, log_meta = self._load_artifact()
+        with self._lock:
+            self._state = state
+            self.labels = list(labels)
+            self.version = version
+        self._start_log(log_meta)
+        self.reloads += 1
+
+    def _apply(self, records: List[Dict]):
+        rows = [[float(r['features'].get(f, 0)) for f in self.features] for r in records]
+        if not rows:
+            return
+        with self._lock:
+            codes = []
+            for r in records:
+                label = str(r['label'])
+                if label not in self.labels:
+                    self.labels.append(label)
+                codes.append(self.labels.index(label))
+            state = self._state
+            self._state = state._replace(
+                delta_x=np.concatenate([state.delta_x, np.array(rows, dtype=np.float64)]),
+                delta_codes=np.concatenate([state.delta_codes, np.array(codes, dtype=np.int64)]),
+            )
+        if (self.pending >= config.DIET_DELTA_MAX_ROWS and self.path is not None
+                and not self._compacting.locked()):
+            threading.Thread(target=self.compact, name="diet-compaction", daemon=True).start()
+
+    def compact(self) -> int:
+        """
+        Fold the live-added profiles into the artifact on disk; returns how many were folded
+
+        One process at a time (a lock file beside the log) writes base + delta
+        as a new bundle or index, swaps it in, then rotates the log down to
+        the records appended meanwhile. Every worker, this one included, maps
+        the new artifact on its next sync, so the base rows stay shared
+        read-only pages and none of them repeats the work.
+        """
+        if self.log is None or self.path is None:
+            return 0
+        with self._compacting, file_lock(self.log.path + '.compact', blocking=False) as locked:
+            if not locked:
+                return 0  # Another worker is compacting; its result is picked up on sync
+
+            # Everything applied so far, and where it ends in the log
+            with self._sync_lock:
+                self._sync()
+                state, labels, end, old_id = self._state, list(self.labels), self.log.offset, self.log.log_id()
+            n = len(state.delta_codes)
+            if not n:
+                return 0
+
+            log_id = AppendLog.new_id()
+            log_meta = {'id': log_id, 'compacted_from': {'id': old_id, 'end': end}}
+            if state.index is not None:
+                index = state.index.with_rows(state.delta_x, state.delta_codes)
+                index.meta.update(labels=labels, log=log_meta)
+                index.save(self.path)
+            else:
+                from app.services.diet_bundle import write_bundle
+
+                codes = np.concatenate([state.label_codes, state.delta_codes])
+                write_bundle(self.path, self.features, np.concatenate([state.train_x, state.delta_x]),
+                             np.array(labels)[codes], self.n_neighbors,
+                             source={'compacted_from': self.version, 'live_profiles': n}, log=log_meta)
+            self.log.rotate(end, log_id)
+            self.sync()
+            self.compactions += 1
+            print(f"🗜️  Compacted {n} live-added profiles into {self.path} ({len(self)} patients)")
+            return n
+
+
+def load_strategy_predictor() -> Optional[StrategyPredictor]:
+    """Load the diet model bundle (or the ANN index) as a StrategyPredictor, or None if unavailable"""
+    log = AppendLog(config.DIET_PROFILE_LOG_PATH)
+    try:
+        if config.DIET_NEIGHBOR_SEARCH == "ivf" and os.path.exists(config.DIET_ANN_INDEX_PATH):
+            from app.services.profile_index import IVFIndex
+
+            predictor = StrategyPredictor.from_index(IVFIndex.load(config.DIET_ANN_INDEX_PATH), log=log)
+            print(f"✅ Diet ANN Index Loaded ({len(predictor)} patients, {predictor.index.nlist} cells).")
+            return predictor
+        if os.path.exists(config.DIET_BUNDLE_PATH):
+            from app.services.diet_bundle import DietBundle
+
+            predictor = StrategyPredictor.from_bundle(DietBundle.load(config.DIET_BUNDLE_PATH), log=log)
+            print(f"✅ Diet Model Bundle Loaded (v{predictor.version}: {len(predictor)} patients, "
+                  f"{len(predictor.labels)} strategies, {predictor.pending} from the append log).")
+            return predictor
+        if os.path.exists(DIET_MODEL_PATH) and os.path.exists(DIET_DATA_PATH):
+            # Legacy pickle + CSV; re-run train_diet_model_demo.py to get a bundle
+            import pandas as pd
+
+            with open(DIET_MODEL_PATH, 'rb') as f:
+                model = pickle.load(f)
+            data = pd.read_csv(DIET_DATA_PATH)
+            predictor = StrategyPredictor.from_knn(model, data, log=log, path=config.DIET_BUNDLE_PATH)
+            print(f"✅ Diet KNN Model Loaded ({len(predictor)} patients, {len(predictor.labels)} strategies, "
+                  f"{predictor.pending} from the append log).")
+            return predictor
+    except Exception as e:
+        print(f"⚠️ Diet KNN Load Error: {e}")
+    return None
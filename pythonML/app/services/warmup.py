@@ -0,0 +1,59 @@
+"""
+Warmup - Background model loading with per-phase startup timings
+
+The app starts accepting connections immediately; heavy imports and model loads
+run here on a daemon thread, and /readyz reports when they have all finished.
+"""
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class Warmup:
+    def __init__(self):
+        self._phases: List[Tuple[str, Callable[[], Any]]] = []
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready = threading.Event()
+        self._thread = None
+
+    def record(self, name: str, seconds: float):
+        """Record a phase that was timed elsewhere (e.g. importing the app)"""
+        self.timings[name] = round(seconds, 3)
+
+    def add_phase(self, name: str, fn: Callable[[], Any]):
+        self._phases.append((name, fn))
+
+    def run(self):
+        """Run every phase in order on the calling thread"""
+        started = time.perf_counter()
+        for name, fn in self._phases:
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                # A failed phase leaves its service on the fallback path; keep going
+                self.errors[name] = str(e)
+                print(f"⚠️  Warm-up phase '{name}' failed: {e}")
+                traceback.print_exc()
+            self.record(name, time.perf_counter() - start)
+            print(f"⏱️  Warm-up: {name} took {self.timings[name]:.3f}s")
+
+        self.record('warmup_total', time.perf_counter() - started)
+        self.ready.set()
+        print(f"✅ Warm-up complete in {self.timings['warmup_total']:.3f}s")
+
+    def start(self):
+        """Run the phases on a background thread (idempotent; a no-op once warm, e.g. after fork)"""
+        if self._thread is not None or self.ready.is_set():
+            return
+        self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'status': 'ready' if self.ready.is_set() else 'warming',
+            'timings': dict(self.timings),
+            'errors': dict(self.errors),
+        }
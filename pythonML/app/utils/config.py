@@ -0,0 +1,101 @@
+"""
+Runtime settings for the ML microservice, overridable through environment variables
+"""
+import os
+
+def _int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+def _float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+# --- Recipe generation (GPT-2) ---
+RECIPE_MODEL_PATH = os.environ.get("RECIPE_MODEL_PATH", "app/models/recipe_gpt2")
+RECIPE_ONNX_PATH = os.environ.get("RECIPE_ONNX_PATH", "app/models/recipe_gpt2_onnx")
+
+# Inference backend: "eager" (fp32 torch), "int8" (dynamically quantized torch) or "onnx" (ONNX Runtime)
+RECIPE_BACKEND = os.environ.get("RECIPE_BACKEND", "eager").lower()
+
+RECIPE_MAX_LENGTH = _int("RECIPE_MAX_LENGTH", 400)
+
+# Micro-batching: concurrent prompts are collected for up to MAX_WAIT_MS
+# and decoded together in one generate() call of at most MAX_SIZE rows
+RECIPE_BATCH_MAX_SIZE = _int("RECIPE_BATCH_MAX_SIZE", 8)
+RECIPE_BATCH_MAX_WAIT_MS = _float("RECIPE_BATCH_MAX_WAIT_MS", 10.0)
+
+# Replica pool (see tune_replicas.py): REPLICAS batchers share the loaded model, each
+# pinned to its own slice of physical cores with REPLICA_THREADS torch threads
+# (0 = the cores in its slice); RESERVED_CORES cores are left to the server's threads.
+# Pinning only pays off between replicas, so unless RECIPE_PIN_REPLICAS is set (1/0)
+# a single replica is left to the OS scheduler
+RECIPE_REPLICAS = _int("RECIPE_REPLICAS", 1)
+RECIPE_REPLICA_THREADS = _int("RECIPE_REPLICA_THREADS", 0)
+RECIPE_PIN_REPLICAS = os.environ.get("RECIPE_PIN_REPLICAS", "1" if RECIPE_REPLICAS > 1 else "0") != "0"
+RECIPE_RESERVED_CORES = _int("RECIPE_RESERVED_CORES", 0)
+
+# Response cache keyed on the canonical ingredient set (0 entries disables it)
+RECIPE_CACHE_SIZE = _int("RECIPE_CACHE_SIZE", 1024)
+RECIPE_CACHE_TTL_SECONDS = _float("RECIPE_CACHE_TTL_SECONDS", 3600)
+RECIPE_CACHE_VARIANTS = _int("RECIPE_CACHE_VARIANTS", 3)
+
+# Pre-generated recipe store consulted before GPT-2 (see build_recipe_store.py);
+# a request is served from it when its ingredient set overlaps a stored one by at least MIN_JACCARD
+RECIPE_STORE_PATH = os.environ.get("RECIPE_STORE_PATH", "data/recipe_store.sqlite")
+RECIPE_STORE_MIN_JACCARD = _float("RECIPE_STORE_MIN_JACCARD", 0.75)
+
+# --- Nutrition (FoodData Central) ---
+# Any FDC JSON export works (foundation, SR legacy, survey or branded foods); it is
+# compiled once into FOODDATA_CACHE_DIR and memory-mapped on later startups
+FOODDATA_JSON_PATH = os.environ.get(
+    "FOODDATA_JSON_PATH",
+    "FoodData_Central_foundation_food_json_2025-04-24/FoodData_Central_foundation_food_json_2025-04-24.json"
+)
+FOODDATA_CACHE_DIR = os.environ.get("FOODDATA_CACHE_DIR", "app/models/fooddata_cache")
+
+# --- Diet strategy (patient KNN) ---
+# Versioned feature/label bundle written by train_diet_model_demo.py
+DIET_BUNDLE_PATH = os.environ.get("DIET_BUNDLE_PATH", "app/models/diet_bundle")
+
+# "exact" searches every patient; "ivf" uses the approximate index built by build_diet_ann_index.py
+DIET_NEIGHBOR_SEARCH = os.environ.get("DIET_NEIGHBOR_SEARCH", "exact").lower()
+DIET_ANN_INDEX_PATH = os.environ.get("DIET_ANN_INDEX_PATH", "app/models/diet_ann_index")
+DIET_ANN_NPROBE = _int("DIET_ANN_NPROBE", 0)  # 0 = the index's own default
+
+# Labelled profiles added at runtime (POST /strategy/profiles) are appended here,
+# replayed at startup and tailed by every worker; once DELTA_MAX_ROWS of them are
+# pending, one worker compacts them into the bundle (or index) and rotates the log
+DIET_PROFILE_LOG_PATH = os.environ.get("DIET_PROFILE_LOG_PATH", "data/diet_profiles.log.jsonl")
+DIET_DELTA_MAX_ROWS = _int("DIET_DELTA_MAX_ROWS", 1024)
+
+# --- Inference executor (app/services/inference_executor.py) ---
+# Model calls run on WORKERS dedicated threads (0 = physical cores); at most
+# MAX_QUEUE more may wait, beyond that requests get 429 + Retry-After
+INFERENCE_WORKERS = _int("INFERENCE_WORKERS", 0)
+INFERENCE_MAX_QUEUE = _int("INFERENCE_MAX_QUEUE", 64)
+# Streaming recipes each decode on their own generate() call; at most
+# MAX_STREAMS run at once (0 = physical cores), the next one gets 429
+INFERENCE_MAX_STREAMS = _int("INFERENCE_MAX_STREAMS", 0)
+
+# Per-endpoint timeouts in seconds; a request not answered in time gets 503 + Retry-After
+ENDPOINT_TIMEOUTS = {
+    "recipe": _float("TIMEOUT_RECIPE_SECONDS", 30),
+    "meal_plan": _float("TIMEOUT_MEAL_PLAN_SECONDS", 60),
+    "adaptive_diet": _float("TIMEOUT_ADAPTIVE_DIET_SECONDS", 60),
+    "strategy": _float("TIMEOUT_STRATEGY_SECONDS", 10),
+    "strategy_profiles": _float("TIMEOUT_STRATEGY_PROFILES_SECONDS", 10),
+}
+
+# --- Metrics ---
+# Directory of per-process metric files summed by every /metrics scrape; serve.py
+# sets it for its workers (unset = each process only reports its own counters)
+METRICS_MULTIPROC_DIR = os.environ.get("NUTRICHEF_METRICS_DIR", "")
+
+# --- Admin ---
+# Shared secret for /admin/* endpoints and POST /strategy/profiles, sent as the
+# X-Admin-Token header (unset = those endpoints are disabled)
+ADMIN_TOKEN = os.environ.get("NUTRICHEF_ADMIN_TOKEN", "")
+
+# On-demand profiling (POST /admin/profile): longest allowed window, and where
+# torch profiler traces of model.generate are written
+PROFILE_MAX_SECONDS = _float("PROFILE_MAX_SECONDS", 120)
+PROFILE_TRACE_DIR = os.environ.get("PROFILE_TRACE_DIR", "data/profiles")
@@ -0,0 +1,134 @@
+"""
+Recipe training corpus on disk
+
+prepare_recipe_data.py writes the corpus as numbered text shards
+(data/recipe_training/part-00000.txt, ...) plus a manifest.json, so it is
+produced and read one record at a time and can be larger than RAM. The older
+single-file corpus (data/recipe_training.txt) is still accepted everywhere.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+CORPUS_DIR = "data/recipe_training"
+LEGACY_CORPUS_FILE = "data/recipe_training.txt"
+MANIFEST = "manifest.json"
+SHARD_GLOB = "part-*.txt"
+RECORD_END = "<END>"
+
+
+def corpus_files(path: Optional[str] = None) -> List[Path]:
+    """
+    Files making up a corpus: the shards of a directory, or the file itself
+
+    Without a path the sharded corpus is preferred, then the legacy single
+    file; an empty list means nothing has been prepared yet.
+    """
+    for candidate in ([path] if path else [CORPUS_DIR, LEGACY_CORPUS_FILE]):
+        p = Path(candidate)
+        if p.is_dir():
+            shards = sorted(p.glob(SHARD_GLOB))
+            if shards:
+                return shards
+        elif p.is_file():
+            return [p]
+    return []
+
+
+def iter_corpus_lines(files: List[Path]) -> Iterator[str]:
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from f
+
+
+def iter_records(files: List[Path]) -> Iterator[str]:
+    """Formatted recipes (INPUT and OUTPUT lines up to the <END> line), one at a time"""
+    record = []
+    for line in iter_corpus_lines(files):
+        record.append(line)
+        if line.rstrip('\n') == RECORD_END:
+            yield ''.join(record)
+            record = []
+    if record:
+        yield ''.join(record)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ShardWriter:
+    """
+    Appends formatted records to part-NNNNN.txt files of at most
+    `shard_records` records each, so output never accumulates in memory
+
+    Shards are written to a sibling `<out_dir>.tmp` directory and only swapped
+    in for `out_dir` by a successful close(); a run that fails or is
+    interrupted leaves the previous corpus untouched.
+    """
+
+    def __init__(self, out_dir: str, shard_records: int = 5000):
+        self.out_dir = Path(out_dir)
+        self.shard_records = max(1, shard_records)
+        self.tmp_dir = Path(str(out_dir).rstrip('/') + '.tmp')
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.tmp_dir.mkdir(parents=True)
+        self.shards: List[Dict] = []
+        self.records = 0
+        self._f = None
+
+    def write(self, text: str):
+        if self._f is None or self.shards[-1]['records'] >= self.shard_records:
+            self._rotate()
+        self._f.write(text)
+        self.shards[-1]['records'] += 1
+        self.records += 1
+
+    def _rotate(self):
+        if self._f is not None:
+            self._f.close()
+        name = f"part-{len(self.shards):05d}.txt"
+        self._f = open(self.tmp_dir / name, 'w', encoding='utf-8')
+        self.shards.append({'file': name, 'records': 0})
+
+    def close(self, **meta) -> Path:
+        """Finish the last shard, write manifest.json (shards plus `meta`) and swap the corpus into place"""
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        for shard in self.shards:
+            shard['bytes'] = os.path.getsize(self.tmp_dir / shard['file'])
+        manifest = self.tmp_dir / MANIFEST
+        manifest.write_text(json.dumps({**meta, 'records': self.records, 'shards': self.shards}, indent=2))
+
+        # Shards of an earlier, larger run go with the old directory, never mixed into this one
+        old_dir = Path(str(self.out_dir).rstrip('/') + '.old')
+        if self.out_dir.exists():
+            if old_dir.exists():
+                shutil.rmtree(old_dir)
+            os.replace(self.out_dir, old_dir)
+        os.replace(self.tmp_dir, self.out_dir)
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        return self.out_dir / MANIFEST
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        # Not closed: drop the partial output, the previous corpus stays as it was
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
@@ -14,6 +14,25 @@ RECIPE_TEMPLATES = {
     ]
 }
 
+# --- Meal Plan Structure: (meal type, share of daily calories, ingredient pool) ---
+MEAL_STRUCTURE = [
+    ("Breakfast", 0.25, ["Oats", "Eggs", "Yogurt", "Berries"]),
+    ("Lunch", 0.35, ["Chicken", "Rice", "Quinoa", "Salad"]),
+    ("Snack", 0.10, ["Nuts", "Fruit", "Smoothie"]),
+    ("Dinner", 0.30, ["Fish", "Steak", "Tofu", "Vegetables"])
+]
+
+# --- Ingredient pools per predicted diet strategy ---
+DIET_INGREDIENTS = {
+    "Keto": ["Chicken", "Avocado", "Spinach", "Cheese", "Salmon", "Eggs"],
+    "Vegan": ["Tofu", "Lentils", "Chickpeas", "Quinoa", "Kale"],
+    "Low-Carb": ["Turkey", "Zucchini", "Broccoli", "Cauliflower"],
+    "Paleo": ["Steak", "Carrots", "Asparagus", "Walnuts"],
+    "Balanced": ["Rice", "Chicken", "Veggies", "Beans", "Yogurt"],
+    "Mediterranean": ["Fish", "Olive Oil", "Tomatoes", "Feta"],
+    "DASH": ["Oats", "Banana", "Almonds", "Milk"]
+}
+
 # --- Mock Data for Validations ---
 MEAL_OPTIONS = [
     Meal(name="Oatmeal & Berries", type="Breakfast", calories=350, macros="P:12 C:60 F:6"),
@@ -0,0 +1,144 @@
+"""
+Streaming readers for very large JSON files
+
+Only the item currently being decoded (plus one read chunk) is held in memory,
+so multi-gigabyte exports can be walked with a small, constant footprint.
+"""
+import codecs
+import json
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Tuple
+
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """Incrementally decoded text buffer over a binary file"""
+
+    def __init__(self, f: BinaryIO, hasher=None, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.hasher = hasher
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read one more chunk; False once the file is exhausted"""
+        if self.eof:
+            return False
+        raw = self.f.read(self.chunk_size)
+        if self.hasher is not None and raw:
+            self.hasher.update(raw)
+        if not raw:
+            self.eof = True
+            self.buffer += self.decoder.decode(b'', final=True)
+            return False
+        # Drop what has been consumed so the buffer never grows with the file
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(raw)
+        self.pos = 0
+        return True
+
+    def skip(self, chars: str) -> Optional[str]:
+        """Advance past any of `chars`; return the next character (None at EOF)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+
+    def drain(self):
+        """Read (and hash) the rest of the file"""
+        while self.fill():
+            self.pos = len(self.buffer)
+
+
+def _find_array(reader: _Reader, keys: Iterable[str]) -> str:
+    needles = [(key, f'"{key}"') for key in keys]
+    longest = max(len(n) for _, n in needles)
+    while True:
+        hits = [(reader.buffer.find(needle, reader.pos), key, needle) for key, needle in needles]
+        hits = [h for h in hits if h[0] != -1]
+        if hits:
+            at, key, needle = min(hits)
+            reader.pos = at + len(needle)
+            if reader.skip(_WHITESPACE) != ':':
+                raise ValueError(f"Malformed JSON after key {key!r}")
+            reader.pos += 1
+            if reader.skip(_WHITESPACE) != '[':
+                raise ValueError(f"Key {key!r} does not hold an array")
+            reader.pos += 1
+            return key
+        # Keep a tail in case a key straddles two chunks
+        reader.pos = max(reader.pos, len(reader.buffer) - longest)
+        if not reader.fill():
+            raise KeyError(f"None of {list(keys)} found in JSON")
+
+
+def iter_array_items(f: BinaryIO, keys: Iterable[str], hasher=None) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield (key, item) for each element of the first top-level array named in `keys`
+
+    If a hashlib `hasher` is given, every byte of the file is fed to it (including
+    whatever follows the array), so the caller gets a checksum for free.
+    """
+    reader = _Reader(f, hasher)
+    decoder = json.JSONDecoder()
+    key = _find_array(reader, list(keys))
+
+    while True:
+        ch = reader.skip(_WHITESPACE + ',')
+        if ch is None:
+            raise ValueError(f"Unexpected end of file inside {key!r}")
+        if ch == ']':
+            break
+        yield key, _decode_next(reader, decoder)
+
+    reader.drain()
+
+
+def iter_object_items(f: BinaryIO, hasher=None) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield (key, value) for each member of a top-level JSON object
+    ({"id": {...}, "id2": {...}}), one member in memory at a time
+    """
+    reader = _Reader(f, hasher)
+    decoder = json.JSONDecoder()
+    if reader.skip(_WHITESPACE) != '{':
+        raise ValueError("JSON document is not an object")
+    reader.pos += 1
+
+    while True:
+        ch = reader.skip(_WHITESPACE + ',')
+        if ch is None:
+            raise ValueError("Unexpected end of file inside the top-level object")
+        if ch == '}':
+            break
+        key = _decode_next(reader, decoder)
+        if reader.skip(_WHITESPACE) != ':':
+            raise ValueError(f"Malformed JSON after key {key!r}")
+        reader.pos += 1
+        reader.skip(_WHITESPACE)
+        yield key, _decode_next(reader, decoder)
+
+    reader.drain()
+
+
+def _decode_next(reader: _Reader, decoder: json.JSONDecoder) -> Any:
+    """Decode the value at reader.pos, reading more chunks until it is complete"""
+    while True:
+        try:
+            value, end = decoder.raw_decode(reader.buffer, reader.pos)
+        except json.JSONDecodeError:
+            # Most likely the value continues in the next chunk
+            if not reader.fill():
+                raise
+            continue
+        # A number ending exactly at the chunk edge may continue in the next one
+        if end == len(reader.buffer) and reader.fill():
+            continue
+        reader.pos = end
+        return value
@@ -0,0 +1,359 @@
+"""
+Metrics - Minimal Prometheus instrumentation for the ML pipeline
+
+Counters and histograms live in this process and are rendered in the
+Prometheus text exposition format by GET /metrics. Values owned by other
+components (cache hits, queue depth, replica load) are read through callbacks
+at scrape time, so they cost nothing on the request path.
+
+With serve.py several worker processes answer /metrics, so counters and
+histograms are also kept in a memory-mapped file per process in
+METRICS_MULTIPROC_DIR (like prometheus_client's multiprocess mode): every
+scrape sums the files of all workers, including ones that have exited, so
+_total series stay monotonic whichever worker answers. Gauges and other
+callbacks describe the worker that answered (nutrichef_process_pid).
+
+Tokens per second: rate(nutrichef_recipe_generated_tokens_total) /
+rate(nutrichef_stage_seconds_sum{stage="generate"}), or the per-batch
+distribution in nutrichef_recipe_tokens_per_second.
+"""
+import bisect
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.utils import config
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _ValueFile:
+    """
+    float64 values keyed by string in a memory-mapped file, written by one process
+
+    Layout: an 8-byte count of used bytes, then entries of
+    [uint32 key length][UTF-8 key, padded to 8 bytes][float64 value].
+    An entry is complete before the used count covers it, so readers in other
+    processes never see a half-written one.
+    """
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._f = open(path, 'a+b')
+        size = os.fstat(self._f.fileno()).st_size
+        if size < self.INITIAL_SIZE:
+            self._f.truncate(self.INITIAL_SIZE)
+            size = self.INITIAL_SIZE
+        self._capacity = size
+        self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        if struct.unpack_from('Q', self._m, 0)[0] == 0:
+            struct.pack_into('Q', self._m, 0, 8)
+        self._positions = {key: pos for key, pos, _ in _read_entries(self._m)}
+
+    def add(self, key: str, amount: float):
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = self._append(key)
+            struct.pack_into('d', self._m, pos, struct.unpack_from('d', self._m, pos)[0] + amount)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (-(4 + len(encoded)) % 8)
+        used = struct.unpack_from('Q', self._m, 0)[0]
+        while used + 4 + padded + 8 > self._capacity:
+            self._m.close()
+            self._capacity *= 2
+            self._f.truncate(self._capacity)
+            self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        struct.pack_into(f'I{padded}sd', self._m, used, len(encoded), encoded, 0.0)
+        struct.pack_into('Q', self._m, 0, used + 4 + padded + 8)
+        self._positions[key] = used + 4 + padded
+        return used + 4 + padded
+
+
+def _read_entries(data) -> Iterator[Tuple[str, int, float]]:
+    """(key, value offset, value) of every complete entry in a value file's bytes"""
+    used = struct.unpack_from('Q', data, 0)[0] if len(data) >= 8 else 0
+    pos = 8
+    while pos + 4 <= used:
+        length = struct.unpack_from('I', data, pos)[0]
+        padded = length + (-(4 + length) % 8)
+        key = bytes(data[pos + 4:pos + 4 + length]).decode('utf-8')
+        value_pos = pos + 4 + padded
+        yield key, value_pos, struct.unpack_from('d', data, value_pos)[0]
+        pos = value_pos + 8
+
+
+class _SharedValues:
+    """This process's value file in the multiprocess directory (re-opened after a fork)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._file: Optional[_ValueFile] = None
+        self._pid = None
+
+    def add(self, metric: str, labels: Tuple[str, ...], sample: str, amount: float):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # A forked worker counts from zero in its own file; the parent's file keeps its values
+                    self._file = _ValueFile(os.path.join(self.directory, f"{pid}.db"))
+                    self._pid = pid
+        self._file.add(json.dumps([metric, list(labels), sample]), amount)
+
+    def merged(self) -> Dict[str, Dict[Tuple[Tuple[str, ...], str], float]]:
+        """metric -> {(labels, sample): value summed over every process's file}"""
+        totals: Dict[str, Dict[Tuple[Tuple[str, ...], str], float]] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.db"))):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            for key, _, value in _read_entries(data):
+                metric, labels, sample = json.loads(key)
+                series = totals.setdefault(metric, {})
+                series[(tuple(labels), sample)] = series.get((tuple(labels), sample), 0.0) + value
+        return totals
+
+
+# Set (see serve.py) when several worker processes serve /metrics
+_shared = _SharedValues(config.METRICS_MULTIPROC_DIR) if config.METRICS_MULTIPROC_DIR else None
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self, merged: Optional[Dict] = None) -> Iterable[str]:
+        """Exposition lines; `merged` holds this metric's values summed over all workers, if shared"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        if _shared is not None:
+            _shared.add(self.name, key, "", amount)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self, merged: Optional[Dict] = None) -> Iterable[str]:
+        if merged is not None:
+            items = sorted((key, value) for (key, _), value in merged.items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][slot] += 1
+            series[1][0] += value
+        if _shared is not None:
+            _shared.add(self.name, key, str(slot), 1)
+            _shared.add(self.name, key, "sum", value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self, merged: Optional[Dict] = None) -> Iterable[str]:
+        if merged is not None:
+            series: Dict[Tuple[str, ...], Tuple[List[float], float]] = {}
+            for (key, sample), value in merged.items():
+                counts, total = series.setdefault(key, ([0] * (len(self.buckets) + 1), 0.0))
+                if sample == "sum":
+                    series[key] = (counts, total + value)
+                else:
+                    counts[int(sample)] += int(value)
+            items = sorted(series.items())
+        else:
+            with self._lock:
+                items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Callback(_Metric):
+    """
+    Counter or gauge whose values come from fn() at scrape time
+
+    fn returns a number, or {label value tuple: number} when labelnames are given;
+    None means "nothing to report yet".
+    """
+
+    def __init__(self, name: str, doc: str, fn: Callable, kind: str = "gauge", labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self, merged: Optional[Dict] = None) -> Iterable[str]:
+        value = self.fn()
+        if value is None:
+            return
+        if not self.labelnames:
+            yield f"{self.name} {_number(value)}"
+            return
+        for key, v in sorted(value.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(v)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, doc, labelnames))
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, doc, labelnames, buckets))
+
+    def callback(self, name: str, doc: str, fn: Callable, kind: str = "gauge", labelnames: Sequence[str] = ()) -> Callback:
+        """Register (or replace) a scrape-time value"""
+        metric = Callback(name, doc, fn, kind, labelnames)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        # Counters and histograms summed over every worker's file; callbacks stay per process
+        merged = _shared.merged() if _shared is not None else None
+        lines = []
+        for metric in metrics:
+            try:
+                if merged is not None and isinstance(metric, (Counter, Histogram)):
+                    samples = list(metric.samples(merged.get(metric.name, {})))
+                else:
+                    samples = list(metric.samples())
+            except Exception as e:
+                # One broken callback must not take the whole scrape down
+                print(f"⚠️  Metric {metric.name} failed: {e}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module in the process
+metrics = MetricsRegistry()
+
+# Pipeline stages: tokenize, generate, decode, parse (recipe model), nutrition, knn_predict
+STAGE_SECONDS = metrics.histogram(
+    "nutrichef_stage_seconds", "Time spent in each ML pipeline stage", ["stage"])
+REQUEST_SECONDS = metrics.histogram(
+    "nutrichef_request_seconds", "End-to-end request latency by route and status", ["route", "status"])
+RECIPE_SOURCE = metrics.counter(
+    "nutrichef_recipe_responses_total", "Recipes served by source (ml, template, cache, store)", ["source"])
+GENERATED_TOKENS = metrics.counter(
+    "nutrichef_recipe_generated_tokens_total", "New tokens produced by the recipe model")
+TOKENS_PER_SECOND = metrics.histogram(
+    "nutrichef_recipe_tokens_per_second", "Generated tokens per second of each generate() batch",
+    buckets=THROUGHPUT_BUCKETS)
+RECIPE_CACHE_HITS = metrics.counter("nutrichef_recipe_cache_hits_total", "Recipe cache hits")
+RECIPE_CACHE_MISSES = metrics.counter("nutrichef_recipe_cache_misses_total", "Recipe cache misses")
+INFERENCE_CALLS = metrics.counter(
+    "nutrichef_inference_calls_total", "Model calls by endpoint and outcome", ["endpoint", "outcome"])
+BATCH_SIZE = metrics.histogram(
+    "nutrichef_recipe_batch_size", "Prompts decoded together per generate() call", buckets=(1, 2, 4, 8, 16, 32, 64))
+metrics.callback("nutrichef_process_pid", "Id of the worker process exposing these series", os.getpid)
@@ -0,0 +1,93 @@
+"""
+MinHash / LSH near-duplicate detection for the recipe corpus
+
+Each text becomes a set of word shingles; its MinHash signature (NUM_PERM
+minimums of multiply-shift hashes) estimates Jaccard similarity between two
+texts as the fraction of equal positions. NearDuplicateIndex buckets
+signatures by LSH bands, so only texts sharing a whole band are compared.
+
+Signatures only depend on the text and SEED, so they can be computed in worker
+processes and compared in the parent.
+"""
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16        # 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always share a band
+SHINGLE_WORDS = 3
+SEED = 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+_rng = np.random.default_rng(SEED)
+_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """crc32 of every `size`-word window of the lowercased text (unique, uint64)"""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64)
+
+
+def signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the text's shingle set"""
+    x = shingles(text)
+    if len(x) == 0:
+        return _EMPTY.copy()
+    # Multiply-shift hashing; uint64 arithmetic wraps, the top 32 bits are the hash
+    with np.errstate(over='ignore'):
+        hashed = (_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """
+    Signatures seen so far, bucketed by LSH band
+
+    add() keeps a signature unless an earlier one is at least `threshold`
+    similar, so the first occurrence of a group of near-duplicates wins and
+    the result only depends on the order of the input.
+    """
+
+    def __init__(self, threshold: float = 0.8, bands: int = BANDS):
+        if NUM_PERM % bands:
+            raise ValueError(f"bands must divide {NUM_PERM}")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, sig: np.ndarray) -> bool:
+        """True if sig was kept (no near-duplicate indexed yet)"""
+        keys = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        checked = set()
+        for bucket, key in zip(self._buckets, keys):
+            for other in bucket.get(key, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if similarity(self._signatures[other], sig) >= self.threshold:
+                    return False
+
+        idx = len(self._signatures)
+        self._signatures.append(sig)
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, []).append(idx)
+        return True
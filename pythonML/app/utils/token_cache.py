@@ -0,0 +1,204 @@
+"""
+Pre-tokenized training corpus cache
+
+The corpus is tokenized once, in parallel, into a flat token array
+(tokens.bin, uint16 when the vocabulary fits) plus the start offset of every
+recipe (offsets.npy). The cache directory is named after a hash of the corpus
+bytes and the tokenizer, so any change to either builds a new one and an
+unchanged corpus is reused as-is.
+
+TokenBlockDataset reads the array through a read-only memmap: opening it costs
+nothing, and DataLoader workers share the same page-cache pages instead of
+each holding a copy of Python token lists.
+"""
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from app.utils.corpus import chunked, iter_records
+
+TOKEN_CACHE_DIR = "data/token_cache"
+TOKENS = "tokens.bin"
+OFFSETS = "offsets.npy"
+META = "meta.json"
+FORMAT_VERSION = 1
+
+
+def cache_key(files: List[Path], tokenizer) -> str:
+    """sha256 over the corpus bytes and the tokenizer's identity and vocabulary"""
+    h = hashlib.sha256(f"v{FORMAT_VERSION}".encode())
+    for file_path in files:
+        h.update(f"\0{Path(file_path).name}\0".encode())
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    vocab = sorted(tokenizer.get_vocab().items())
+    h.update(json.dumps([type(tokenizer).__name__, len(tokenizer), vocab]).encode())
+    return h.hexdigest()
+
+
+def token_dtype(tokenizer) -> np.dtype:
+    return np.dtype(np.uint16) if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.dtype(np.uint32)
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _tokenize_chunk(records: List[str], dtype: str, tokenizer=None):
+    """(flat token ids, tokens per record) for a list of records"""
+    tokenizer = tokenizer or _worker_tokenizer
+    ids = tokenizer(records, add_special_tokens=False, verbose=False)['input_ids']
+    lengths = np.fromiter(map(len, ids), dtype=np.int64, count=len(ids))
+    flat = np.fromiter(itertools.chain.from_iterable(ids), dtype=dtype, count=int(lengths.sum()))
+    return flat, lengths
+
+
+def _tokenize_parallel(records, tokenizer, dtype: str, workers: int, chunk_records: int):
+    """Tokenized chunks in input order; at most 2 chunks per worker in flight"""
+    if workers <= 1:
+        for chunk in chunked(records, chunk_records):
+            yield _tokenize_chunk(chunk, dtype, tokenizer)
+        return
+
+    # Forked workers must not inherit a Rust tokenizer thread pool that is in use
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tokenizer,)) as pool:
+        pending = deque()
+        for chunk in chunked(records, chunk_records):
+            pending.append(pool.submit(_tokenize_chunk, chunk, dtype))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def build_token_cache(files: List[Path], tokenizer, cache_root: str = TOKEN_CACHE_DIR,
+                      workers: int = 0, chunk_records: int = 512) -> Path:
+    """
+    Directory holding the tokenized corpus, building it first if this corpus
+    and tokenizer have not been tokenized before
+    """
+    key = cache_key(files, tokenizer)
+    out = Path(cache_root) / key[:16]
+    if (out / META).exists():
+        print(f"♻️  Token cache hit: {out}")
+        return out
+
+    workers = workers or os.cpu_count() or 1
+    dtype = token_dtype(tokenizer)
+    print(f"🔤 Tokenizing {len(files)} corpus file(s) on {workers} process(es) -> {out}")
+    start = time.perf_counter()
+
+    # Built next to the target and renamed into place, so a cache is either complete or absent
+    tmp = Path(cache_root) / f".{key[:16]}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    offsets = [0]
+    with open(tmp / TOKENS, 'wb') as f:
+        chunks = _tokenize_parallel(iter_records(files), tokenizer, dtype.str, workers, chunk_records)
+        for n, (flat, lengths) in enumerate(chunks, 1):
+            f.write(flat.tobytes())
+            offsets.extend((offsets[-1] + np.cumsum(lengths)).tolist())
+            if n % 20 == 0:
+                print(f"  Tokenized {len(offsets) - 1} recipes...")
+    np.save(tmp / OFFSETS, np.asarray(offsets, dtype=np.int64))
+    meta = {
+        'version': FORMAT_VERSION,
+        'key': key,
+        'tokenizer': getattr(tokenizer, 'name_or_path', ''),
+        'vocab_size': len(tokenizer),
+        'dtype': dtype.str,
+        'records': len(offsets) - 1,
+        'tokens': offsets[-1],
+        'sources': [str(p) for p in files],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    (tmp / META).write_text(json.dumps(meta, indent=2))
+
+    try:
+        os.replace(tmp, out)
+    except OSError:
+        # Another process finished the same cache first
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"✅ {meta['tokens']:,} tokens from {meta['records']:,} recipes in {time.perf_counter() - start:.1f}s")
+    return out
+
+
+class TokenBlockDataset(Dataset):
+    """
+    Consecutive, non-overlapping block_size-token windows over a token cache
+    (the examples TextDataset produced), sliced from a memmap on demand
+    """
+
+    def __init__(self, cache_dir: str, block_size: int = 128):
+        self.cache_dir = Path(cache_dir)
+        self.meta = json.loads((self.cache_dir / META).read_text())
+        self.block_size = block_size
+        self.n_tokens = int(self.meta['tokens'])
+        self._tokens = None
+        self._offsets = None
+
+    @property
+    def tokens(self) -> np.ndarray:
+        if self._tokens is None:
+            if self.n_tokens == 0:
+                self._tokens = np.zeros(0, dtype=self.meta['dtype'])
+            else:
+                self._tokens = np.memmap(self.cache_dir / TOKENS, dtype=self.meta['dtype'], mode='r',
+                                         shape=(self.n_tokens,))
+        return self._tokens
+
+    @property
+    def offsets(self) -> np.ndarray:
+        if self._offsets is None:
+            self._offsets = np.load(self.cache_dir / OFFSETS, mmap_mode='r')
+        return self._offsets
+
+    @property
+    def records(self) -> int:
+        return int(self.meta['records'])
+
+    def record(self, i: int) -> np.ndarray:
+        """Token ids of the i-th recipe"""
+        return np.asarray(self.tokens[self.offsets[i]:self.offsets[i + 1]], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.n_tokens // self.block_size
+
+    def __getitem__(self, i: int) -> torch.Tensor:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start = i * self.block_size
+        return torch.from_numpy(self.tokens[start:start + self.block_size].astype(np.int64))
+
+    def __getstate__(self):
+        # Spawned DataLoader workers reopen the memmap rather than receive a pickled copy
+        state = dict(self.__dict__)
+        state['_tokens'] = None
+        state['_offsets'] = None
+        return state
+
+
+def load_token_dataset(tokenizer, files: List[Path], block_size: int = 128, cache_root: Optional[str] = None,
+                       workers: int = 0) -> TokenBlockDataset:
+    """Token cache for these corpus files (built on first use) as a training dataset"""
+    cache_dir = build_token_cache(files, tokenizer, cache_root or TOKEN_CACHE_DIR, workers=workers)
+    return TokenBlockDataset(cache_dir, block_size)
@@ -0,0 +1,346 @@
+"""
+Endpoint Load Benchmark
+Drives /predict/recipe, /predict/meal-plan and /predict/adaptive-diet with a
+configurable request mix and concurrency, then reports throughput, latency
+percentiles (p50/p95/p99) and error rate per endpoint and overall.
+
+By default the app is started in-process on a free localhost port. If there
+is no trained recipe model (or with --tiny-model) a tiny randomly initialized
+GPT-2 with its own byte-level BPE tokenizer stands in for it. The outputs are
+nonsense, but the whole batching / parsing / nutrition pipeline runs, so
+numbers are comparable between runs and machines. --url benchmarks an already
+running server instead.
+
+Payloads come from a seeded RNG, so two runs with the same arguments send the
+same requests. Results are saved as JSON; --baseline prints the change
+against an earlier report.
+
+Usage:
+    python benchmark_endpoints.py [--concurrency 8] [--requests 200 | --duration 30]
+                                  [--mix recipe=0.5,meal-plan=0.3,adaptive-diet=0.2]
+                                  [--url http://localhost:5000] [--tiny-model] [--no-cache] [--max-length 0]
+                                  [--out benchmark_report.json] [--baseline old_report.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import requests
+
+from app.utils import config
+
+ENDPOINTS = {
+    'recipe': '/predict/recipe',
+    'meal-plan': '/predict/meal-plan',
+    'adaptive-diet': '/predict/adaptive-diet',
+}
+DEFAULT_MIX = 'recipe=0.5,meal-plan=0.3,adaptive-diet=0.2'
+
+INGREDIENTS = [
+    "chicken", "rice", "tomato", "onion", "garlic", "pasta", "basil", "olive oil", "eggs", "milk",
+    "flour", "sugar", "potato", "cheese", "bacon", "spinach", "salmon", "lentils", "tofu", "broccoli",
+    "beef", "carrot", "quinoa", "chickpeas", "yogurt", "mushroom", "pepper", "lemon", "avocado", "oats"
+]
+CUISINES = ["Italian", "Indian", "Mexican", "Chinese", "Mediterranean", "American"]
+FOODS = ["Pizza", "Salad", "Burger", "Oatmeal", "Sushi", "Pasta", "Sandwich", "Curry"]
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner"]
+
+# Recipe-format text the stand-in tokenizer learns its merges from
+TINY_CORPUS = [
+    "INPUT: chicken, rice, garlic\nOUTPUT: TITLE: Garlic Chicken Rice | INGREDIENTS: 1 cup rice ; 2 chicken breasts ; "
+    "3 cloves garlic | INSTRUCTIONS: Cook the rice. Fry the chicken with garlic. Serve together.\n<END>\n",
+    "INPUT: pasta, tomato, basil\nOUTPUT: TITLE: Tomato Basil Pasta | INGREDIENTS: 200 g pasta ; 4 tomatoes ; "
+    "1 bunch basil | INSTRUCTIONS: Boil the pasta. Simmer the tomatoes. Toss with basil.\n<END>\n",
+    "INPUT: eggs, milk, flour\nOUTPUT: TITLE: Simple Pancakes | INGREDIENTS: 2 eggs ; 1 cup milk ; 1 cup flour | "
+    "INSTRUCTIONS: Whisk everything. Fry spoonfuls in a hot pan.\n<END>\n",
+]
+
+# --- Tiny stand-in model ---
+
+def build_tiny_model(path: str, seed: int = 0) -> str:
+    """Write a randomly initialized 2-layer GPT-2 and a byte-level BPE tokenizer to `path`"""
+    import torch
+    from tokenizers import ByteLevelBPETokenizer
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+
+    os.makedirs(path, exist_ok=True)
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(TINY_CORPUS * 20, vocab_size=512, special_tokens=["<|endoftext|>", "<END>"])
+    bpe.save_model(path)
+    tokenizer = GPT2Tokenizer.from_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+    torch.manual_seed(seed)
+    model_config = GPT2Config(
+        vocab_size=len(tokenizer), n_positions=1024, n_embd=64, n_layer=2, n_head=2,
+        bos_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id
+    )
+    GPT2LMHeadModel(model_config).save_pretrained(path)
+    return path
+
+# --- Payloads ---
+
+def _profile(rng: random.Random) -> dict:
+    return {
+        "weightKg": round(rng.uniform(45, 120), 1),
+        "heightCm": round(rng.uniform(150, 200), 1),
+        "age": rng.randint(18, 75),
+        "gender": rng.choice(["Male", "Female"]),
+        "activityLevel": rng.choice(["Sedentary", "Moderate", "Active"]),
+        "healthGoals": rng.choice(["Lose Weight", "Gain Muscle", "Maintain"]),
+        "dietaryRestrictions": "None",
+    }
+
+def make_payload(endpoint: str, rng: random.Random) -> dict:
+    if endpoint == 'recipe':
+        return {
+            "ingredients": ", ".join(rng.sample(INGREDIENTS, rng.randint(2, 4))),
+            "cuisine": rng.choice(CUISINES),
+            "dietaryRestrictions": "",
+        }
+    if endpoint == 'meal-plan':
+        return _profile(rng)
+    return {"foodItem": rng.choice(FOODS), "mealType": rng.choice(MEAL_TYPES), "userProfile": _profile(rng)}
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}' in --mix (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    return {name: w / total for name, w in mix.items() if w > 0}
+
+def plan_requests(mix: dict, count: int, seed: int):
+    """Deterministic (endpoint, payload) sequence"""
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    return [(name, make_payload(name, rng)) for name in rng.choices(names, weights, k=count)]
+
+# --- In-process server ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(ready_timeout: float):
+    """Run the app with uvicorn on a background thread; returns (base url, server)"""
+    import uvicorn
+    from app.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, name="bench-server", daemon=True).start()
+
+    url = f"http://127.0.0.1:{port}"
+    wait_ready(url, ready_timeout)
+    return url, server
+
+def wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/readyz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"❌ {url} was not ready within {timeout:.0f}s")
+
+# --- Load ---
+
+def run_load(url: str, plan, concurrency: int, duration: float, timeout: float):
+    """
+    Closed loop: each client sends its next request as soon as the previous one
+    returns. Stops when the plan is used up or `duration` seconds have passed.
+    """
+    results = []
+    lock = threading.Lock()
+    cursor = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def client():
+        session = requests.Session()
+        while True:
+            with lock:
+                if cursor[0] >= len(plan) or (deadline and time.monotonic() >= deadline):
+                    return
+                endpoint, payload = plan[cursor[0]]
+                cursor[0] += 1
+            start = time.perf_counter()
+            try:
+                status = session.post(url + ENDPOINTS[endpoint], json=payload, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((endpoint, status, elapsed))
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def summarize(results, wall: float) -> dict:
+    ok = sorted(elapsed for _, status, elapsed in results if status == 200)
+    errors = len(results) - len(ok)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': round(errors / len(results), 4) if results else 0.0,
+        'throughput_rps': round(len(results) / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.mean(ok) * 1000, 1) if ok else 0.0,
+            'p50': round(_percentile(ok, 50) * 1000, 1),
+            'p95': round(_percentile(ok, 95) * 1000, 1),
+            'p99': round(_percentile(ok, 99) * 1000, 1),
+            'max': round(ok[-1] * 1000, 1) if ok else 0.0,
+        },
+        'status': {str(k): v for k, v in sorted(Counter(str(s) for _, s, _ in results).items())},
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+def print_report(report: dict, baseline: dict = None):
+    print("\n" + "=" * 78)
+    print(f"{'endpoint':<15} {'reqs':>6} {'err %':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("=" * 78)
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, row in rows:
+        lat = row['latency_ms']
+        print(f"{name:<15} {row['requests']:>6} {row['error_rate'] * 100:>7.2f} {row['throughput_rps']:>8} "
+              f"{lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9}")
+
+    if baseline:
+        print(f"\n📊 Change vs baseline ({baseline.get('meta', {}).get('commit') or 'unknown commit'}):")
+        base_rows = dict(baseline.get('endpoints', {}), overall=baseline.get('overall'))
+        for name, row in rows:
+            old = base_rows.get(name)
+            if not old:
+                continue
+            deltas = []
+            for key in ('p50', 'p95', 'p99'):
+                before, after = old['latency_ms'][key], row['latency_ms'][key]
+                if before:
+                    deltas.append(f"{key} {100 * (after - before) / before:+.1f}%")
+            if old['throughput_rps']:
+                deltas.append(f"req/s {100 * (row['throughput_rps'] - old['throughput_rps']) / old['throughput_rps']:+.1f}%")
+            deltas.append(f"err {100 * (row['error_rate'] - old['error_rate']):+.2f}pp")
+            print(f"   {name:<15} " + "  ".join(deltas))
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the prediction endpoints")
+    parser.add_argument('--url', default='', help="Benchmark a running server instead of starting one in-process")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="Requests to send (after warm-up)")
+    parser.add_argument('--duration', type=float, default=0, help="Stop after this many seconds (0 = send all --requests)")
+    parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Endpoint weights, e.g. recipe=1 or recipe=2,meal-plan=1")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help="Per-request client timeout in seconds")
+    parser.add_argument('--tiny-model', action='store_true', help="Use the random tiny GPT-2 even if a trained model exists")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the recipe cache and store so every recipe is generated")
+    parser.add_argument('--max-length', type=int, default=0, help="In-process only: override RECIPE_MAX_LENGTH (tokens)")
+    parser.add_argument('--out', default='benchmark_report.json')
+    parser.add_argument('--baseline', default='', help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("NutriChef AI - Endpoint Load Benchmark")
+    print("=" * 60)
+
+    mix = parse_mix(args.mix)
+    tiny_dir = None
+    model = config.RECIPE_MODEL_PATH
+    server = None
+    if args.url:
+        url = args.url.rstrip('/')
+        model = 'remote'
+        wait_ready(url, 30)
+    else:
+        # Overrides must be in place before app.main creates the services
+        if args.tiny_model or not os.path.exists(config.RECIPE_MODEL_PATH):
+            tiny_dir = tempfile.mkdtemp(prefix='tiny_gpt2_')
+            print(f"🧪 No trained recipe model used; building a tiny random GPT-2 stand-in in {tiny_dir}")
+            config.RECIPE_MODEL_PATH = build_tiny_model(tiny_dir, args.seed)
+            config.RECIPE_BACKEND = 'eager'
+            model = 'tiny-random-gpt2'
+        if args.max_length:
+            config.RECIPE_MAX_LENGTH = args.max_length
+        if args.no_cache:
+            config.RECIPE_CACHE_SIZE = 0
+            config.RECIPE_STORE_PATH = os.path.join(tempfile.gettempdir(), 'no_recipe_store.sqlite')
+        print("🚀 Starting the app in-process...")
+        url, server = start_server(ready_timeout=600)
+    print(f"🌐 Target {url}  |  mix {mix}  |  concurrency {args.concurrency}")
+
+    try:
+        if args.warmup:
+            run_load(url, plan_requests(mix, args.warmup, args.seed + 1), min(args.concurrency, args.warmup), 0, args.timeout)
+        # With --duration the plan is simply long enough never to run out
+        count = args.requests if not args.duration else max(args.requests, 100000)
+        results, wall = run_load(url, plan_requests(mix, count, args.seed), args.concurrency, args.duration, args.timeout)
+    finally:
+        if server is not None:
+            server.should_exit = True
+        if tiny_dir:
+            shutil.rmtree(tiny_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'target': 'in-process' if server is not None else url,
+            'model': model,
+            'backend': config.RECIPE_BACKEND if server is not None else 'remote',
+            'cache': not args.no_cache,
+            'max_length': config.RECIPE_MAX_LENGTH if server is not None else None,
+            'concurrency': args.concurrency,
+            'mix': mix,
+            'seed': args.seed,
+            'wall_seconds': round(wall, 3),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+        },
+        'overall': summarize(results, wall),
+        'endpoints': {name: summarize([r for r in results if r[0] == name], wall) for name in mix},
+    }
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_report(report, baseline)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"\n📁 Report saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
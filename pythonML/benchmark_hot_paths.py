@@ -0,0 +1,267 @@
+"""
+Hot Path Micro-benchmarks
+Measures the non-GPT request paths against synthetic data of growing size, so
+their scaling curve is visible:
+
+    nutrition   NutritionService._fuzzy_match_ingredient (cold and memoized),
+                estimate_calories and estimate_meal_calories over 1k / 100k / 1M foods
+    strategy    MealPlanService._predict_strategy and the batched
+                predict_strategies over patient datasets of growing size
+                (exact KNN, plus the IVF index with --ivf)
+
+Every case reports ops/s (median of --repeats runs), the time to build the
+structure and its memory (resident-set growth while building it). Results are
+saved as JSON; with --baseline a case that got slower than --max-regression
+fails the run (exit code 1), so it can gate CI or a model/data swap.
+
+Usage:
+    python benchmark_hot_paths.py [--suite nutrition,strategy] [--food-sizes 1000,100000,1000000]
+                                  [--profile-sizes 1000,10000,100000,1000000] [--ivf]
+                                  [--out hot_paths_report.json] [--baseline old.json] [--max-regression 0.2]
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.models import UserProfile
+from app.services.meal_service import MealPlanService
+from app.services.model_registry import current_rss_bytes
+from app.services.nutrient_table import NUTRIENT_COLUMNS, NutrientTable
+from app.services.nutrition_service import NutritionService
+from app.services.profile_index import IVFIndex
+from app.services.strategy_predictor import DEFAULT_FEATURES, StrategyPredictor
+
+SYLLABLES = ['ba', 'ro', 'ki', 'ta', 'mu', 'ne', 'lo', 'pi', 'sa', 've', 'chi', 'dor',
+             'len', 'mar', 'tos', 'qui', 'zel', 'fra', 'gan', 'hol', 'ber', 'cum', 'pa', 'ri']
+# Real words mixed into the synthetic vocabulary so realistic ingredients match something
+REAL_WORDS = ['chicken', 'breast', 'rice', 'tomato', 'onion', 'garlic', 'pasta', 'cheese', 'cheddar',
+              'milk', 'egg', 'beef', 'pork', 'salmon', 'potato', 'spinach', 'bread', 'oil', 'olive',
+              'raw', 'cooked', 'canned', 'frozen', 'sweet', 'whole', 'wheat', 'brown', 'white']
+DESCRIPTORS = ['chopped', 'fresh', 'diced', 'grilled', 'sliced', 'boiled', '2 cups', '100 g']
+STRATEGIES = ['Balanced', 'Low_Carb', 'Low_Sodium', 'High_Protein']
+
+# --- Synthetic data ---
+
+def synthetic_foods(n: int, seed: int = 0) -> NutrientTable:
+    """n unique FoodData-style names ("word word, word") with random per-100g values"""
+    rng = np.random.default_rng(seed)
+    n_words = max(64, int(np.sqrt(n)) * 4)
+    words = set()
+    while len(words) < n_words:
+        words.add(''.join(rng.choice(SYLLABLES, int(rng.integers(2, 4)))))
+    vocab = REAL_WORDS + sorted(words)
+
+    names = {}
+    while len(names) < n:
+        missing = n - len(names)
+        lengths = rng.integers(1, 5, missing).tolist()
+        picks = rng.integers(0, len(vocab), (missing, 4)).tolist()
+        for row, length in zip(picks, lengths):
+            ws = [vocab[i] for i in row[:length]]
+            name = ' '.join(ws[:2]) + (', ' + ' '.join(ws[2:]) if length > 2 else '')
+            names.setdefault(name, None)
+    values = rng.uniform(0, [900, 90, 100, 100], (n, len(NUTRIENT_COLUMNS))).astype(np.float32)
+    return NutrientTable(list(names)[:n], values)
+
+def ingredient_queries(table: NutrientTable, count: int, seed: int = 0):
+    """Mix of exact names, names with preparation words, free text and misses"""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for i in range(count):
+        name = table.names[int(rng.integers(0, len(table)))]
+        kind = i % 4
+        if kind == 0:
+            queries.append(name)
+        elif kind == 1:
+            queries.append(f"{rng.choice(DESCRIPTORS)} {name.replace(',', '')}")
+        elif kind == 2:
+            queries.append(' '.join(rng.choice(REAL_WORDS, 3)))
+        else:
+            queries.append(f"unknownfood{i}")
+    return queries
+
+def synthetic_profiles(n: int, seed: int = 0):
+    """(features matrix, label codes) for n patients; labels loosely follow BMI"""
+    rng = np.random.default_rng(seed)
+    age = rng.integers(18, 80, n).astype(np.float64)
+    weight = rng.uniform(45, 130, n)
+    height = rng.uniform(145, 200, n)
+    bmi = weight / (height / 100) ** 2
+    codes = np.clip((bmi - 16) // 6, 0, len(STRATEGIES) - 1).astype(np.int64)
+    flip = rng.random(n) < 0.2
+    codes[flip] = rng.integers(0, len(STRATEGIES), int(flip.sum()))
+    return np.column_stack([age, weight, height, bmi]), codes
+
+def user_profiles(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed + 2)
+    return [
+        UserProfile(
+            weightKg=float(rng.uniform(45, 130)), heightCm=float(rng.uniform(145, 200)),
+            age=int(rng.integers(18, 80)), gender='Male', activityLevel='Moderate', healthGoals='Maintain'
+        )
+        for _ in range(count)
+    ]
+
+# --- Measurement ---
+
+def measure(fn, items, min_time: float, setup=None) -> float:
+    """Call fn on items (cycling) for at least min_time seconds; returns ops/s"""
+    ops = 0
+    start = time.perf_counter()
+    while True:
+        if setup is not None:
+            setup()
+        for item in items:
+            fn(item)
+            ops += 1
+            if ops % 16 == 0 and time.perf_counter() - start >= min_time:
+                return ops / (time.perf_counter() - start)
+        if time.perf_counter() - start >= min_time:
+            return ops / (time.perf_counter() - start)
+
+def run_case(results, suite, case, size, fn, items, args, setup=None, per_call: int = 1, build=None):
+    runs = [measure(fn, items, args.min_time, setup) * per_call for _ in range(args.repeats)]
+    row = {
+        'suite': suite, 'case': case, 'size': size,
+        'ops_per_sec': round(statistics.median(runs), 1),
+        'us_per_op': round(1e6 / statistics.median(runs), 2),
+        'best_ops_per_sec': round(max(runs), 1),
+    }
+    if build:
+        row.update(build)
+    results.append(row)
+    print(f"   {case:<32} {size:>9,}  {row['ops_per_sec']:>12,.1f} ops/s  {row['us_per_op']:>10,.2f} us/op")
+
+def build_timed(fn):
+    """(result, {'build_seconds', 'memory_mb'}) of building something"""
+    gc.collect()
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    value = fn()
+    build = {
+        'build_seconds': round(time.perf_counter() - start, 3),
+        'memory_mb': round(max(0, current_rss_bytes() - rss_before) / 2**20, 1),
+    }
+    return value, build
+
+# --- Suites ---
+
+def bench_nutrition(sizes, args, results):
+    print("\n🥦 NutritionService")
+    for size in sizes:
+        table, _ = build_timed(lambda: synthetic_foods(size, args.seed))
+        service, build = build_timed(lambda: NutritionService.from_table(table))
+        build['table_mb'] = round(table.nbytes / 2**20, 2)
+        print(f"   {size:,} foods: index built in {build['build_seconds']}s, +{build['memory_mb']} MB")
+
+        queries = ingredient_queries(table, args.queries, args.seed)
+        lists = [queries[i:i + 5] for i in range(0, len(queries) - 4, 5)]
+        meal_strings = [', '.join(lst) for lst in lists]
+        clear = service._index._memo.cache_clear
+
+        run_case(results, 'nutrition', 'fuzzy_match (cold)', size, service._fuzzy_match_ingredient, queries, args,
+                 setup=clear, build=build)
+        run_case(results, 'nutrition', 'fuzzy_match (memoized)', size, service._fuzzy_match_ingredient, queries, args)
+        run_case(results, 'nutrition', 'estimate_calories (5 items)', size, service.estimate_calories, lists, args)
+        run_case(results, 'nutrition', 'estimate_meal_calories', size, service.estimate_meal_calories, meal_strings, args)
+        del service, table
+        gc.collect()
+
+def bench_strategy(sizes, args, results):
+    print("\n🧭 Diet strategy prediction")
+    profiles = user_profiles(args.queries, args.seed)
+    batches = [profiles[i:i + args.batch] for i in range(0, len(profiles), args.batch)]
+    modes = ['exact', 'ivf'] if args.ivf else ['exact']
+
+    for size in sizes:
+        x, codes = synthetic_profiles(size, args.seed)
+        for mode in modes:
+            if mode == 'exact':
+                predictor, build = build_timed(
+                    lambda: StrategyPredictor(DEFAULT_FEATURES, x, codes, STRATEGIES, n_neighbors=5))
+            else:
+                predictor, build = build_timed(lambda: StrategyPredictor.from_index(
+                    IVFIndex.build(x, label_codes=codes, seed=args.seed,
+                                   meta={'features': DEFAULT_FEATURES, 'labels': STRATEGIES}), n_neighbors=5))
+            build['data_mb'] = round(x.nbytes / 2**20, 2)
+            service = MealPlanService(strategy_predictor=predictor)
+            print(f"   {size:,} patients ({mode}): built in {build['build_seconds']}s, +{build['memory_mb']} MB")
+
+            run_case(results, 'strategy', f'_predict_strategy ({mode})', size, service._predict_strategy, profiles,
+                     args, build=build)
+            run_case(results, 'strategy', f'predict_strategies x{args.batch} ({mode})', size,
+                     service.predict_strategies, batches, args, per_call=args.batch)
+            service.close()
+        del x, codes
+        gc.collect()
+
+# --- Reporting ---
+
+def check_regressions(results, baseline, threshold: float):
+    """Cases whose ops/s fell by more than threshold (a fraction) vs the baseline"""
+    old = {(r['suite'], r['case'], r['size']): r for r in baseline.get('results', [])}
+    failures = []
+    print(f"\n📊 Change vs baseline (fail below -{threshold:.0%}):")
+    for row in results:
+        before = old.get((row['suite'], row['case'], row['size']))
+        if not before or not before['ops_per_sec']:
+            continue
+        change = row['ops_per_sec'] / before['ops_per_sec'] - 1
+        bad = change < -threshold
+        print(f"   {'❌' if bad else '✅'} {row['suite']:<10} {row['case']:<32} {row['size']:>9,}  {change:+.1%}")
+        if bad:
+            failures.append(row)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark nutrition lookup and diet strategy prediction")
+    parser.add_argument('--suite', default='nutrition,strategy')
+    parser.add_argument('--food-sizes', default='1000,100000,1000000')
+    parser.add_argument('--profile-sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--ivf', action='store_true', help="Also benchmark strategy prediction through the IVF index")
+    parser.add_argument('--queries', type=int, default=2000, help="Distinct ingredient queries / profiles per case")
+    parser.add_argument('--batch', type=int, default=64, help="Profiles per predict_strategies call")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Seconds per measurement")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='hot_paths_report.json')
+    parser.add_argument('--baseline', default='', help="Earlier report to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="Fail when a case's ops/s drops by more than this fraction vs --baseline")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("NutriChef AI - Hot Path Micro-benchmarks")
+    print("=" * 60)
+
+    suites = {s.strip() for s in args.suite.split(',') if s.strip()}
+    results = []
+    if 'nutrition' in suites:
+        bench_nutrition([int(s) for s in args.food_sizes.split(',') if s.strip()], args, results)
+    if 'strategy' in suites:
+        bench_strategy([int(s) for s in args.profile_sizes.split(',') if s.strip()], args, results)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {k: getattr(args, k) for k in ('queries', 'batch', 'min_time', 'repeats', 'seed')},
+        'results': results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"\n📁 Report saved to {args.out}")
+
+    if args.baseline:
+        failures = check_regressions(results, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        if failures:
+            print(f"\n❌ {len(failures)} case(s) regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+        print("\n✅ No regressions beyond the threshold")
+
+if __name__ == "__main__":
+    main()
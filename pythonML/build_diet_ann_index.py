@@ -0,0 +1,206 @@
+"""
+Diet ANN Index Builder & Benchmark
+Builds the IVF approximate nearest-neighbour index over patient profiles (see
+app/services/profile_index.py) and measures its recall, label agreement and
+latency against the exact model the service deploys (StrategyPredictor over
+the diet bundle, raw features)
+
+--synthetic N grows the dataset to N rows by resampling patients with a little
+Gaussian jitter, to see how the index behaves at millions of profiles.
+
+Usage:
+    python build_diet_ann_index.py build [--nlist 0] [--nprobe 8] [--synthetic 0] [--standardize]
+    python build_diet_ann_index.py benchmark [--synthetic 1000000] [--nprobe 1,2,4,8,16] [--out ann_report.json]
+
+Serve it with DIET_NEIGHBOR_SEARCH=ivf
+"""
+
+import argparse
+import json
+import os
+import pickle
+import statistics
+import time
+
+import numpy as np
+
+from app.services.diet_bundle import DietBundle
+from app.services.profile_index import IVFIndex
+from app.services.strategy_predictor import (
+    DEFAULT_FEATURES, DIET_DATA_PATH, DIET_MODEL_PATH, LABEL_COLUMN, StrategyPredictor
+)
+from app.utils import config
+
+def load_dataset(data_path: str, synthetic: int = 0, seed: int = 0):
+    """
+    (features, x, label_codes, labels, n_neighbors, reference) from the diet
+    bundle (or CSV), optionally grown to `synthetic` rows
+
+    reference is the exact predictor the service would deploy for these rows:
+    StrategyPredictor.from_bundle for the real bundle, otherwise the same
+    raw-feature exact KNN over the (grown) rows.
+    """
+    reference = None
+    if os.path.exists(config.DIET_BUNDLE_PATH) and data_path == DIET_DATA_PATH:
+        bundle = DietBundle.load(config.DIET_BUNDLE_PATH)
+        features, n_neighbors = bundle.features, bundle.n_neighbors
+        x, codes, labels = np.asarray(bundle.x), np.asarray(bundle.label_codes), np.array(bundle.labels)
+        if synthetic <= len(x):
+            reference = StrategyPredictor.from_bundle(bundle)
+    else:
+        import pandas as pd
+
+        features = DEFAULT_FEATURES
+        n_neighbors = 5
+        if os.path.exists(DIET_MODEL_PATH):
+            with open(DIET_MODEL_PATH, 'rb') as f:
+                model_data = pickle.load(f)
+            if isinstance(model_data, dict):
+                features = model_data['features']
+                n_neighbors = getattr(model_data['model'], 'n_neighbors', n_neighbors)
+
+        df = pd.read_csv(data_path)
+        x = df[features].fillna(0).to_numpy(dtype=np.float64)
+        labels, codes = np.unique(df[LABEL_COLUMN].astype(str).to_numpy(), return_inverse=True)
+
+    if synthetic > len(x):
+        rng = np.random.default_rng(seed)
+        picks = rng.integers(0, len(x), synthetic)
+        jitter = rng.normal(0, 0.02, (synthetic, x.shape[1])) * x.std(axis=0)
+        x = x[picks] + jitter
+        codes = codes[picks]
+    codes = codes.astype(np.int64)
+    if reference is None:
+        reference = StrategyPredictor(features, x, codes, labels.tolist(), n_neighbors)
+    return features, x, codes, labels.tolist(), n_neighbors, reference
+
+def build(args):
+    print("=" * 60)
+    print("Diet ANN Index Builder")
+    print("=" * 60)
+
+    features, x, codes, labels, n_neighbors, _ = load_dataset(args.data, args.synthetic, args.seed)
+    print(f"📚 {len(x)} profiles, features: {features}")
+    if args.standardize:
+        print("⚠️  --standardize: the index uses a different metric than the exact model, so predictions change")
+
+    start = time.perf_counter()
+    index = IVFIndex.build(
+        x, nlist=args.nlist or None, nprobe=args.nprobe, iters=args.iters, seed=args.seed,
+        label_codes=codes, meta={'features': features, 'labels': labels, 'n_neighbors': n_neighbors},
+        standardize=args.standardize
+    )
+    index.save(args.out)
+
+    sizes = np.diff(index.list_offsets)
+    print("=" * 60)
+    print(f"✅ Index written: {len(index)} profiles in {index.nlist} cells -> {args.out}")
+    print(f"   Cell size min/median/max: {sizes.min()}/{int(np.median(sizes))}/{sizes.max()}")
+    print(f"   Time: {time.perf_counter() - start:.1f}s")
+    print("=" * 60)
+
+def benchmark(args):
+    print("=" * 60)
+    print("Diet ANN Benchmark (IVF vs the deployed exact model)")
+    print("=" * 60)
+
+    features, x, codes, labels, n_neighbors, exact = load_dataset(args.data, args.synthetic, args.seed)
+    k = args.k or n_neighbors
+    exact.n_neighbors = k
+    print(f"📚 {len(x)} profiles, k={k}")
+
+    start = time.perf_counter()
+    index = IVFIndex.build(x, nlist=args.nlist or None, iters=args.iters, seed=args.seed,
+                           label_codes=codes, meta={'features': features, 'labels': labels},
+                           standardize=args.standardize)
+    build_seconds = time.perf_counter() - start
+    print(f"🔧 Built {index.nlist} cells in {build_seconds:.1f}s")
+
+    # Queries: held-in patients nudged off their stored point
+    rng = np.random.default_rng(args.seed + 1)
+    queries = x[rng.integers(0, len(x), args.queries)] + rng.normal(0, 0.05, (args.queries, x.shape[1])) * x.std(axis=0)
+
+    # Ground truth: the exact model the service runs without the index (raw features)
+    start = time.perf_counter()
+    _, true_ids = exact.kneighbors(queries)
+    exact_batch = time.perf_counter() - start
+    exact_single = _single_latencies(lambda q: exact.kneighbors(q), queries[:args.single])
+    true_codes, _ = exact.predict_codes(queries)
+
+    report = {
+        'profiles': len(x), 'k': k, 'nlist': index.nlist, 'build_seconds': round(build_seconds, 2),
+        'standardized': args.standardize, 'reference': 'deployed exact StrategyPredictor (raw features)',
+        'exact': {
+            'batch_queries_per_sec': round(len(queries) / exact_batch, 1),
+            'single_p50_ms': round(statistics.median(exact_single), 3),
+        },
+        'ivf': [],
+    }
+
+    ann = StrategyPredictor.from_index(index, k)
+    for nprobe in [int(n) for n in args.nprobe.split(',') if n.strip()]:
+        index.nprobe = nprobe
+        start = time.perf_counter()
+        _, ann_ids = index.search(queries, k)
+        batch = time.perf_counter() - start
+        single = _single_latencies(lambda q: index.search(q, k), queries[:args.single])
+
+        recall = np.mean([len(set(a) & set(t)) / k for a, t in zip(ann_ids.tolist(), true_ids.tolist())])
+        ann_codes, _ = ann.predict_codes(queries)
+        row = {
+            'nprobe': nprobe,
+            'recall_at_k': round(float(recall), 4),
+            'label_agreement': round(float(np.mean(ann_codes == true_codes)), 4),
+            'batch_queries_per_sec': round(len(queries) / batch, 1),
+            'single_p50_ms': round(statistics.median(single), 3),
+            'single_p95_ms': round(float(np.percentile(single, 95)), 3),
+        }
+        report['ivf'].append(row)
+        print(f"  nprobe={nprobe:<3} recall@{k}={row['recall_at_k']:.3f}  labels={row['label_agreement']:.3f}  "
+              f"p50={row['single_p50_ms']:.3f}ms  {row['batch_queries_per_sec']:.0f} q/s")
+
+    print(f"  exact      p50={report['exact']['single_p50_ms']:.3f}ms  {report['exact']['batch_queries_per_sec']:.0f} q/s")
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("=" * 60)
+    print(f"✅ Report written to {args.out}")
+    print("=" * 60)
+
+def _single_latencies(fn, queries):
+    out = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q[None, :])
+        out.append((time.perf_counter() - start) * 1000)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and benchmark the diet profile ANN index")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('build', 'benchmark'):
+        p = sub.add_parser(name)
+        p.add_argument('--data', default=DIET_DATA_PATH)
+        p.add_argument('--synthetic', type=int, default=0, help="Grow the dataset to this many rows")
+        p.add_argument('--nlist', type=int, default=0, help="Number of cells (0 = sqrt(N))")
+        p.add_argument('--iters', type=int, default=10)
+        p.add_argument('--seed', type=int, default=0)
+        p.add_argument('--standardize', action='store_true',
+                       help="Z-score features in the index (a different model from the deployed exact KNN)")
+
+    build_parser = sub.choices['build']
+    build_parser.add_argument('--nprobe', type=int, default=8, help="Cells probed per query by default")
+    build_parser.add_argument('--out', default=config.DIET_ANN_INDEX_PATH)
+
+    bench_parser = sub.choices['benchmark']
+    bench_parser.add_argument('--nprobe', default='1,2,4,8,16')
+    bench_parser.add_argument('--k', type=int, default=0, help="Neighbours (0 = the model's n_neighbors)")
+    bench_parser.add_argument('--queries', type=int, default=2000)
+    bench_parser.add_argument('--single', type=int, default=200, help="Queries timed one at a time")
+    bench_parser.add_argument('--out', default='ann_report.json')
+
+    args = parser.parse_args()
+    build(args) if args.command == 'build' else benchmark(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Recipe Store Builder
+Pre-generates recipes for the most common ingredient combinations so the API can
+serve them with an indexed lookup instead of running GPT-2 on every request
+
+Combinations are the ingredient pairs/triples that co-occur most often in the
+training corpus (data/recipe_training/). Stored recipes only answer plain
+ingredient requests (no cuisine, restrictions or seed); the meal-plan and diet
+services always ask for their strategy, so their combinations are not stored.
+
+Usage:
+    python build_recipe_store.py [--top 2000] [--combo-sizes 2,3] [--batch 16]
+"""
+
+import argparse
+import time
+from collections import Counter
+from itertools import combinations
+from pathlib import Path
+
+from app.models import RecipeRequest
+from app.services.recipe_cache import normalize_list
+from app.services.recipe_service import RecipeService
+from app.services.recipe_store import StoredRecipe, write_store
+from app.utils import config
+from app.utils.corpus import corpus_files, iter_corpus_lines
+
+def _prune(counts: Counter, keep: int):
+    """Drop all but the `keep` most frequent entries (in place)"""
+    if len(counts) > keep:
+        kept = counts.most_common(keep)
+        counts.clear()
+        counts.update(dict(kept))
+
+def mined_combos(data_path: str, sizes, top: int, max_counted: int = 0):
+    """
+    Most frequent co-occurring ingredient combinations in the training corpus
+
+    Counted level by level (single ingredients, then pairs, then triples), one
+    pass over the corpus each: a combination is only counted when every one of
+    its sub-combinations survived the level below. No level ever holds more than
+    `max_counted` counters (default: 20 x top, at least 10,000); past that the
+    rarest are dropped, so counts of combinations near the cut-off are
+    approximate but memory stays bounded however large the corpus is.
+    """
+    files = corpus_files(data_path or None)
+    if not files:
+        print(f"⚠️  {data_path or 'Training corpus'} not found, skipping corpus mining")
+        return []
+
+    max_counted = max_counted or max(20 * top, 10_000)
+    found = Counter()
+    frequent = None  # Combinations of the previous level that may be extended
+    for size in range(1, max(sizes) + 1):
+        items = None if frequent is None else {item for combo in frequent for item in combo}
+        counts = Counter()
+        for line in iter_corpus_lines(files):
+            if not line.startswith('INPUT:'):
+                continue
+            ingredients = normalize_list(line[len('INPUT:'):])
+            if items is not None:
+                ingredients = [i for i in ingredients if i in items]
+            for combo in combinations(ingredients, size):
+                if frequent is None or all(sub in frequent for sub in combinations(combo, size - 1)):
+                    counts[combo] += 1
+            if len(counts) > 2 * max_counted:
+                _prune(counts, max_counted)
+        _prune(counts, max_counted)
+        print(f"   Mined {len(counts)} ingredient combination(s) of {size}")
+        if size in sizes:
+            found.update(counts)
+        frequent = set(counts)
+
+    return [combo for combo, _ in found.most_common(top)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate recipes into the indexed recipe store")
+    parser.add_argument('--data', default='', help="Corpus shard directory or file (default: data/recipe_training)")
+    parser.add_argument('--out', default=config.RECIPE_STORE_PATH)
+    parser.add_argument('--top', type=int, default=2000, help="How many mined combinations to keep")
+    parser.add_argument('--combo-sizes', default='2,3')
+    parser.add_argument('--batch', type=int, default=16, help="Recipes generated per batched pass")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Recipe Store Builder")
+    print("=" * 60)
+
+    sizes = [int(s) for s in args.combo_sizes.split(',') if s.strip()]
+    combos = mined_combos(args.data, sizes, args.top)
+    print(f"📚 {len(combos)} ingredient combinations to pre-generate")
+
+    # Don't read from the store we are about to replace
+    service = RecipeService(use_store=False)
+    service.warm_up()
+    nutrition = service.nutrition_service
+    if not service.use_ml:
+        # The API already falls back to templates; storing them would only hide the model once it exists
+        raise SystemExit(f"❌ No trained recipe model at {config.RECIPE_MODEL_PATH}; "
+                         f"train it first (the store only holds GPT-2 recipes)")
+    print("   Generator: GPT-2")
+
+    start = time.perf_counter()
+    recipes = []
+    skipped = 0
+    for offset in range(0, len(combos), args.batch):
+        chunk = combos[offset:offset + args.batch]
+        requests = [RecipeRequest(ingredients=", ".join(c)) for c in chunk]
+        responses, pending = service.submit_many(requests)
+        # Only answers GPT-2 produced (now or earlier, via the cache); template fallbacks are skipped
+        generated = [r is not None for r in responses]
+        responses = service.finish_many(requests, responses, pending)
+        for i, (combo, response) in enumerate(zip(chunk, responses)):
+            if not generated[i] and (i not in pending or pending[i].exception() is not None):
+                skipped += 1
+                continue
+            estimate = nutrition.estimate_calories(list(combo))
+            recipes.append(StoredRecipe(
+                combo, response.title, response.ingredients, response.instructions,
+                estimate['calories'], estimate['protein'], estimate['fat'], estimate['carbs']
+            ))
+        print(f"  Generated {len(recipes)}/{len(combos)} recipes...")
+    if skipped:
+        print(f"⚠️  {skipped} combination(s) skipped: GPT-2 failed on them")
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    count = write_store(args.out, recipes)
+
+    print("=" * 60)
+    print(f"✅ Recipe store written: {count} recipes -> {args.out}")
+    print(f"   Time: {time.perf_counter() - start:.1f}s")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
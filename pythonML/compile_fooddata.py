@@ -0,0 +1,63 @@
+"""
+FoodData Central Compiler
+Streams an FDC JSON export (foundation, SR legacy, survey or branded foods) into the
+memory-mappable cache NutritionService loads at startup. The service also does this
+on its own when the cache is missing or stale; run it ahead of time for large
+releases so the API never compiles on its first request.
+
+Usage:
+    python compile_fooddata.py [--source FoodData_Central_branded_food_json.json] [--out app/models/fooddata_cache]
+    python compile_fooddata.py --verify
+"""
+
+import argparse
+import sys
+
+from app.services.fooddata_cache import build_cache, load_cache, read_manifest, stale_reason
+from app.services.nutrition_service import NutritionService
+from app.utils import config
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile FoodData Central JSON into a memory-mappable cache")
+    parser.add_argument('--source', default=config.FOODDATA_JSON_PATH)
+    parser.add_argument('--out', default=config.FOODDATA_CACHE_DIR)
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the cache is current")
+    parser.add_argument('--verify', action='store_true', help="Only check the existing cache's checksums")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("FoodData Central Compiler")
+    print("=" * 60)
+
+    if args.verify:
+        table = load_cache(args.out, verify=True)
+        manifest = read_manifest(args.out)
+        print(f"✅ {args.out}: {len(table)} foods, checksums OK")
+        print(f"   Source: {manifest['source']['path']} ({manifest['source']['array_key']})")
+        reason = stale_reason(manifest, args.source)
+        if reason:
+            print(f"⚠️  Cache is stale: {reason}")
+            sys.exit(1)
+        return
+
+    # The defaults are part of the artifact, so take them from the service itself
+    service = object.__new__(NutritionService)
+    service._load_defaults()
+    defaults = service.nutrition_db
+
+    reason = stale_reason(read_manifest(args.out), args.source, defaults)
+    if reason is None and not args.force:
+        print(f"✅ {args.out} is already current for {args.source}")
+        return
+
+    manifest = build_cache(args.source, args.out, defaults)
+    table = load_cache(args.out, verify=True)
+
+    print("=" * 60)
+    print(f"✅ FoodData cache written: {len(table)} foods -> {args.out}")
+    print(f"   Source sha256: {manifest['source']['sha256']}")
+    print(f"   Nutrient matrix: {table.nbytes / 1024:.1f} KB")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Recipe Model Export & Backend Comparison
+Exports the trained GPT-2 recipe model to ONNX (with KV-cache) and compares the
+eager, int8 and ONNX Runtime backends on latency, tokens/s, RSS and output parity
+
+Usage:
+    python export_recipe_model.py export
+    python export_recipe_model.py compare [--backends eager,int8,onnx] [--max-new-tokens 64] [--out backend_report.json]
+
+Requires: pip install "optimum[onnxruntime]" (for the ONNX backend)
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import statistics
+import time
+from pathlib import Path
+
+from app.utils import config
+
+TEST_INGREDIENTS = [
+    "tomato, onions, chicken",
+    "pasta, garlic, olive oil, basil",
+    "eggs, milk, flour, sugar",
+    "rice, soy sauce, vegetables",
+    "potato, cheese, bacon"
+]
+
+def export_onnx(model_path: str, onnx_path: str):
+    """Export the PyTorch checkpoint to ONNX Runtime with past key/values"""
+    from optimum.onnxruntime import ORTModelForCausalLM
+    from transformers import GPT2Tokenizer
+
+    print(f"🔧 Exporting {model_path} -> {onnx_path} (with KV-cache)...")
+    start = time.perf_counter()
+    model = ORTModelForCausalLM.from_pretrained(model_path, export=True, use_cache=True)
+    model.save_pretrained(onnx_path)
+    GPT2Tokenizer.from_pretrained(model_path).save_pretrained(onnx_path)
+    print(f"✅ Export finished in {time.perf_counter() - start:.1f}s")
+
+def _bench_backend(name: str, max_new_tokens: int, repeats: int, results):
+    """Runs in a fresh process so RSS reflects this backend alone"""
+    import torch
+    from app.services.inference_backends import load_backend
+    from app.services.model_registry import current_rss_bytes
+
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    tokenizer, model = load_backend(name, config.RECIPE_MODEL_PATH)
+    load_seconds = time.perf_counter() - start
+    rss_model = current_rss_bytes() - rss_before
+
+    vocab = tokenizer.get_vocab()
+    end_id = tokenizer.encode('<END>')[0] if '<END>' in vocab else tokenizer.eos_token_id
+
+    latencies, token_counts, outputs = [], [], []
+    for ingredients in TEST_INGREDIENTS:
+        inputs = tokenizer(f"INPUT: {ingredients}\nOUTPUT:", return_tensors='pt')
+        prompt_len = inputs['input_ids'].shape[1]
+        for i in range(repeats):
+            start = time.perf_counter()
+            with torch.no_grad():
+                out = model.generate(
+                    inputs['input_ids'],
+                    attention_mask=inputs['attention_mask'],
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,  # Greedy so the backends can be compared token for token
+                    pad_token_id=tokenizer.eos_token_id,
+                    eos_token_id=end_id
+                )
+            latencies.append(time.perf_counter() - start)
+            new_tokens = out[0][prompt_len:].tolist()
+            token_counts.append(len(new_tokens))
+            if i == 0:
+                outputs.append(new_tokens)
+
+    results.put({
+        'backend': name,
+        'load_seconds': round(load_seconds, 3),
+        'rss_mb': round(rss_model / (1024 * 1024), 1),
+        'latency_p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'latency_mean_ms': round(statistics.mean(latencies) * 1000, 1),
+        'tokens_per_second': round(sum(token_counts) / sum(latencies), 1),
+        'outputs': outputs,
+    })
+
+def _parity(reference, candidate) -> dict:
+    """Share of prompts with identical greedy output, and mean agreeing prefix"""
+    exact, prefix = 0, []
+    for ref, cand in zip(reference, candidate):
+        exact += ref == cand
+        agree = 0
+        for a, b in zip(ref, cand):
+            if a != b:
+                break
+            agree += 1
+        prefix.append(agree / max(1, len(ref)))
+    return {
+        'exact_match': round(exact / max(1, len(reference)), 3),
+        'mean_prefix_agreement': round(statistics.mean(prefix), 3) if prefix else 0.0,
+    }
+
+def compare(backends, max_new_tokens: int, repeats: int, out_file: str):
+    ctx = mp.get_context('spawn')
+    report = []
+    for name in backends:
+        print(f"\n⏱️  Benchmarking backend: {name}")
+        results = ctx.Queue()
+        proc = ctx.Process(target=_bench_backend, args=(name, max_new_tokens, repeats, results))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0 or results.empty():
+            print(f"   ❌ {name} failed (exit code {proc.exitcode})")
+            report.append({'backend': name, 'error': f'exit code {proc.exitcode}'})
+            continue
+        report.append(results.get())
+
+    reference = next((r for r in report if r.get('backend') == 'eager' and 'outputs' in r), None)
+    for row in report:
+        if reference is not None and 'outputs' in row:
+            row['parity_vs_eager'] = _parity(reference['outputs'], row['outputs'])
+
+    print("\n" + "=" * 70)
+    print(f"{'backend':<8} {'load s':>8} {'RSS MB':>8} {'p50 ms':>9} {'tok/s':>8} {'exact':>7} {'prefix':>7}")
+    print("=" * 70)
+    for row in report:
+        if 'error' in row:
+            print(f"{row['backend']:<8} {row['error']}")
+            continue
+        parity = row.get('parity_vs_eager', {})
+        print(f"{row['backend']:<8} {row['load_seconds']:>8} {row['rss_mb']:>8} {row['latency_p50_ms']:>9} "
+              f"{row['tokens_per_second']:>8} {parity.get('exact_match', '-'):>7} "
+              f"{parity.get('mean_prefix_agreement', '-'):>7}")
+
+    for row in report:
+        row.pop('outputs', None)
+    Path(out_file).write_text(json.dumps(report, indent=2))
+    print(f"\n📁 Report saved to {out_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and compare recipe model inference backends")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('export', help="Export the PyTorch model to ONNX Runtime")
+
+    cmp_parser = sub.add_parser('compare', help="Compare backends on latency, tokens/s, RSS and parity")
+    cmp_parser.add_argument('--backends', default='eager,int8,onnx')
+    cmp_parser.add_argument('--max-new-tokens', type=int, default=64)
+    cmp_parser.add_argument('--repeats', type=int, default=3)
+    cmp_parser.add_argument('--out', default='backend_report.json')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_onnx(config.RECIPE_MODEL_PATH, config.RECIPE_ONNX_PATH)
+    else:
+        compare([b.strip() for b in args.backends.split(',') if b.strip()],
+                args.max_new_tokens, args.repeats, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,103 @@
 """
 Recipe Data Preparation Script
 Prepares 83K recipes for GPT-2 training by formatting them as INPUT/OUTPUT pairs
-Optimized for 16GB RAM system
+
+The raw JSON files are streamed one recipe at a time and sampled with a
+reservoir, so memory is bounded by the sample size (not the corpus size), and
+the formatted recipes are written out incrementally as text shards
+(data/recipe_training/part-00000.txt, ...). --sample-size 0 keeps every recipe
+and never holds more than one in memory, for corpora larger than RAM.
+
+Formatting runs on a process pool (results are consumed in input order, so the
+output does not depend on --workers), and recipes that are near-duplicates of
+an earlier one (MinHash/LSH, app/utils/minhash.py) are dropped before
+sampling; the manifest records how many recipes and tokens that removed. The
+near-duplicate index keeps ~0.6 KB per unique recipe; --no-dedup keeps the
+footprint flat for corpora larger than RAM.
+
+Usage:
+    python prepare_recipe_data.py [--sample-size 20000] [--seed 42] [--shard-size 5000]
+                                  [--out-dir data/recipe_training] [--files a.json,b.json]
+                                  [--workers 0] [--dedup-threshold 0.8] [--no-dedup]
 """
 
-import json
+import argparse
+import os
 import random
-from pathlib import Path
-
-def load_recipes():
-    """Load all recipes from the 3 JSON files"""
-    recipe_files = [
-        'recipes_raw/recipes_raw_nosource_ar.json',
-        'recipes_raw/recipes_raw_nosource_epi.json',
-        'recipes_raw/recipes_raw_nosource_fn.json'
-    ]
-    
-    all_recipes = []
-    
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils import minhash
+from app.utils.corpus import CORPUS_DIR, ShardWriter, chunked
+from app.utils.json_stream import iter_object_items
+
+RECIPE_FILES = [
+    'recipes_raw/recipes_raw_nosource_ar.json',
+    'recipes_raw/recipes_raw_nosource_epi.json',
+    'recipes_raw/recipes_raw_nosource_fn.json'
+]
+
+MEASUREMENT_WORDS = frozenset({
+    'cup', 'cups', 'tablespoon', 'tablespoons', 'tbsp', 'teaspoon', 'teaspoons', 'tsp',
+    'ounce', 'ounces', 'oz', 'pound', 'pounds', 'lb', 'lbs', 'advertisement',
+    'gram', 'grams', 'g', 'kg', 'kilogram', 'ml', 'liter'
+})
+_HAS_DIGIT = re.compile(r'\d')
+# GPT-2's pre-tokenization split (contractions, words, numbers, punctuation runs, spaces)
+_GPT2_PRETOKEN = re.compile(r"'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?[^\s\w]+|\s+(?!\S)|\s+")
+
+def iter_recipes(recipe_files):
+    """Stream recipes from the JSON files ({"id": {...}, ...}) one at a time"""
     for file_path in recipe_files:
-        print(f"Loading {file_path}...")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            all_recipes.extend([
-                {
+        print(f"Streaming {file_path}...")
+        with open(file_path, 'rb') as f:
+            for _, recipe_data in iter_object_items(f):
+                if not isinstance(recipe_data, dict):
+                    continue
+                yield {
                     'title': recipe_data.get('title', ''),
                     'ingredients': recipe_data.get('ingredients', []),
                     'instructions': recipe_data.get('instructions', '')
                 }
-                for recipe_data in data.values()
-            ])
-    
-    print(f"Total recipes loaded: {len(all_recipes)}")
-    return all_recipes
+
+def reservoir_sample(items, k: int, rng: random.Random):
+    """
+    Uniform random sample of k items from a stream of unknown length in one
+    pass and O(k) memory (Algorithm R). Returns (sample, items seen).
+    """
+    reservoir = []
+    seen = 0
+    for item in items:
+        seen += 1
+        if len(reservoir) < k:
+            reservoir.append(item)
+        else:
+            j = rng.randrange(seen)
+            if j < k:
+                reservoir[j] = item
+    # The first k slots are filled in stream order; shuffle like random.sample would
+    rng.shuffle(reservoir)
+    return reservoir, seen
 
 def extract_simple_ingredients(ingredient_list):
     """
     Extract simple ingredient names from detailed ingredient strings
     Example: "2 cups all-purpose flour" -> "flour"
     """
-    simple_ingredients = []
+    simple_ingredients = {}
     
     for ingredient in ingredient_list:
-        # Remove common measurement words and numbers
-        ingredient = ingredient.lower()
-        # Split and take meaningful words
-        words = ingredient.split()
         # Filter out measurements, numbers, and common words
-        filtered = [w for w in words if not any(c.isdigit() for c in w) 
-                   and w not in ['cup', 'cups', 'tablespoon', 'tablespoons', 'tbsp', 
-                                'teaspoon', 'teaspoons', 'tsp', 'ounce', 'ounces', 
-                                'oz', 'pound', 'pounds', 'lb', 'lbs', 'advertisement',
-                                'gram', 'grams', 'g', 'kg', 'kilogram', 'ml', 'liter']]
+        filtered = [w for w in ingredient.lower().split()
+                    if w not in MEASUREMENT_WORDS and not _HAS_DIGIT.search(w)]
         
         if filtered:
             # Take the last 1-2 words as the ingredient name
-            simple_ingredients.append(' '.join(filtered[-2:] if len(filtered) > 1 else filtered))
+            simple_ingredients.setdefault(' '.join(filtered[-2:]), None)
     
-    return list(set(simple_ingredients))  # Remove duplicates
+    # Remove duplicates, keeping first-seen order (list(set()) varied with the hash seed)
+    return list(simple_ingredients)
 
 def format_recipe_for_training(recipe):
     """
@@ -85,56 +125,157 @@ def format_recipe_for_training(recipe):
     
     return f"{input_text}\n{output_text}\n<END>\n"
 
+def complete_recipes(recipes, counts):
+    """Recipes with a title, ingredients and instructions (tallied in counts)"""
+    for recipe in recipes:
+        if recipe['title'] and recipe['ingredients'] and recipe['instructions']:
+            counts['complete'] += 1
+            yield recipe
+        else:
+            counts['incomplete'] += 1
+
+def safe_format(recipe):
+    try:
+        return format_recipe_for_training(recipe)
+    except Exception as e:
+        print(f"  Skipping recipe due to error: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """GPT-2 pre-tokenizer pieces in text (a lower bound on its BPE token count)"""
+    return len(_GPT2_PRETOKEN.findall(text))
+
+def process_chunk(recipes, dedup: bool):
+    """Worker: (formatted text, MinHash signature, tokens) per recipe; text is None if it failed"""
+    out = []
+    for recipe in recipes:
+        text = safe_format(recipe)
+        if text is None:
+            out.append((None, None, 0))
+        else:
+            out.append((text, minhash.signature(text) if dedup else None, count_tokens(text)))
+    return out
+
+def process_parallel(recipes, workers: int, chunk_size: int, dedup: bool):
+    """
+    Format (and sign) recipes on a process pool, yielding results in input
+    order so the output is the same for any worker count. At most 2 chunks
+    per worker are in flight, so a huge input is never buffered whole.
+    """
+    if workers <= 1:
+        for chunk in chunked(recipes, chunk_size):
+            yield from process_chunk(chunk, dedup)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunked(recipes, chunk_size):
+            pending.append(pool.submit(process_chunk, chunk, dedup))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def drop_duplicates(processed, index, stats):
+    """Formatted texts minus near-duplicates of earlier ones (index=None keeps all); tallies stats"""
+    for text, sig, tokens in processed:
+        if text is None:
+            stats['format_errors'] += 1
+            continue
+        stats['recipes'] += 1
+        stats['tokens'] += tokens
+        if stats['recipes'] % 10000 == 0:
+            print(f"  Scanned {stats['recipes']} recipes ({stats['duplicates']} near-duplicates)...")
+        if index is not None and not index.add(sig):
+            stats['duplicates'] += 1
+            stats['removed_tokens'] += tokens
+            continue
+        yield text
+
 def main():
+    parser = argparse.ArgumentParser(description="Stream, sample and format recipes for GPT-2 training")
+    parser.add_argument('--files', default=','.join(RECIPE_FILES), help="Comma-separated recipe JSON files")
+    parser.add_argument('--sample-size', type=int, default=20000, help="Recipes to keep (0 = all of them)")
+    parser.add_argument('--seed', type=int, default=None, help="Sampling seed (default: random)")
+    parser.add_argument('--out-dir', default=CORPUS_DIR)
+    parser.add_argument('--shard-size', type=int, default=5000, help="Recipes per output shard")
+    parser.add_argument('--workers', type=int, default=0, help="Formatting processes (0 = all CPUs, 1 = no pool)")
+    parser.add_argument('--chunk-size', type=int, default=256, help="Recipes per worker task")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                        help="Drop recipes at least this similar (estimated Jaccard) to an earlier one")
+    parser.add_argument('--no-dedup', action='store_true', help="Keep near-duplicate recipes")
+    args = parser.parse_args()
+
     print("="*60)
     print("Recipe Data Preparation for ML Training")
     print("="*60)
-    
-    # Create data directory if it doesn't exist
-    Path('data').mkdir(exist_ok=True)
-    
-    # Load all recipes
-    all_recipes = load_recipes()
-    
-    # Sample 20,000 recipes (optimized for 16GB RAM)
-    sample_size = min(20000, len(all_recipes))
-    print(f"\nSampling {sample_size} recipes for training...")
-    sampled_recipes = random.sample(all_recipes, sample_size)
-    
-    # Format recipes for training
-    print("Formatting recipes...")
-    formatted_texts = []
-    
-    for i, recipe in enumerate(sampled_recipes):
-        try:
-            if recipe['title'] and recipe['ingredients'] and recipe['instructions']:
-                formatted_text = format_recipe_for_training(recipe)
-                formatted_texts.append(formatted_text)
-                
-                if (i + 1) % 1000 == 0:
-                    print(f"  Processed {i + 1}/{sample_size} recipes...")
-        except Exception as e:
-            print(f"  Skipping recipe due to error: {e}")
-            continue
-    
-    # Save to file
-    output_file = 'data/recipe_training.txt'
-    print(f"\nSaving {len(formatted_texts)} formatted recipes to {output_file}...")
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.writelines(formatted_texts)
-    
-    # Print sample
-    print("\n" + "="*60)
-    print("Sample formatted recipe:")
-    print("="*60)
-    print(formatted_texts[0])
-    
+
+    recipe_files = [f.strip() for f in args.files.split(',') if f.strip()]
+    workers = args.workers or os.cpu_count() or 1
+    dedup = not args.no_dedup
+    rng = random.Random(args.seed)
+    counts = {'complete': 0, 'incomplete': 0}
+    stats = {'recipes': 0, 'duplicates': 0, 'tokens': 0, 'removed_tokens': 0, 'format_errors': 0}
+
+    recipes = complete_recipes(iter_recipes(recipe_files), counts)
+    if not dedup and args.sample_size > 0:
+        # Nothing depends on the recipes left out, so only the sample is ever formatted
+        print(f"\nSampling {args.sample_size} recipes for training (reservoir)...")
+        recipes, _ = reservoir_sample(recipes, args.sample_size, rng)
+    index = minhash.NearDuplicateIndex(args.dedup_threshold) if dedup else None
+    print(f"Formatting on {workers} process(es)"
+          + (f", dropping near-duplicates (Jaccard >= {args.dedup_threshold})" if dedup else ""))
+    unique = drop_duplicates(process_parallel(recipes, workers, args.chunk_size, dedup), index, stats)
+
+    if dedup and args.sample_size > 0:
+        # A duplicate can only be recognised once every earlier recipe has been seen, so sample afterwards
+        print(f"\nSampling {args.sample_size} recipes for training (reservoir)...")
+        formatted, _ = reservoir_sample(unique, args.sample_size, rng)
+    else:
+        if args.sample_size <= 0:
+            print("\nKeeping every recipe...")
+        formatted = unique
+
+    print(f"Writing shards to {args.out_dir}/...")
+    first = None
+    with ShardWriter(args.out_dir, args.shard_size) as writer:
+        for text in formatted:
+            writer.write(text)
+            first = first or text
+            if writer.records % 5000 == 0:
+                print(f"  Written {writer.records} recipes...")
+        dedup_report = {
+            'enabled': dedup,
+            'threshold': args.dedup_threshold if dedup else None,
+            'recipes_scanned': stats['recipes'],
+            'near_duplicates_removed': stats['duplicates'],
+            'tokens_scanned': stats['tokens'],
+            'tokens_removed': stats['removed_tokens'],
+            'token_counting': 'gpt2 pre-tokenizer (lower bound on BPE tokens)',
+        }
+        manifest = writer.close(
+            sources=recipe_files, sample_size=args.sample_size, seed=args.seed,
+            complete_recipes=counts['complete'], incomplete_recipes=counts['incomplete'],
+            format_errors=stats['format_errors'], dedup=dedup_report
+        )
+
+    if first:
+        print("\n" + "="*60)
+        print("Sample formatted recipe:")
+        print("="*60)
+        print(first)
+
+    total_mb = sum(s['bytes'] for s in writer.shards) / (1024*1024)
     print("="*60)
     print(f"✅ Data preparation complete!")
-    print(f"   Total recipes formatted: {len(formatted_texts)}")
-    print(f"   Output file: {output_file}")
-    print(f"   File size: {Path(output_file).stat().st_size / (1024*1024):.2f} MB")
+    print(f"   Complete recipes scanned: {counts['complete']} ({counts['incomplete']} incomplete skipped)")
+    if dedup:
+        share = stats['removed_tokens'] / stats['tokens'] if stats['tokens'] else 0.0
+        print(f"   Near-duplicates removed: {stats['duplicates']} of {stats['recipes']} recipes")
+        print(f"   Tokens removed: {stats['removed_tokens']:,} of {stats['tokens']:,} ({share:.1%} less to train on)")
+    print(f"   Total recipes written: {writer.records}")
+    print(f"   Output: {len(writer.shards)} shard(s) in {args.out_dir} ({total_mb:.2f} MB)")
+    print(f"   Manifest: {manifest}")
     print("="*60)
 
 if __name__ == "__main__":
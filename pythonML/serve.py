@@ -0,0 +1,189 @@
+"""
+Pre-fork Server
+Loads every model once in a parent process, then forks N uvicorn workers that
+accept on one shared socket. The workers inherit the loaded GPT-2 weights,
+nutrition table and diet model copy-on-write, so N workers use about one
+physical copy instead of N (compare rss_mb and pss_mb in /stats).
+
+`uvicorn app.main:app --workers N` instead starts N fresh interpreters, each
+loading its own models.
+
+Each worker is pinned to its own slice of physical cores and gets that many
+torch threads (and a matching inference executor), so the workers together
+never oversubscribe the CPU; the recipe replica pool then splits the worker's
+slice further (RECIPE_REPLICAS).
+
+Usage:
+    python serve.py [--workers 0] [--threads 0] [--no-pin] [--host 0.0.0.0] [--port 5000]
+"""
+
+import argparse
+import gc
+import glob
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+from app.services.inference_executor import core_siblings, physical_cores
+
+def plan(workers: int, threads: int):
+    """(workers, torch threads per worker) for this machine"""
+    cores = physical_cores()
+    workers = workers or max(1, cores // 2)
+    threads = threads or max(1, cores // workers)
+    return workers, threads
+
+def worker_cpus(workers: int):
+    """Logical CPUs for each worker: whole physical cores, split as evenly as possible"""
+    cores = core_siblings()
+    if workers > len(cores):
+        return [None] * workers  # More workers than cores: leave scheduling to the OS
+    per, extra = divmod(len(cores), workers)
+    slices, start = [], 0
+    for i in range(workers):
+        size = per + (1 if i < extra else 0)
+        slices.append([cpu for siblings in cores[start:start + size] for cpu in siblings])
+        start += size
+    return slices
+
+def set_torch_threads(n: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(n)
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(index: int, sock: socket.socket, threads: int, cpus, log_level: str):
+    """Child process: serve the already-loaded app on the shared socket"""
+    import uvicorn
+    from app.main import app
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Only the main thread exists right after fork; every thread started later inherits this
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    set_torch_threads(threads)
+    where = f" on CPUs {cpus}" if cpus is not None else ""
+    print(f"👷 Worker {index} (pid {os.getpid()}) serving with {threads} torch thread(s){where}")
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, timeout_graceful_shutdown=10))
+    server.run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ML API from pre-forked workers sharing one copy of the models")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0 = half the physical cores)")
+    parser.add_argument('--threads', type=int, default=0, help="Torch threads per worker (0 = cores / workers)")
+    parser.add_argument('--no-pin', action='store_true', help="Don't pin workers to their own cores")
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+
+    workers, threads = plan(args.workers, args.threads)
+    cpus = [None] * workers if args.no_pin or not hasattr(os, 'sched_setaffinity') else worker_cpus(workers)
+
+    print("=" * 60)
+    print("NutriChef AI - Pre-fork Server")
+    print("=" * 60)
+    print(f"🖥️  {physical_cores()} physical cores -> {workers} workers x {threads} torch threads")
+
+    # Inherited by the workers; must be set before torch/BLAS are first imported
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ.setdefault(var, str(threads))
+    os.environ.setdefault('INFERENCE_WORKERS', str(max(2, threads)))
+
+    # Every worker keeps its counters in a file here and /metrics sums them all
+    # (see app/utils/metrics.py); a directory from an earlier run starts empty
+    own_metrics_dir = 'NUTRICHEF_METRICS_DIR' not in os.environ
+    if own_metrics_dir:
+        os.environ['NUTRICHEF_METRICS_DIR'] = tempfile.mkdtemp(prefix='nutrichef-metrics-')
+    else:
+        os.makedirs(os.environ['NUTRICHEF_METRICS_DIR'], exist_ok=True)
+        for stale in glob.glob(os.path.join(os.environ['NUTRICHEF_METRICS_DIR'], '*.db')):
+            os.remove(stale)
+    print(f"📈 Worker metrics merged from {os.environ['NUTRICHEF_METRICS_DIR']}")
+
+    # The parent only loads; keeping it single-threaded means no OpenMP pool
+    # exists at fork time (forking after one has run can deadlock the child)
+    from app import main as app_main
+    set_torch_threads(1)
+
+    start = time.perf_counter()
+    app_main.warmup.run()
+    print(f"📦 Models loaded in the parent in {time.perf_counter() - start:.1f}s")
+
+    # Move everything loaded so far out of the GC's reach: collections in the
+    # workers then don't touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(f"🌐 Listening on http://{args.host}:{args.port}")
+
+    children = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, sock, threads, cpus[index], args.log_level)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for i in range(workers):
+        spawn(i)
+
+    # Supervise: replace workers that die, until asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"⚠️  Worker {index} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(0.5)
+            spawn(index)
+
+    sock.close()
+    if own_metrics_dir:
+        shutil.rmtree(os.environ['NUTRICHEF_METRICS_DIR'], ignore_errors=True)
+    print("👋 All workers stopped")
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
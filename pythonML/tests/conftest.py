@@ -0,0 +1,49 @@
+"""
+Shared fixtures: a word-level tokenizer and a tiny random GPT-2, so model
+code runs without a trained checkpoint or network access
+"""
+import os
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Services open their artifacts relative to pythonML/, and the live profile log
+# must not land in data/ (config reads it at import)
+os.chdir(ROOT)
+os.environ.setdefault("DIET_PROFILE_LOG_PATH", os.path.join(tempfile.mkdtemp(prefix="nutrichef-tests-"), "profiles.jsonl"))
+
+WORDS = [
+    "INPUT:", "OUTPUT:", "TITLE:", "INGREDIENTS:", "INSTRUCTIONS:", "|", ";", ",",
+    "salt", "pepper", "chicken", "rice", "garlic", "onion", "eggs", "milk", "flour", "butter",
+    "mix", "bake", "fry", "stir", "serve", "with", "and", "the", "until", "golden",
+]
+
+
+@pytest.fixture(scope="session")
+def tiny_tokenizer():
+    pytest.importorskip("transformers")
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import WhitespaceSplit
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {w: i for i, w in enumerate(["<pad>", "<unk>", "<END>", *WORDS])}
+    tok = Tokenizer(WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = WhitespaceSplit()
+    return PreTrainedTokenizerFast(tokenizer_object=tok, unk_token="<unk>", pad_token="<pad>", eos_token="<END>")
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tiny_tokenizer):
+    torch = pytest.importorskip("torch")
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(
+        vocab_size=len(tiny_tokenizer), n_positions=64, n_embd=32, n_layer=2, n_head=2,
+        pad_token_id=tiny_tokenizer.pad_token_id, eos_token_id=tiny_tokenizer.eos_token_id,
+    ))
+    # float64, so padded and unpadded rows can't differ by rounding alone
+    return model.double().eval()
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.generation_batcher import JobFuture
+from app.services.inference_executor import InferenceExecutor
+
+PROFILE = {"weightKg": 70, "heightCm": 175, "age": 30, "gender": "male",
+           "activityLevel": "moderate", "healthGoals": "maintain"}
+
+
+@pytest.fixture(scope="module")
+def main():
+    pytest.importorskip("httpx")
+    from app import main
+    return main
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+
+    # Startup (model warm-up) is not needed; TestClient only runs it inside `with`
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def executor(main, monkeypatch):
+    executor = InferenceExecutor(workers=1, max_queue=0, max_streams=1,
+                                 timeouts={"strategy": 0.2, "recipe": 0.2}, default_timeout=5)
+    monkeypatch.setattr(main, "executor", executor)
+    yield executor
+    executor.shutdown()
+
+
+def test_full_queue_is_rejected_with_429(client, executor):
+    assert client.post("/predict/strategy", json=[PROFILE]).status_code == 200
+
+    release = executor.reserve("held")  # The only slot
+    r = client.post("/predict/strategy", json=[PROFILE])
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert client.post("/predict/recipe/stream", json={"ingredients": "salt"}).status_code == 429
+    assert executor.stats()['rejected'] == 2
+
+    release()
+    assert client.post("/predict/strategy", json=[PROFILE]).status_code == 200
+
+
+def test_streams_have_their_own_limit(client, executor, monkeypatch):
+    monkeypatch.setattr(executor, "max_queue", 4)
+    release = executor.reserve("held")  # The only stream slot, plenty of queue room left
+    assert client.post("/predict/recipe/stream", json={"ingredients": "salt"}).status_code == 429
+    assert client.post("/predict/strategy", json=[PROFILE]).status_code == 200
+    release()
+
+
+def test_slow_call_times_out_with_503(main, client, executor, monkeypatch):
+    def slow(profiles):
+        time.sleep(1.0)
+        return [("Balanced", 1.0)] * len(profiles)
+
+    monkeypatch.setattr(main.meal_service, "predict_strategies", slow)
+    r = client.post("/predict/strategy", json=[PROFILE])
+    assert r.status_code == 503
+    assert "Retry-After" in r.headers
+    assert executor.stats()['timeouts'] == 1
+
+    time.sleep(1.0)  # The call finishes in the background; it was already counted as a timeout
+    stats = executor.stats()
+    assert (stats['timeouts'], stats['completed'], stats['in_flight']) == (1, 0, 0)
+
+
+def test_recipe_counts_as_queued_until_the_batcher_starts_it():
+    executor = InferenceExecutor(workers=1, max_queue=4)
+    future = JobFuture()
+
+    async def job(started):
+        future.add_start_callback(lambda _: started())
+        return await asyncio.wrap_future(future)
+
+    async def scenario():
+        task = asyncio.ensure_future(executor.run_async("recipe", job))
+        await asyncio.sleep(0.05)
+        queued = executor.stats()
+        future.set_running_or_notify_cancel()
+        running = executor.stats()
+        future.set_result("recipe")
+        return await task, queued, running
+
+    result, queued, running = asyncio.run(scenario())
+    executor.shutdown()
+    assert result == "recipe"
+    assert (queued['queue_depth'], queued['running']) == (1, 0)
+    assert (running['queue_depth'], running['running']) == (0, 1)
+    assert running['wait_ms_max'] >= 50
+    assert executor.stats()['running'] == 0 and executor.stats()['in_flight'] == 0
+
+
+def test_timed_out_recipe_cancels_its_queued_generation(main, client, executor, monkeypatch):
+    queued = []
+
+    def submit_many(requests):
+        futures = {i: JobFuture() for i in range(len(requests))}  # Never picked up by a batcher
+        queued.extend(futures.values())
+        return [None] * len(requests), futures
+
+    monkeypatch.setattr(main.recipe_service, "submit_many", submit_many)
+    for _ in range(3):
+        assert client.post("/predict/recipe", json={"ingredients": "salt"}).status_code == 503
+    assert len(queued) == 3 and all(f.cancelled() for f in queued)
+    assert executor.stats()['in_flight'] == 0
+
+
+def test_profile_inserts_need_the_admin_token(main, client, executor, monkeypatch):
+    item = [{"profile": PROFILE, "dietRecommendation": "Balanced"}]
+    monkeypatch.setattr(main.config, "ADMIN_TOKEN", "")
+    assert client.post("/strategy/profiles", json=item).status_code == 404
+
+    monkeypatch.setattr(main.config, "ADMIN_TOKEN", "secret")
+    assert client.post("/strategy/profiles", json=item).status_code == 403
+    assert client.post("/strategy/profiles", json=item, headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_unknown_strategy_label_is_rejected_with_422(main, client, executor, monkeypatch):
+    if main.meal_service.strategy_predictor is None:
+        pytest.skip("diet strategy model not available")
+    monkeypatch.setattr(main.config, "ADMIN_TOKEN", "secret")
+    r = client.post("/strategy/profiles", json=[{"profile": PROFILE, "dietRecommendation": "Low_Crab"}],
+                    headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 422
+    assert "Low_Crab" in r.json()["detail"]
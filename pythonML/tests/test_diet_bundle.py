@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.diet_bundle import DietBundle, write_bundle
+
+
+def test_write_bundle_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(50, 4))
+    labels = rng.choice(["Low_Sodium", "Balanced", "Low_Carb"], size=50)
+    path = str(tmp_path / "bundle")
+
+    manifest = write_bundle(path, ['Age', 'Weight_kg', 'Height_cm', 'BMI'], x, labels, n_neighbors=3)
+    bundle = DietBundle.load(path)
+
+    assert bundle.version == manifest['version']
+    assert bundle.labels == sorted(set(labels))
+    assert bundle.n_neighbors == 3
+    np.testing.assert_array_equal(bundle.x, x)
+    assert [bundle.labels[c] for c in bundle.label_codes] == labels.tolist()
+    np.testing.assert_allclose(bundle.mean, x.mean(axis=0))
+
+    # Same content, same version; rewriting swaps the directory in place
+    assert write_bundle(path, bundle.features, x, labels, n_neighbors=3)['version'] == bundle.version
+    assert write_bundle(path, bundle.features, x, labels, n_neighbors=5)['version'] != bundle.version
+    assert sorted(os.listdir(tmp_path)) == ["bundle"]
+
+
+def test_bundle_checksum_is_verified(tmp_path):
+    path = str(tmp_path / "bundle")
+    write_bundle(path, ['Age'], np.arange(10.0).reshape(10, 1), ["a"] * 10)
+    np.save(os.path.join(path, "features.npy"), np.ones((10, 1)))
+    DietBundle.load(path, verify=False)
+    with pytest.raises(ValueError, match="Checksum"):
+        DietBundle.load(path)
+
+
+def test_corrupt_bundle_is_not_served(tmp_path, monkeypatch):
+    from app.services.strategy_predictor import load_strategy_predictor
+    from app.utils import config
+
+    path = str(tmp_path / "bundle")
+    write_bundle(path, ['Age'], np.arange(10.0).reshape(10, 1), ["a"] * 10)
+    monkeypatch.setattr(config, "DIET_BUNDLE_PATH", path)
+    monkeypatch.setattr(config, "DIET_NEIGHBOR_SEARCH", "exact")
+    assert load_strategy_predictor() is not None
+
+    np.save(os.path.join(path, "features.npy"), np.ones((10, 1)))
+    assert load_strategy_predictor() is None
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from app.services.fooddata_cache import build_cache, load_cache, read_manifest, stale_reason
+from app.services.ingredient_index import IngredientIndex
+from app.services.nutrient_table import NUTRIENT_COLUMNS
+
+
+def fdc_food(description: str, kcal: float, protein: float, fat: float, carbs: float):
+    ids = (1008, 1003, 1004, 1005)
+    return {'description': description,
+            'foodNutrients': [{'nutrient': {'id': i}, 'amount': v} for i, v in zip(ids, (kcal, protein, fat, carbs))]}
+
+
+@pytest.fixture
+def fdc_source(tmp_path):
+    foods = [
+        fdc_food("Chicken breast", 165, 31, 3.6, 0),
+        fdc_food("Cheese, cheddar", 403, 24.9, 33.1, 1.3),
+        fdc_food("Rice", 130, 2.7, 0.3, 28.2),
+        fdc_food("Crème fraîche", 393, 2.4, 42, 2.8),
+    ]
+    path = tmp_path / "fdc.json"
+    path.write_text(json.dumps({'FoundationFoods': foods}), encoding='utf-8')
+    return str(path)
+
+
+def test_fooddata_compile_round_trip(tmp_path, fdc_source):
+    defaults = {'rice': {'calories': 1, 'protein': 1, 'fat': 1, 'carbs': 1},
+                'tofu': {'calories': 76, 'protein': 8, 'fat': 4.8, 'carbs': 1.9}}
+    cache_dir = str(tmp_path / "cache")
+    build_cache(fdc_source, cache_dir, defaults)
+    table = load_cache(cache_dir, verify=True)
+
+    # Defaults first, an FDC food with the same name overwrites its default in place
+    assert list(table.names) == ['rice', 'tofu', 'chicken breast', 'cheese, cheddar', 'crème fraîche']
+    assert table.row_dict(0) == dict(zip(NUTRIENT_COLUMNS, (130.0, 2.7, 0.3, 28.2)))
+    assert table.row_dict(4)['fat'] == 42.0
+
+    # The mapped index answers exactly like one built from the names
+    mapped = IngredientIndex(table.names, table.index_arrays)
+    rebuilt = IngredientIndex(list(table.names))
+    for query in ["grilled chicken breast strips", "cheddar", "rice", "tofu", "crème fraîche", "quinoa"]:
+        assert mapped.match(query) == rebuilt.match(query)
+    assert table.names[mapped.match("cheddar")] == 'cheese, cheddar'
+
+    manifest = read_manifest(cache_dir)
+    assert stale_reason(manifest, fdc_source, defaults) is None
+    assert stale_reason(manifest, fdc_source, {}) == "default ingredients changed"
+    with open(fdc_source, 'a', encoding='utf-8') as f:
+        f.write("\n")
+    assert stale_reason(manifest, fdc_source, defaults) == "source JSON changed"
+    assert sorted(os.listdir(tmp_path)) == ["cache", "fdc.json"]
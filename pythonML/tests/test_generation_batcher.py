@@ -0,0 +1,77 @@
+from app.services.generation_batcher import GenerationBatcher
+from app.utils import config
+
+PROMPTS = ["INPUT: salt", "INPUT: chicken rice garlic onion", "INPUT: eggs milk , flour"]
+
+
+class GreedyBatcher(GenerationBatcher):
+    # Sampling draws differ between batch shapes; greedy decoding must not
+    def _generate_kwargs(self):
+        return dict(super()._generate_kwargs(), do_sample=False, temperature=None, top_p=None)
+
+
+def test_left_padded_batch_matches_single_prompts(tiny_tokenizer, tiny_model, monkeypatch):
+    monkeypatch.setattr(config, "RECIPE_MAX_LENGTH", 24)
+    batcher = GreedyBatcher(tiny_tokenizer, tiny_model, max_batch_size=8, max_wait_ms=500)
+
+    singles = [batcher.generate(p) for p in PROMPTS]
+    assert batcher.stats()['batches'] == len(PROMPTS)
+
+    batched = [f.result(timeout=60) for f in batcher.submit_many(PROMPTS)]
+    assert batcher.stats()['batches'] == len(PROMPTS) + 1
+    assert batched == singles
+    assert any(len(text) > len(prompt) for text, prompt in zip(singles, PROMPTS))
+
+
+def test_seeded_decode_is_reproducible_and_reseeds_global_rng(tiny_tokenizer, tiny_model, monkeypatch):
+    monkeypatch.setattr(config, "RECIPE_MAX_LENGTH", 24)
+    batcher = GenerationBatcher(tiny_tokenizer, tiny_model, max_batch_size=8, max_wait_ms=0)
+
+    seeded = batcher.generate(PROMPTS[1], seed=7)
+    after_first = batcher.generate(PROMPTS[1])
+    assert batcher.generate(PROMPTS[1], seed=7) == seeded
+    after_second = batcher.generate(PROMPTS[1])
+
+    # Left seeded, the global RNG would be in the same state after both seeded
+    # decodes, and the unseeded decode following each would replay the other
+    assert after_first != after_second
+    assert seeded not in (after_first, after_second)
+
+
+def test_cancelled_prompt_is_skipped(tiny_tokenizer, tiny_model):
+    import threading
+
+    release = threading.Event()
+    batcher = GenerationBatcher(tiny_tokenizer, tiny_model, max_batch_size=1, max_wait_ms=0)
+    decoded = []
+
+    def run_batch(prompts):
+        release.wait(10)
+        decoded.extend(prompts)
+        return [p + " done" for p in prompts]
+
+    batcher._run_batch = run_batch
+    first = batcher.submit("a")
+    abandoned, kept = batcher.submit("b"), batcher.submit("c")
+    assert abandoned.cancel()
+    release.set()
+
+    assert first.result(timeout=10) == "a done"
+    assert kept.result(timeout=10) == "c done"
+    assert decoded == ["a", "c"]
+    assert batcher.stats()['cancelled'] == 1
+    assert batcher.load == 0
+    assert not first.cancel()  # Claimed prompts run to completion
+
+
+def test_streamed_tokens_are_counted(tiny_tokenizer, tiny_model, monkeypatch):
+    from app.utils.metrics import GENERATED_TOKENS
+
+    monkeypatch.setattr(config, "RECIPE_MAX_LENGTH", 24)
+    batcher = GreedyBatcher(tiny_tokenizer, tiny_model, max_batch_size=8, max_wait_ms=0)
+
+    before = GENERATED_TOKENS.value()
+    streamed = "".join(batcher.stream(PROMPTS[0]))
+    counted = GENERATED_TOKENS.value() - before
+    # Every streamed token, plus the end token the streamer does not echo
+    assert 0 < len(tiny_tokenizer(streamed)['input_ids']) <= counted
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+from app.utils import minhash
+
+RECIPE = ("INPUT: chicken, rice, garlic\nOUTPUT: TITLE: Garlic chicken rice | INGREDIENTS: 2 cups rice ; "
+          "1 chicken breast ; 3 cloves garlic | INSTRUCTIONS: Fry the garlic, add the chicken and stir until "
+          "golden, then mix with the rice and serve.\n<END>\n")
+
+
+def test_near_duplicates_are_dropped_and_first_occurrence_wins():
+    near = RECIPE.replace("serve.", "serve hot.")
+    other = RECIPE.replace("chicken", "tofu").replace("garlic", "ginger").replace("rice", "noodles")
+    index = minhash.NearDuplicateIndex(threshold=0.8)
+
+    kept = [text for text in (RECIPE, near, other, RECIPE) if index.add(minhash.signature(text))]
+    assert kept == [RECIPE, other]
+    assert minhash.similarity(minhash.signature(RECIPE), minhash.signature(near)) >= 0.8
+    assert minhash.similarity(minhash.signature(RECIPE), minhash.signature(other)) < 0.5
+
+
+def test_signatures_do_not_depend_on_the_process():
+    # Workers compute signatures the parent compares, so they must not depend on hash() salting
+    code = "import sys; from app.utils import minhash; sys.stdout.write(minhash.signature(sys.argv[1]).tobytes().hex())"
+    outputs = {
+        subprocess.run([sys.executable, "-c", code, RECIPE], capture_output=True, text=True, check=True,
+                       env={"PYTHONHASHSEED": seed, "PYTHONPATH": "."}).stdout
+        for seed in ("1", "2")
+    }
+    assert outputs == {minhash.signature(RECIPE).tobytes().hex()}
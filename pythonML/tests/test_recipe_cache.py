@@ -0,0 +1,75 @@
+import pytest
+
+from app.models import RecipeRequest, RecipeResponse
+from app.services import recipe_cache
+from app.services.recipe_cache import RecipeCache, cache_key
+
+
+def response(title: str) -> RecipeResponse:
+    return RecipeResponse(title=title, ingredients=[], instructions="", cuisineType="any", calories=0, imageUrl="")
+
+
+def key(ingredients: str, seed=None):
+    return cache_key(RecipeRequest(ingredients=ingredients, seed=seed))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(recipe_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_key_ignores_order_case_and_whitespace():
+    assert key("chicken, rice") == key(" Rice ,CHICKEN,, ")
+    assert key("chicken, rice") != key("chicken, rice", seed=1)
+
+
+def test_variant_pool_fills_then_rotates():
+    cache = RecipeCache(max_entries=4, ttl_seconds=60, variants_per_key=2)
+    k = key("chicken, rice")
+    assert cache.get(k) is None
+    cache.put(k, response("a"))
+    assert cache.get(k) is None  # Pool not full yet: draw another sample
+    cache.put(k, response("b"))
+    cache.put(k, response("c"))  # Pool full, dropped
+    assert [cache.get(k).title for _ in range(4)] == ["a", "b", "a", "b"]
+
+
+def test_seeded_key_keeps_one_variant():
+    cache = RecipeCache(max_entries=4, ttl_seconds=60, variants_per_key=3)
+    k = key("chicken, rice", seed=5)
+    cache.put(k, response("seeded"))
+    assert cache.get(k).title == "seeded"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = RecipeCache(max_entries=4, ttl_seconds=10, variants_per_key=1)
+    k = key("eggs")
+    cache.put(k, response("eggs"))
+    clock[0] += 9.9
+    assert cache.get(k).title == "eggs"
+    clock[0] += 0.2
+    assert cache.get(k) is None
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RecipeCache(max_entries=2, ttl_seconds=60, variants_per_key=1)
+    a, b, c = key("a"), key("b"), key("c")
+    cache.put(a, response("a"))
+    cache.put(b, response("b"))
+    assert cache.get(a).title == "a"  # a is now the most recently used
+    cache.put(c, response("c"))
+    assert cache.get(b) is None
+    assert cache.get(a).title == "a"
+    assert cache.get(c).title == "c"
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = RecipeCache(max_entries=0, ttl_seconds=60, variants_per_key=1)
+    cache.put(key("a"), response("a"))
+    assert cache.get(key("a")) is None
+    assert cache.stats()['entries'] == 0
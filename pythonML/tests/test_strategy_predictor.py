@@ -0,0 +1,147 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from app.services.strategy_predictor import (
+    DIET_DATA_PATH, DIET_MODEL_PATH, LABEL_COLUMN, StrategyPredictor, profile_features,
+)
+from app.models import UserProfile
+
+PROFILES = 2000
+
+
+def random_profiles(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        UserProfile(weightKg=float(w), heightCm=float(h), age=int(a), gender="male",
+                    activityLevel="moderate", healthGoals="maintain")
+        for w, h, a in zip(rng.uniform(40, 140, n), rng.uniform(145, 205, n), rng.integers(18, 90, n))
+    ]
+
+
+@pytest.fixture(scope="module")
+def legacy_model():
+    pytest.importorskip("sklearn")
+    pd = pytest.importorskip("pandas")
+    if not (os.path.exists(DIET_MODEL_PATH) and os.path.exists(DIET_DATA_PATH)):
+        pytest.skip("diet model pickle or dataset not present")
+    with open(DIET_MODEL_PATH, 'rb') as f:
+        model = pickle.load(f)
+    return model, pd.read_csv(DIET_DATA_PATH)
+
+
+def sklearn_predictions(model, data, profiles):
+    """What the original service did: sklearn kneighbors, then the mode of the neighbours' labels"""
+    import pandas as pd
+
+    clf = model['model'] if isinstance(model, dict) else model
+    features = model['features'] if isinstance(model, dict) else ['Age', 'Weight_kg', 'Height_cm', 'BMI']
+    x = pd.DataFrame([[profile_features(p)[f] for f in features] for p in profiles], columns=features)
+    _, idxs = clf.kneighbors(x)
+    return [data.iloc[row][LABEL_COLUMN].mode()[0] for row in idxs]
+
+
+def load_predictor(source: str, model, data) -> StrategyPredictor:
+    if source == "knn":
+        return StrategyPredictor.from_knn(model, data)
+    from app.services.diet_bundle import DietBundle
+    from app.utils import config
+
+    if not os.path.exists(config.DIET_BUNDLE_PATH):
+        pytest.skip("diet bundle not present")
+    return StrategyPredictor.from_bundle(DietBundle.load(config.DIET_BUNDLE_PATH))
+
+
+@pytest.mark.parametrize("source", ["knn", "bundle"])
+def test_vectorized_knn_matches_sklearn_pickle(legacy_model, source):
+    model, data = legacy_model
+    profiles = random_profiles(PROFILES)
+    predictor = load_predictor(source, model, data)
+
+    expected = sklearn_predictions(model, data, profiles)
+    got = [strategy for strategy, _ in predictor.predict_many(profiles)]
+    mismatches = sum(a != b for a, b in zip(expected, got))
+    assert mismatches == 0
+
+
+def test_unknown_label_is_rejected_unless_allowed(legacy_model):
+    model, data = legacy_model
+    predictor = StrategyPredictor.from_knn(model, data)
+    profile = random_profiles(1)
+
+    with pytest.raises(ValueError, match="Low_Crab"):
+        predictor.add_profiles(profile, ["Low_Crab"])
+    assert predictor.pending == 0
+
+    assert predictor.add_profiles(profile, ["Keto"], allow_new_labels=True) == 1
+    assert "Keto" in predictor.labels
+
+
+def write_artifact(kind: str, path: str):
+    """A small synthetic bundle (or labelled IVF index) at path; returns its loader"""
+    from app.services.diet_bundle import DietBundle, write_bundle
+    from app.services.profile_index import IVFIndex
+
+    features = ['Age', 'Weight_kg', 'Height_cm', 'BMI']
+    profiles = random_profiles(300, seed=1)
+    x = np.array([[profile_features(p)[f] for f in features] for p in profiles])
+    labels = np.array(['Balanced', 'Low_Carb', 'Low_Sodium'])[np.arange(len(x)) % 3]
+    if kind == "bundle":
+        write_bundle(path, features, x, labels)
+        return lambda log: StrategyPredictor.from_bundle(DietBundle.load(path), log=log)
+
+    names, codes = np.unique(labels, return_inverse=True)
+    IVFIndex.build(x, label_codes=codes, meta={'features': features, 'labels': names.tolist(),
+                                                'n_neighbors': 5}).save(path)
+    return lambda log: StrategyPredictor.from_index(IVFIndex.load(path), log=log)
+
+
+@pytest.mark.parametrize("kind", ["bundle", "ivf"])
+def test_compaction_is_written_once_and_picked_up_by_every_worker(tmp_path, kind):
+    from app.services.append_log import AppendLog
+
+    log_path = str(tmp_path / "profiles.jsonl")
+    load = write_artifact(kind, str(tmp_path / kind))
+    first, second = load(AppendLog(log_path)), load(AppendLog(log_path))
+    base = len(first)
+
+    first.add_profiles(random_profiles(5, seed=2), ["Low_Carb"] * 5)
+    assert second.sync() == 5
+    assert first.compact() == 5
+    assert (len(first), first.pending) == (base + 5, 0)
+    with open(log_path) as f:
+        assert len(f.readlines()) == 1  # Only the new log's header is left
+
+    # The other worker maps the new artifact instead of folding its own copy
+    assert second.compact() == 0
+    second.sync()
+    assert (len(second), second.pending, second.reloads) == (base + 5, 0, 1)
+
+    # Records appended after the rotation are replayed once, on top of the new base
+    second.add_profiles(random_profiles(2, seed=3), ["Low_Sodium"] * 2)
+    restarted = load(AppendLog(log_path))
+    assert (len(restarted), restarted.pending) == (base + 7, 2)
+    queries = random_profiles(50, seed=4)
+    assert restarted.predict_many(queries) == first.predict_many(queries)
+
+
+def test_compaction_that_dies_before_rotating_is_not_replayed_twice(tmp_path, monkeypatch):
+    from app.services.append_log import AppendLog
+
+    log_path = str(tmp_path / "profiles.jsonl")
+    load = write_artifact("bundle", str(tmp_path / "bundle"))
+    predictor = load(AppendLog(log_path))
+    base = len(predictor)
+    predictor.add_profiles(random_profiles(4, seed=2), ["Low_Carb"] * 4)
+
+    def crash(self, start, log_id):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(AppendLog, "rotate", crash)
+    with pytest.raises(OSError):
+        predictor.compact()
+
+    restarted = load(AppendLog(log_path))
+    assert (len(restarted), restarted.pending) == (base + 4, 0)
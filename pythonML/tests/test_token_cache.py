@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from app.utils.corpus import corpus_files, iter_records
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    words = ["salt", "pepper", "chicken", "rice", "garlic", "onion", "eggs", "milk", "flour", "butter"]
+    rng = np.random.default_rng(0)
+    shards = tmp_path / "corpus"
+    shards.mkdir()
+    for s in range(2):
+        records = []
+        for _ in range(60):
+            picked = rng.choice(words, size=rng.integers(2, 8))
+            records.append(f"INPUT: {' , '.join(picked[:3])}\nOUTPUT: TITLE: {' '.join(picked)} | "
+                           f"INSTRUCTIONS: mix and bake\n<END>\n")
+        (shards / f"part-{s:05d}.txt").write_text(''.join(records), encoding='utf-8')
+    return corpus_files(str(shards))
+
+
+def test_token_cache_is_the_same_for_any_worker_count(tmp_path, corpus, tiny_tokenizer):
+    from app.utils.token_cache import TokenBlockDataset, build_token_cache
+
+    serial = build_token_cache(corpus, tiny_tokenizer, str(tmp_path / "serial"), workers=1, chunk_records=7)
+    parallel = build_token_cache(corpus, tiny_tokenizer, str(tmp_path / "parallel"), workers=2, chunk_records=7)
+    assert serial.name == parallel.name
+    assert (serial / "tokens.bin").read_bytes() == (parallel / "tokens.bin").read_bytes()
+    np.testing.assert_array_equal(np.load(serial / "offsets.npy"), np.load(parallel / "offsets.npy"))
+
+    dataset = TokenBlockDataset(str(serial), block_size=16)
+    records = list(iter_records(corpus))
+    assert dataset.records == len(records) == 120
+    for i in (0, 59, 119):
+        expected = tiny_tokenizer(records[i], add_special_tokens=False)['input_ids']
+        assert dataset.record(i).tolist() == expected
+    assert len(dataset) == dataset.n_tokens // 16
+
+    # An unchanged corpus is a cache hit; any change to it is a new cache
+    assert build_token_cache(corpus, tiny_tokenizer, str(tmp_path / "serial"), workers=1) == serial
+    with open(corpus[0], 'a', encoding='utf-8') as f:
+        f.write("INPUT: salt\nOUTPUT: TITLE: salt\n<END>\n")
+    assert build_token_cache(corpus, tiny_tokenizer, str(tmp_path / "serial"), workers=1) != serial
@@ -0,0 +1,53 @@
+"""
+Recipe Corpus Tokenizer
+Tokenizes the prepared training corpus once into the memory-mapped token cache
+(data/token_cache/<hash>/) the training scripts load. Running it ahead of
+training is optional - they build the cache themselves on first use - but it
+lets the tokenization run on a machine with more cores.
+
+Usage:
+    python tokenize_recipe_data.py [--data data/recipe_training] [--tokenizer distilgpt2]
+                                   [--workers 0] [--block-size 128]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from app.utils.corpus import corpus_files
+from app.utils.token_cache import TOKEN_CACHE_DIR, TokenBlockDataset, build_token_cache
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-tokenize the recipe corpus into the token cache")
+    parser.add_argument('--data', default='', help="Corpus shard directory or file (default: data/recipe_training)")
+    parser.add_argument('--tokenizer', default='distilgpt2', help="Tokenizer name or path (must match training)")
+    parser.add_argument('--workers', type=int, default=0, help="Tokenizer processes (0 = all CPUs)")
+    parser.add_argument('--cache-dir', default=TOKEN_CACHE_DIR)
+    parser.add_argument('--block-size', type=int, default=128, help="Only used to report the number of examples")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Recipe Corpus Tokenizer")
+    print("=" * 60)
+
+    files = corpus_files(args.data or None)
+    if not files:
+        print(f"❌ No corpus found at {args.data or 'data/recipe_training'}; run prepare_recipe_data.py first")
+        return
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    cache_dir = build_token_cache(files, tokenizer, args.cache_dir, workers=args.workers)
+
+    start = time.perf_counter()
+    dataset = TokenBlockDataset(cache_dir, args.block_size)
+    if len(dataset):
+        dataset[0]  # Maps the token file
+    print(f"\n📁 Cache: {cache_dir}")
+    print(f"   Recipes: {dataset.records:,}   Tokens: {dataset.n_tokens:,} ({np.dtype(dataset.meta['dtype']).name})")
+    print(f"   Training examples of {args.block_size} tokens: {len(dataset):,}")
+    print(f"   Opened in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
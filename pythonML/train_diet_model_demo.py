@@ -2,10 +2,13 @@ import pandas as pd
 from sklearn.neighbors import NearestNeighbors
 import pickle
 import os
+from app.services.diet_bundle import write_bundle
+from app.services.strategy_predictor import LABEL_COLUMN
 
 # 1. Config
 DATA_PATH = "data/diet_recommendations/diet_recommendations_dataset.csv"
 MODEL_PATH = "app/models/diet_model.pkl"
+BUNDLE_PATH = "app/models/diet_bundle"
 
 def train_and_save():
     print("--- Starting Diet Recommender Training ---")
@@ -68,6 +71,17 @@ def train_and_save():
 
             
         print(f"Model saved to {MODEL_PATH}")
+        
+        # 6. Save the runtime bundle (what the API actually loads: no pickle, no pandas)
+        if LABEL_COLUMN in df.columns:
+            manifest = write_bundle(
+                BUNDLE_PATH, final_features, df[final_features].fillna(0).to_numpy(),
+                df[LABEL_COLUMN].to_numpy(), n_neighbors=model.n_neighbors,
+                source={'dataset': DATA_PATH, 'rows': len(df)}
+            )
+            print(f"Bundle v{manifest['version']} saved to {BUNDLE_PATH} ({manifest['count']} patients, {len(manifest['labels'])} strategies)")
+        else:
+            print(f"Warning: '{LABEL_COLUMN}' column missing, no runtime bundle written")
         print("You can now load this in 'ml_service.py' to recommend similar foods!")
         
     except Exception as e:
@@ -10,13 +10,15 @@ from transformers import (
     GPT2LMHeadModel,
     GPT2Tokenizer,
     GPT2Config,
-    TextDataset,
     DataCollatorForLanguageModeling,
     Trainer,
     TrainingArguments
 )
 import torch
 
+from app.utils.corpus import CORPUS_DIR, corpus_files
+from app.utils.token_cache import load_token_dataset
+
 def main():
     print("="*70)
     print("Recipe Model Training (GPU-Optimized for RTX 3050)")
@@ -33,17 +35,18 @@ def main():
         print(f"\n✅ GPU Detected: {torch.cuda.get_device_name(0)}")
         print(f"   VRAM: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
     
-    # Check if data file exists
-    data_file = 'data/recipe_training.txt'
-    if not Path(data_file).exists():
-        print(f"\n❌ Error: {data_file} not found!")
+    # Check if the training corpus exists (shards from prepare_recipe_data.py, or the legacy single file)
+    data_files = corpus_files()
+    if not data_files:
+        print(f"\n❌ Error: {CORPUS_DIR} not found!")
         print("Please run prepare_recipe_data.py first")
         return
+    data_mb = sum(f.stat().st_size for f in data_files) / (1024*1024)
     
     print(f"\n📊 Training Configuration:")
     print(f"   Model: DistilGPT2 (82M parameters)")
-    print(f"   Data file: {data_file}")
-    print(f"   File size: {Path(data_file).stat().st_size / (1024*1024):.2f} MB")
+    print(f"   Data: {data_files[0].parent if len(data_files) > 1 else data_files[0]} ({len(data_files)} file(s))")
+    print(f"   Data size: {data_mb:.2f} MB")
     print(f"   Device: {'GPU (CUDA)' if torch.cuda.is_available() else 'CPU'}")
     print(f"   Batch size: 8 (GPU-optimized)")
     print(f"   Estimated time: 2-3 hours with RTX 3050")
@@ -67,9 +70,10 @@ def main():
     
     # Prepare dataset
     print("\n📚 Preparing training dataset...")
-    train_dataset = TextDataset(
-        tokenizer=tokenizer,
-        file_path=data_file,
+    # Tokenized once per corpus + tokenizer, then memory-mapped (app/utils/token_cache.py)
+    train_dataset = load_token_dataset(
+        tokenizer,
+        data_files,
         block_size=128
     )
     
@@ -0,0 +1,150 @@
+"""
+Recipe Replica Tuner
+Measures recipe generation throughput and latency for different replica
+counts (K) and torch threads per replica on this machine, using the real
+model and the same ReplicaPool the service runs, then prints the settings to
+use (RECIPE_REPLICAS / RECIPE_REPLICA_THREADS).
+
+Every configuration gets the same closed-loop load: --concurrency clients
+each sending prompts back to back until --requests have been answered.
+
+Usage:
+    python tune_replicas.py [--replicas 1,2,4] [--threads 0] [--concurrency 0] [--requests 48]
+                            [--max-length 128] [--reserved-cores 0] [--out replica_report.json]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from pathlib import Path
+
+from app.services.inference_backends import load_backend
+from app.services.inference_executor import core_siblings
+from app.services.replica_pool import ReplicaPool
+from app.utils import config
+
+TEST_INGREDIENTS = [
+    "tomato, onions, chicken",
+    "pasta, garlic, olive oil, basil",
+    "eggs, milk, flour, sugar",
+    "rice, soy sauce, vegetables",
+    "potato, cheese, bacon"
+]
+
+def candidates(cores: int, replicas_arg: str, threads_arg: str):
+    """(K, threads per replica) pairs that fit on the usable cores"""
+    if replicas_arg:
+        ks = sorted({int(k) for k in replicas_arg.split(',') if k.strip()})
+    else:
+        ks = sorted({k for k in [1, 2, 4, 8, 16, 32, 64, cores] if k <= cores})
+    pairs = []
+    for k in ks:
+        share = max(1, cores // k)
+        if threads_arg:
+            options = [int(t) for t in threads_arg.split(',') if t.strip()]
+        else:
+            # The full share, and half of it (leaves room for the server's threads)
+            options = [share, max(1, share // 2)]
+        for t in sorted(set(options), reverse=True):
+            if t * k <= cores or k == 1:
+                pairs.append((k, t))
+    return pairs
+
+def run_load(pool: ReplicaPool, tokenizer, concurrency: int, requests: int):
+    """Closed-loop load; returns (wall seconds, latencies, generated tokens)"""
+    latencies, tokens = [], []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def client(offset: int):
+        i = offset
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            prompt = f"INPUT: {TEST_INGREDIENTS[i % len(TEST_INGREDIENTS)]}\nOUTPUT:"
+            i += 1
+            start = time.perf_counter()
+            text = pool.generate(prompt)
+            elapsed = time.perf_counter() - start
+            generated = len(tokenizer.encode(text)) - len(tokenizer.encode(prompt))
+            with lock:
+                latencies.append(elapsed)
+                tokens.append(max(0, generated))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, tokens
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best recipe replica count and thread split")
+    parser.add_argument('--replicas', default='', help="Comma-separated K values (default: powers of two up to the cores)")
+    parser.add_argument('--threads', default='', help="Comma-separated torch threads per replica (default: share and half share)")
+    parser.add_argument('--concurrency', type=int, default=0, help="Concurrent clients (0 = 2 x cores)")
+    parser.add_argument('--requests', type=int, default=48, help="Requests per configuration")
+    parser.add_argument('--max-length', type=int, default=128, help="Token budget per generation")
+    parser.add_argument('--reserved-cores', type=int, default=config.RECIPE_RESERVED_CORES)
+    parser.add_argument('--no-pin', action='store_true')
+    parser.add_argument('--out', default='replica_report.json')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("NutriChef AI - Recipe Replica Tuner")
+    print("=" * 60)
+
+    cores = max(1, len(core_siblings()) - args.reserved_cores)
+    concurrency = args.concurrency or 2 * cores
+    config.RECIPE_MAX_LENGTH = args.max_length
+    print(f"🖥️  {cores} usable physical cores, {concurrency} clients, {args.requests} requests per run")
+
+    print(f"Loading {config.RECIPE_MODEL_PATH} (backend: {config.RECIPE_BACKEND})...")
+    tokenizer, model = load_backend(config.RECIPE_BACKEND, config.RECIPE_MODEL_PATH)
+
+    report = []
+    for replicas, threads in candidates(cores, args.replicas, args.threads):
+        pool = ReplicaPool(tokenizer, model, replicas=replicas, threads=threads,
+                           pin=not args.no_pin, reserved_cores=args.reserved_cores)
+        # Warm every replica (thread start, pinning, OpenMP team) outside the timing
+        for replica in pool.replicas:
+            replica.generate("INPUT: salt\nOUTPUT:")
+
+        wall, latencies, tokens = run_load(pool, tokenizer, concurrency, args.requests)
+        latencies.sort()
+        row = {
+            'replicas': len(pool),
+            'threads': threads,
+            'cpus': [r.cpus for r in pool.replicas],
+            'requests_per_second': round(len(latencies) / wall, 2),
+            'tokens_per_second': round(sum(tokens) / wall, 1),
+            'latency_p50_ms': round(statistics.median(latencies) * 1000, 1),
+            'latency_p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+        }
+        report.append(row)
+        print(f"   K={row['replicas']:<3} threads={threads:<3} {row['tokens_per_second']:>9} tok/s  "
+              f"p50 {row['latency_p50_ms']:>8} ms  p95 {row['latency_p95_ms']:>8} ms")
+
+    best = max(report, key=lambda r: r['tokens_per_second'])
+    print("\n" + "=" * 60)
+    print(f"{'K':>4} {'threads':>8} {'tok/s':>10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    print("=" * 60)
+    for row in report:
+        mark = "  ⭐" if row is best else ""
+        print(f"{row['replicas']:>4} {row['threads']:>8} {row['tokens_per_second']:>10} {row['requests_per_second']:>8} "
+              f"{row['latency_p50_ms']:>9} {row['latency_p95_ms']:>9}{mark}")
+
+    print("\n✅ Best throughput on this machine:")
+    print(f"   RECIPE_REPLICAS={best['replicas']}")
+    print(f"   RECIPE_REPLICA_THREADS={best['threads']}")
+
+    Path(args.out).write_text(json.dumps({'best': best, 'runs': report}, indent=2))
+    print(f"\n📁 Report saved to {args.out}")
+
+if __name__ == "__main__":
+    main()